@@ -1,5 +1,5 @@
-from django.contrib import admin
-from .models import Person, Invoice, InvoiceItem, Schedule, Company
+from django.contrib import admin, messages
+from .models import Person, Invoice, InvoiceItem, Schedule, Company, RoleRate
 from .models import Brand
 
 # 註冊 Company 模型
@@ -15,6 +15,25 @@ class CompanyAdmin(admin.ModelAdmin):
 class PersonAdmin(admin.ModelAdmin):
     list_display = ('name', 'bank', 'account', 'sort_code',
                     'bank_name', 'late_count', 'cancel_count')
+    actions = ['generate_last_month_invoices']
+
+    @admin.action(description='產生上個月的月結發票')
+    def generate_last_month_invoices(self, request, queryset):
+        from django.utils import timezone
+        from .invoicing import generate_monthly_invoices, previous_month
+        result = generate_monthly_invoices(
+            previous_month(timezone.localdate()),
+            person_ids=list(queryset.values_list('id', flat=True)),
+            company=Company.objects.first())
+        self.message_user(
+            request,
+            f"{result['month']:%Y-%m}：產生 {result['created']} 張發票，"
+            f"略過 {len(result['skipped'])} 位已有發票的員工")
+        if result['missing_rates']:
+            self.message_user(
+                request,
+                f"以下角色沒有設定時薪，金額以 0 計算：{', '.join(result['missing_rates'])}",
+                level=messages.WARNING)
 
 # 註冊 Invoice 模型
 
@@ -22,7 +41,8 @@ class PersonAdmin(admin.ModelAdmin):
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('person', 'company', 'date',
-                    'receipt_number', 'total_amount')
+                    'receipt_number', 'total_amount', 'billing_month')
+    list_filter = ('billing_month',)
 
 # 註冊 InvoiceItem 模型
 
@@ -44,3 +64,8 @@ class ScheduleAdmin(admin.ModelAdmin):
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('name',)
+
+
+@admin.register(RoleRate)
+class RoleRateAdmin(admin.ModelAdmin):
+    list_display = ('role', 'hourly_rate')
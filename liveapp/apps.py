@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class LiveappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'liveapp'
+
+    def ready(self):
+        # 註冊排班變更的 signal receiver
+        from . import realtime, rollup, signals, sync, timeline_cache, versioning  # noqa: F401
+        # 每個資料庫連線記錄查詢數與時間（/metrics、Server-Timing）
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_query_wrapper
+        connection_created.connect(install_query_wrapper)
@@ -0,0 +1,32 @@
+"""benchmark_servers 指令啟動的 WSGI / ASGI 入口
+
+與 selleryltd.wsgi / selleryltd.asgi 相同，另外依環境變數 BENCH_DB_LATENCY_MS
+在每個 SQL 查詢前 sleep，模擬較慢的資料庫。只供效能測試使用，不要用於正式部署。
+"""
+import os
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'selleryltd.settings')
+
+from django.core.asgi import get_asgi_application  # noqa: E402
+from django.core.wsgi import get_wsgi_application  # noqa: E402
+
+LATENCY = int(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+
+
+def _slow_query(execute, sql, params, many, context):
+    time.sleep(LATENCY)
+    return execute(sql, params, many, context)
+
+
+def _install_latency(sender, connection, **kwargs):
+    if _slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_slow_query)
+
+
+wsgi_application = get_wsgi_application()
+asgi_application = get_asgi_application()
+
+if LATENCY:
+    from django.db.backends.signals import connection_created
+    connection_created.connect(_install_latency)
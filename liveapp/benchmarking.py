@@ -0,0 +1,212 @@
+"""效能量測共用工具
+
+- benchmark_servers / loadtest 指令：啟動本機伺服器、發送請求與統計延遲
+- benchmark_serializers 指令與效能測試：比較 liveapp.serializers 與以 model instance 建立的舊格式
+"""
+import json
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import serializers
+from .models import Schedule
+
+SERVER_KINDS = ('wsgi', 'asgi')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f'伺服器啟動失敗（exit code {process.returncode}）')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError('等待伺服器啟動逾時')
+
+
+def server_command(kind, port, workers=2):
+    """gunicorn（sync workers）或 daphne，使用 liveapp.bench 的入口"""
+    if kind == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'liveapp.bench:wsgi_application',
+                '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    return [sys.executable, '-m', 'daphne', '-b', '127.0.0.1', '-p', str(port),
+            'liveapp.bench:asgi_application']
+
+
+@contextmanager
+def local_server(kind, workers=2, db_latency_ms=0):
+    """啟動本機伺服器（與目前 process 相同的 settings 與資料庫），yield base URL，結束時關閉"""
+    port = free_port()
+    env = dict(os.environ, BENCH_DB_LATENCY_MS=str(db_latency_ms), PYTHONUNBUFFERED='1')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'selleryltd.settings')
+    process = subprocess.Popen(
+        server_command(kind, port, workers),
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for_port(port, process)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def fetch(url, data=None, timeout=60):
+    """發送 GET（或 data 不為 None 時 POST JSON），回傳 (秒數, HTTP 狀態碼)；連線失敗時狀態碼為 0"""
+    headers = {'X-Requested-With': 'XMLHttpRequest'}
+    if data is not None:
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        status = exc.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return time.perf_counter() - started, status
+
+
+def is_error(status):
+    return not 200 <= status < 300
+
+
+def percentile(sorted_values, pct):
+    """nearest-rank 百分位數；sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def latency_summary(latencies, errors, elapsed):
+    """latencies 為秒數列表；回傳 requests / errors / rps 與 p50 / p95 / p99 / max（毫秒）"""
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'rps': round(total / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+def legacy_timeline_schedule(schedule):
+    """serializers.timeline_schedule 之前的寫法（需 select_related person、brand__responsible），作為比對基準"""
+    return {
+        'id': schedule.id,
+        'person_name': schedule.person.name,
+        'person_nick_name': schedule.person.nick_name or '',
+        'role': schedule.role,
+        'start_time': schedule.start_time.strftime('%H:%M'),
+        'end_time': schedule.end_time.strftime('%H:%M'),
+        'duration': float(schedule.duration),
+        'brand_id': schedule.brand.id if schedule.brand else None,
+        'brand_name': schedule.brand.name if schedule.brand else '',
+        'brand_color': schedule.brand.color if schedule.brand else '#6c757d',
+        'brand_responsible': schedule.brand.responsible.name if schedule.brand and schedule.brand.responsible else '',
+        'room': schedule.room,
+        'modification_status': schedule.modification_status,
+        'modification_reason': schedule.modification_reason or '',
+        'is_late_cancellation': schedule.is_late_cancellation,
+        'late_hours': float(schedule.late_hours),
+        'modified_at': schedule.modified_at.strftime('%Y-%m-%d %H:%M') if schedule.modified_at else '',
+    }
+
+
+def legacy_employee_schedule(schedule, today):
+    """serializers.employee_schedule 之前的寫法（需 select_related brand）"""
+    return {
+        'id': schedule.id,
+        'date': schedule.date.strftime('%Y-%m-%d'),
+        'date_display': schedule.date.strftime('%m/%d'),
+        'start_time': schedule.start_time.strftime('%H:%M'),
+        'end_time': schedule.end_time.strftime('%H:%M'),
+        'duration': float(schedule.duration),
+        'role': schedule.role,
+        'brand_name': schedule.brand.name if schedule.brand else '無品牌',
+        'brand_color': schedule.brand.color if schedule.brand and hasattr(schedule.brand, 'color') else '#6c757d',
+        'room': schedule.room,
+        'is_cancelled': schedule.is_late_cancellation,
+        'modification_status': schedule.modification_status,
+        'is_past': schedule.date < today,
+        'is_today': schedule.date == today,
+        'is_future': schedule.date > today,
+    }
+
+
+def _best_of(build, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare_serializers(rows=1000, repeat=5):
+    """以最近的 rows 筆排班比較查詢 + 建立資料的時間（取 repeat 次中最快的一次）
+
+    回傳 {格式: {'rows', 'legacy_ms', 'values_ms', 'speedup', 'identical'}}，毫秒數換算為每 1,000 筆；
+    identical 為兩者以 JsonResponse 相同方式編碼後是否逐位元組相同。
+    """
+    today = timezone.localdate()
+    ids = list(Schedule.objects.order_by('-date', 'id').values_list('id', flat=True)[:rows])
+    ordering = ('date', 'start_time', 'id')
+    cases = {
+        'timeline': (
+            lambda: [legacy_timeline_schedule(schedule) for schedule in Schedule.objects.filter(id__in=ids)
+                     .select_related('person', 'brand', 'brand__responsible').order_by(*ordering)],
+            lambda: [serializers.timeline_schedule(row)
+                     for row in serializers.timeline_values(id__in=ids).order_by(*ordering)],
+        ),
+        'employee': (
+            lambda: [legacy_employee_schedule(schedule, today) for schedule in Schedule.objects.filter(id__in=ids)
+                     .select_related('brand').order_by(*ordering)],
+            lambda: [serializers.employee_schedule(row, today)
+                     for row in serializers.employee_values(id__in=ids).order_by(*ordering)],
+        ),
+    }
+    scale = 1000 * 1000 / max(len(ids), 1)
+    results = {}
+    for name, (legacy, lean) in cases.items():
+        legacy_seconds, legacy_data = _best_of(legacy, repeat)
+        lean_seconds, lean_data = _best_of(lean, repeat)
+        results[name] = {
+            'rows': len(ids),
+            'legacy_ms': round(legacy_seconds * scale, 2),
+            'values_ms': round(lean_seconds * scale, 2),
+            'speedup': round(legacy_seconds / lean_seconds, 1) if lean_seconds else 0.0,
+            'identical': json.dumps(legacy_data, cls=DjangoJSONEncoder) == json.dumps(lean_data, cls=DjangoJSONEncoder),
+        }
+    return results
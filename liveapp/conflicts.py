@@ -0,0 +1,178 @@
+"""排班衝突檢查：同一員工同時段兩個班次、同一房間同角色同時段兩人
+
+班次轉成以分鐘為單位的絕對區間（跨夜班次延伸到隔天），依員工與
+（房間, 角色）分組後各做一次 sweep，複雜度 O(n log n)。房間 0（未分配）
+與已取消的班次不列入檢查。
+
+* ``find_conflicts``：任意班次列表之間的衝突
+* ``check_schedules``：儲存前檢查新的 / 修改後的班次與資料庫既有班次是否衝突
+* ``conflicts_in_range``：日期區間內所有衝突（報表）
+* PostgreSQL 可另外以 exclusion constraint 由資料庫強制（見 ``EXCLUSION_CONSTRAINTS_SQL``）
+"""
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Person, Schedule
+
+MINUTES_PER_DAY = 24 * 60
+UNASSIGNED_ROOM = 0
+_FIELDS = ('id', 'person_id', 'date', 'start_time', 'end_time', 'room', 'role')
+
+
+def _interval(schedule):
+    """(start, end) 分鐘數；end 早於或等於 start 視為跨夜"""
+    start = schedule['date'].toordinal() * MINUTES_PER_DAY + schedule['start_time'].hour * 60 + schedule['start_time'].minute
+    duration = Schedule.compute_duration_minutes(schedule['start_time'], schedule['end_time'])
+    return start, start + duration
+
+
+def as_row(schedule):
+    """Schedule 物件或 values() dict 轉成檢查用的 dict"""
+    if isinstance(schedule, dict):
+        return {field: schedule.get(field) for field in _FIELDS}
+    return {field: getattr(schedule, field) for field in _FIELDS}
+
+
+def _sweep(items):
+    """items: [(start, end, row)]，回傳所有重疊的 (row_a, row_b, overlap_start, overlap_end)"""
+    items = sorted(items, key=lambda item: (item[0], item[1]))
+    active = []  # heap of (end, seq, start, row)
+    overlaps = []
+    for seq, (start, end, row) in enumerate(items):
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for other_end, _, other_start, other in active:
+            overlaps.append((other, row, start, min(end, other_end)))
+        heapq.heappush(active, (end, seq, start, row))
+    return overlaps
+
+
+def _minutes_to_display(minutes):
+    day, minute = divmod(minutes, MINUTES_PER_DAY)
+    return day, f'{minute // 60:02d}:{minute % 60:02d}'
+
+
+def find_conflicts(schedules):
+    """回傳衝突列表，每筆為 dict：kind（'person' / 'room'）、person_id / room / role、
+    ids（兩個班次 id）、date、start、end（重疊區間）"""
+    by_person = defaultdict(list)
+    by_room = defaultdict(list)
+    for schedule in schedules:
+        row = as_row(schedule)
+        start, end = _interval(row)
+        if end <= start:
+            continue
+        by_person[row['person_id']].append((start, end, row))
+        if row['room'] != UNASSIGNED_ROOM:
+            by_room[(row['room'], row['role'])].append((start, end, row))
+
+    conflicts = []
+    for groups, kind in ((by_person, 'person'), (by_room, 'room')):
+        for key, items in groups.items():
+            for a, b, overlap_start, overlap_end in _sweep(items):
+                day, start_display = _minutes_to_display(overlap_start)
+                conflict = {
+                    'kind': kind,
+                    'ids': [a['id'], b['id']],
+                    'date': date.fromordinal(day).strftime('%Y-%m-%d'),
+                    'start': start_display,
+                    'end': _minutes_to_display(overlap_end)[1],
+                }
+                if kind == 'person':
+                    conflict['person_id'] = key
+                else:
+                    conflict['room'], conflict['role'] = key
+                conflicts.append(conflict)
+    conflicts.sort(key=lambda c: (c['date'], c['start'], c['kind']))
+    return conflicts
+
+
+def checks_enabled():
+    """settings.SCHEDULE_CONFLICT_CHECKS = False 時儲存前不檢查（報表仍可使用）"""
+    return getattr(settings, 'SCHEDULE_CONFLICT_CHECKS', True)
+
+
+def _active_schedules():
+    return Schedule.objects.exclude(modification_status='cancelled')
+
+
+def check_schedules(candidates):
+    """檢查即將儲存的班次（新增或修改後的物件 / dict）之間及與資料庫既有班次的衝突
+
+    只回傳至少牽涉一個候選班次的衝突，並以 ``candidates`` 標出牽涉的候選班次索引。
+    候選班次的 id 若已存在，以候選內容取代資料庫中的舊值。
+    """
+    candidates = [as_row(candidate) for candidate in candidates]
+    if not candidates:
+        return []
+    dates = {row['date'] for row in candidates}
+    # 前一天的跨夜班次可能延伸到當天，當天的跨夜班次可能延伸到隔天
+    window = {day + timedelta(days=offset) for day in dates for offset in (-1, 0, 1)}
+    persons = {row['person_id'] for row in candidates}
+    rooms = {row['room'] for row in candidates} - {UNASSIGNED_ROOM}
+    candidate_ids = {row['id'] for row in candidates if row['id']}
+
+    existing = _active_schedules().filter(date__in=window).filter(
+        Q(person_id__in=persons) | Q(room__in=rooms)
+    ).exclude(id__in=candidate_ids).values(*_FIELDS)
+
+    # 尚未儲存的候選班次沒有 id，暫時以負數標記
+    index_by_id = {}
+    for index, row in enumerate(candidates):
+        if not row['id']:
+            row['id'] = -(index + 1)
+        index_by_id[row['id']] = index
+    conflicts = []
+    for conflict in find_conflicts(candidates + list(existing)):
+        involved = [index_by_id[schedule_id] for schedule_id in conflict['ids'] if schedule_id in index_by_id]
+        if involved:
+            conflict['candidates'] = involved
+            conflict['ids'] = [schedule_id if schedule_id > 0 else None for schedule_id in conflict['ids']]
+            conflicts.append(conflict)
+    return conflicts
+
+
+def person_names(conflicts):
+    ids = {conflict['person_id'] for conflict in conflicts if conflict['kind'] == 'person'}
+    return dict(Person.objects.filter(id__in=ids).values_list('id', 'name')) if ids else {}
+
+
+def describe_conflict(conflict, names=None):
+    """衝突的中文說明；names 為 {person_id: 姓名}"""
+    if conflict['kind'] == 'person':
+        name = (names or {}).get(conflict['person_id'], f"#{conflict['person_id']}")
+        return f"{name} 在 {conflict['date']} {conflict['start']}-{conflict['end']} 已有其他班次"
+    return f"房間 {conflict['room']} 在 {conflict['date']} {conflict['start']}-{conflict['end']} 已有其他{conflict['role']}"
+
+
+def conflicts_in_range(start_date, end_date):
+    """日期區間內所有衝突（含前一天延伸過來的跨夜班次）"""
+    rows = _active_schedules().filter(
+        date__range=(start_date - timedelta(days=1), end_date)
+    ).values(*_FIELDS)
+    start_key, end_key = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    return [c for c in find_conflicts(rows) if start_key <= c['date'] <= end_key]
+
+
+# PostgreSQL exclusion constraint（需要 btree_gist），由 schedule_constraints 指令啟用 / 移除
+_SHIFT_RANGE = (
+    "tsrange(date + start_time, "
+    "date + start_time + duration_minutes * interval '1 minute')"
+)
+EXCLUSION_CONSTRAINTS_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    f"ALTER TABLE liveapp_schedule ADD CONSTRAINT liveapp_schedule_person_no_overlap "
+    f"EXCLUDE USING gist (person_id WITH =, {_SHIFT_RANGE} WITH &&) "
+    f"WHERE (modification_status <> 'cancelled' AND duration_minutes > 0)",
+    f"ALTER TABLE liveapp_schedule ADD CONSTRAINT liveapp_schedule_room_no_overlap "
+    f"EXCLUDE USING gist (room WITH =, role WITH =, {_SHIFT_RANGE} WITH &&) "
+    f"WHERE (modification_status <> 'cancelled' AND duration_minutes > 0 AND room <> {UNASSIGNED_ROOM})",
+]
+DROP_EXCLUSION_CONSTRAINTS_SQL = [
+    "ALTER TABLE liveapp_schedule DROP CONSTRAINT IF EXISTS liveapp_schedule_person_no_overlap",
+    "ALTER TABLE liveapp_schedule DROP CONSTRAINT IF EXISTS liveapp_schedule_room_no_overlap",
+]
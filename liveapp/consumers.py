@@ -0,0 +1,70 @@
+"""排班即時更新的 WebSocket consumer（/ws/schedules/）
+
+前端送出 ``{"action": "subscribe" | "unsubscribe", "dates": ["YYYY-MM-DD", ...]}``，
+訂閱的日期有排班變更時收到 ``realtime`` 模組送出的差異。超過 ``MAX_SUBSCRIBED_DATES``
+的日期不訂閱，回傳 ``{"type": "error", "error": ..., "rejected": ["YYYY-MM-DD", ...]}``。
+"""
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.utils.dateparse import parse_date
+
+from .realtime import date_group
+
+# 每個連線最多訂閱的日期數（日曆最多載入約一年的月份）
+MAX_SUBSCRIBED_DATES = 400
+
+
+def _parse_dates(values):
+    if not isinstance(values, list):
+        return None
+    dates = set()
+    for value in values:
+        try:
+            day = parse_date(value) if isinstance(value, str) else None
+        except ValueError:
+            day = None
+        if day is None:
+            return None
+        dates.add(day)
+    return dates
+
+
+class ScheduleConsumer(AsyncJsonWebsocketConsumer):
+
+    async def connect(self):
+        self.subscribed = set()
+        await self.accept()
+
+    async def disconnect(self, code):
+        for day in self.subscribed:
+            await self.channel_layer.group_discard(date_group(day), self.channel_name)
+        self.subscribed = set()
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action') if isinstance(content, dict) else None
+        dates = _parse_dates(content.get('dates')) if action in ('subscribe', 'unsubscribe') else None
+        if dates is None:
+            await self.send_json({'type': 'error', 'error': 'Expected {"action": "subscribe" | "unsubscribe", "dates": [...]}'})
+            return
+
+        if action == 'subscribe':
+            dates = sorted(dates - self.subscribed)
+            available = max(MAX_SUBSCRIBED_DATES - len(self.subscribed), 0)
+            dates, rejected = set(dates[:available]), dates[available:]
+            if rejected:
+                await self.send_json({
+                    'type': 'error',
+                    'error': f'At most {MAX_SUBSCRIBED_DATES} dates per connection',
+                    'rejected': [day.isoformat() for day in rejected],
+                })
+            for day in dates:
+                await self.channel_layer.group_add(date_group(day), self.channel_name)
+            self.subscribed |= dates
+        else:
+            dates &= self.subscribed
+            for day in dates:
+                await self.channel_layer.group_discard(date_group(day), self.channel_name)
+            self.subscribed -= dates
+        await self.send_json({'type': 'subscribed', 'count': len(self.subscribed)})
+
+    async def schedule_diff(self, event):
+        await self.send_json({'type': 'diff', 'date': event['date'], 'changes': event['changes']})
@@ -0,0 +1,109 @@
+"""排班匯出（薪資用）
+
+以 ``values()`` JOIN 員工與品牌，配合 ``.iterator(chunk_size=...)`` 分批讀取，
+逐列產生 CSV，整年的資料也只佔用固定記憶體（ASGI 下由 liveapp.streaming 轉成
+async iterator）。XLSX 需要安裝 openpyxl，使用 write-only 模式寫入暫存檔後再串流。
+"""
+import csv
+import tempfile
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+from .models import Schedule
+
+EXPORT_CHUNK_SIZE = 2000
+
+COLUMNS = [
+    ('date', 'Date'),
+    ('person__name', 'Employee'),
+    ('person__nick_name', 'Nickname'),
+    ('role', 'Role'),
+    ('brand__name', 'Brand'),
+    ('room', 'Room'),
+    ('start_time', 'Start'),
+    ('end_time', 'End'),
+    ('duration_hours', 'Hours'),
+    ('late_hours', 'Late Hours'),
+    ('is_late_cancellation', 'Late Cancellation'),
+    ('modification_status', 'Status'),
+    ('modification_reason', 'Reason'),
+]
+HEADER = [label for _, label in COLUMNS]
+_QUERY_FIELDS = [field for field, _ in COLUMNS if field != 'duration_hours'] + ['duration_minutes']
+
+
+def xlsx_available():
+    return openpyxl is not None
+
+
+def schedule_export_rows(start_date=None, end_date=None, person_ids=None):
+    """依日期與員工排序，逐列產生匯出資料；以 chunk 分批從資料庫讀取"""
+    schedules = Schedule.objects.all()
+    if start_date:
+        schedules = schedules.filter(date__gte=start_date)
+    if end_date:
+        schedules = schedules.filter(date__lte=end_date)
+    if person_ids:
+        schedules = schedules.filter(person_id__in=person_ids)
+    rows = schedules.order_by('date', 'person__name', 'start_time', 'id').values(*_QUERY_FIELDS)
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            row['date'].strftime('%Y-%m-%d'),
+            row['person__name'],
+            row['person__nick_name'],
+            row['role'],
+            row['brand__name'] or '',
+            row['room'],
+            row['start_time'].strftime('%H:%M'),
+            row['end_time'].strftime('%H:%M'),
+            round(row['duration_minutes'] / 60, 2),
+            float(row['late_hours']),
+            'Y' if row['is_late_cancellation'] else '',
+            row['modification_status'],
+            row['modification_reason'],
+        ]
+
+
+class _Echo:
+    """csv.writer 的寫入目標，直接回傳字串讓 generator 逐列送出"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, bom=True, lines_per_chunk=500):
+    """將資料列轉成 CSV 字串的 generator，每次送出 lines_per_chunk 列；
+    預設加上 BOM，Excel 開啟中文不會亂碼"""
+    writer = csv.writer(_Echo())
+    lines = ['\ufeff'] if bom else []
+    lines.append(writer.writerow(HEADER))
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= lines_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def write_xlsx(rows, fileobj):
+    """以 write-only 模式寫入 XLSX（不會在記憶體中保留所有儲存格）"""
+    if openpyxl is None:
+        raise RuntimeError('openpyxl 未安裝，無法匯出 XLSX')
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Schedules')
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
+
+
+def xlsx_tempfile(rows):
+    """寫入暫存檔並回到開頭，供 FileResponse 串流；檔案關閉後自動刪除"""
+    tmp = tempfile.TemporaryFile(suffix='.xlsx')
+    write_xlsx(rows, tmp)
+    tmp.seek(0)
+    return tmp
@@ -2,6 +2,7 @@ from django import forms
 from django.forms import inlineformset_factory
 from .models import Person, Invoice, InvoiceItem, Schedule, Company
 from .models import Brand
+from .conflicts import check_schedules, checks_enabled, describe_conflict
 
 
 class PersonForm(forms.ModelForm):
@@ -93,6 +94,26 @@ class ScheduleForm(forms.ModelForm):
             'room': forms.NumberInput(attrs={'class': 'form-control', 'id': 'room-input', 'type': 'number', 'min': '0'}),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        fields = ('date', 'person', 'role', 'start_time', 'end_time', 'room')
+        if self.errors or not checks_enabled() or any(cleaned_data.get(f) is None for f in fields):
+            return cleaned_data
+        # 同一員工或同一房間同角色的時段重疊時不允許儲存
+        conflicts = check_schedules([{
+            'id': self.instance.pk,
+            'person_id': cleaned_data['person'].pk,
+            'date': cleaned_data['date'],
+            'start_time': cleaned_data['start_time'],
+            'end_time': cleaned_data['end_time'],
+            'room': cleaned_data['room'],
+            'role': cleaned_data['role'],
+        }])
+        if conflicts:
+            names = {cleaned_data['person'].pk: cleaned_data['person'].name}
+            raise forms.ValidationError([describe_conflict(conflict, names) for conflict in conflicts])
+        return cleaned_data
+
 
 class BrandForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,243 @@
+"""每個請求的效能量測與 Prometheus 指標
+
+``PerformanceMetricsMiddleware`` 在請求開始時把 ``RequestMetrics`` 放進 contextvar，
+以下三處把時間累加到目前請求（contextvar 會跟著 sync_to_async 進入 thread，async view 也適用）：
+
+- SQL：``connection_created`` 時在每個資料庫連線加上 execute wrapper，記錄查詢數與時間
+- 模板：settings.TEMPLATES 使用 ``TimedDjangoTemplates``，記錄 render 時間
+- JSON：views 使用這裡的 ``JsonResponse``，記錄 json.dumps 時間
+
+請求結束時輸出 ``Server-Timing`` header，並依 view 名稱累加到 process 內的 histogram，
+由 ``/metrics`` 以 Prometheus text format 輸出。不在請求中時每次查詢只多一次 contextvar 讀取，
+請求中每次查詢多兩次 ``perf_counter``，可在正式環境常駐。
+指標存在各 process 的記憶體中：gunicorn 多個 worker 時，每次 scrape 只會拿到其中一個 worker 的數字。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django import http
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template as DjangoTemplate, reraise
+
+_current = ContextVar('liveapp_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'json_seconds', 'sql')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.json_seconds = 0.0
+        # 設為 list 時另外記錄每個查詢的 (sql, 秒數)，供 profiler 使用
+        self.sql = None
+
+
+def current_metrics():
+    return _current.get()
+
+
+def start_request():
+    """開始記錄目前 context 的請求；回傳 (metrics, token)，結束時以 token 呼叫 finish_request"""
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.db_seconds += elapsed
+        metrics.queries += 1
+        if metrics.sql is not None:
+            metrics.sql.append((sql, elapsed))
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver：每個新的資料庫連線都加上查詢記錄"""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class JsonResponse(http.JsonResponse):
+    """與 django.http.JsonResponse 相同，另外記錄序列化時間"""
+
+    def __init__(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            super().__init__(*args, **kwargs)
+            return
+        started = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        metrics.json_seconds += time.perf_counter() - started
+
+
+class _TimedTemplate(DjangoTemplate):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """記錄 render 時間的 DjangoTemplates backend（include / extends 算在最外層模板內）"""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    """依 label 分組的累積 histogram（Prometheus 格式）"""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        # labels -> [每個 bucket 的次數..., +Inf 次數, 總和]
+        self.series = {}
+
+    def observe(self, labels, value):
+        row = self.series.get(labels)
+        if row is None:
+            row = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, row in sorted(self.series.items()):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}'
+            cumulative += row[len(self.buckets)]
+            yield f'{self.name}_bucket{{{label_text},le="+Inf"}} {cumulative}'
+            yield f'{self.name}_sum{{{label_text}}} {row[-1]:.6f}'
+            yield f'{self.name}_count{{{label_text}}} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def lines(self):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.series.items()):
+            yield f'{self.name}{{{_labels(self.label_names, labels)}}} {value}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+REQUESTS = Counter('liveapp_http_requests_total', '請求數', ('view', 'method', 'status'))
+DURATION = Histogram('liveapp_http_request_duration_seconds', '請求處理時間', SECONDS_BUCKETS, ('view',))
+DB_QUERIES = Histogram('liveapp_db_queries', '每個請求的 SQL 查詢數', QUERY_BUCKETS, ('view',))
+DB_DURATION = Histogram('liveapp_db_query_duration_seconds', '每個請求的 SQL 查詢總時間', SECONDS_BUCKETS, ('view',))
+TEMPLATE_DURATION = Histogram(
+    'liveapp_template_render_duration_seconds', '每個請求的模板 render 時間', SECONDS_BUCKETS, ('view',))
+JSON_DURATION = Histogram(
+    'liveapp_json_serialize_duration_seconds', '每個請求的 JSON 序列化時間', SECONDS_BUCKETS, ('view',))
+RESPONSE_SIZE = Histogram('liveapp_http_response_size_bytes', '回應大小（不含串流回應）', BYTES_BUCKETS, ('view',))
+TIMELINE_CACHE = Counter(
+    'liveapp_timeline_cache_events_total', '時間軸快取命中 / 未命中 / 失效的 key 數', ('event',))
+METRICS = (
+    REQUESTS, DURATION, DB_QUERIES, DB_DURATION, TEMPLATE_DURATION, JSON_DURATION, RESPONSE_SIZE, TIMELINE_CACHE)
+
+
+def observe(view, method, status, metrics, duration, size):
+    labels = (view,)
+    with _lock:
+        REQUESTS.inc((view, method, status))
+        DURATION.observe(labels, duration)
+        DB_QUERIES.observe(labels, metrics.queries)
+        DB_DURATION.observe(labels, metrics.db_seconds)
+        if metrics.template_seconds:
+            TEMPLATE_DURATION.observe(labels, metrics.template_seconds)
+        if metrics.json_seconds:
+            JSON_DURATION.observe(labels, metrics.json_seconds)
+        if size is not None:
+            RESPONSE_SIZE.observe(labels, size)
+
+
+def count_event(counter, event, amount=1):
+    """process 內的計數（例如 TIMELINE_CACHE），不寫入 cache 或資料庫"""
+    if amount > 0:
+        with _lock:
+            counter.inc((event,), amount)
+
+
+def counter_values(counter):
+    """{event: 次數}"""
+    with _lock:
+        return {labels[0]: value for labels, value in counter.series.items()}
+
+
+def reset_counter(counter):
+    with _lock:
+        counter.series.clear()
+
+
+def render_metrics():
+    with _lock:
+        lines = [line for metric in METRICS for line in metric.lines()]
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    with _lock:
+        for metric in METRICS:
+            metric.series.clear()
+
+
+def server_timing(metrics, duration):
+    parts = [f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"']
+    if metrics.template_seconds:
+        parts.append(f'tpl;dur={metrics.template_seconds * 1000:.1f}')
+    if metrics.json_seconds:
+        parts.append(f'json;dur={metrics.json_seconds * 1000:.1f}')
+    parts.append(f'total;dur={duration * 1000:.1f}')
+    return ', '.join(parts)
@@ -0,0 +1,275 @@
+"""伺服器端發票 PDF（ReportLab）
+
+PDF 依發票內容的雜湊值快取在磁碟上，發票或明細修改後雜湊值改變才重新產生。
+批次匯出時未快取的發票交給所有請求共用、大小固定的 process pool 並行產生
+（worker 直接寫入快取檔，只回傳路徑），再逐一串流寫進 ZIP，不會把所有 PDF 同時放在記憶體中。
+
+這個模組在最上層不匯入 models，讓 process pool 的 worker 不需要初始化 Django。
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:
+    pdfmetrics = None
+
+# 版面修改時遞增，讓舊的快取檔失效
+RENDER_VERSION = 2
+# ReportLab 內建的繁體中文 CID 字型，不需要額外字型檔
+FONT_NAME = 'MSung-Light'
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+def pdf_available():
+    return pdfmetrics is not None
+
+
+def cache_dir():
+    return getattr(settings, 'INVOICE_PDF_CACHE_DIR',
+                   os.path.join(settings.BASE_DIR, 'cache', 'invoice_pdfs'))
+
+
+def invoice_pdf_data(invoice):
+    """PDF 需要的發票資料（純 dict，可傳給 worker process）；需 select_related person、prefetch items"""
+    person = invoice.person
+    return {
+        'id': invoice.id,
+        'receipt_number': invoice.receipt_number,
+        'company': invoice.company,
+        'address': invoice.address,
+        'description': invoice.description,
+        'date': invoice.date.strftime('%Y-%m-%d'),
+        'total_amount': str(invoice.total_amount),
+        'person': {
+            'name': person.name,
+            'bank': person.bank,
+            'bank_name': person.bank_name,
+            'account': person.account,
+            'sort_code': person.sort_code,
+        },
+        'items': [
+            {
+                'description': item.description,
+                'hours': str(item.hours),
+                'rate': str(item.rate),
+                'total_amount': str(item.total_amount),
+            }
+            for item in invoice.items.all()
+        ],
+    }
+
+
+def content_hash(data):
+    payload = json.dumps({'version': RENDER_VERSION, 'invoice': data}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def cached_pdf_path(data):
+    return os.path.join(cache_dir(), f"invoice-{data['id']}-{content_hash(data)[:20]}.pdf")
+
+
+def pdf_filename(data):
+    """下載與 ZIP 內的檔名；員工姓名同樣來自使用者輸入（可能含 / 或 ..），整個檔名一起過濾"""
+    name = f"Invoice_Payment for {data['receipt_number']}_{data['person']['name']}_{data['id']}".strip()
+    return ''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in name) + '.pdf'
+
+
+def _multiline(text):
+    """Paragraph 使用 XML 標記：先跳脫使用者輸入（< 與 & 會造成解析錯誤或改變版面），再換行"""
+    return escape(text or '').replace('\n', '<br/>')
+
+
+def render_invoice_pdf(data):
+    """將發票資料畫成 PDF，回傳 bytes"""
+    if pdfmetrics is None:
+        raise RuntimeError('reportlab 未安裝，無法產生 PDF')
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(FONT_NAME))
+
+    styles = getSampleStyleSheet()
+    for style in styles.byName.values():
+        style.fontName = FONT_NAME
+    person = data['person']
+
+    story = [
+        Paragraph(f"Invoice_Payment for {escape(data['receipt_number'])}", styles['Title']),
+        Paragraph(f"<b>Bill to:</b> {escape(data['company'] or '-')}", styles['Normal']),
+    ]
+    if data['address']:
+        story.append(Paragraph(_multiline(data['address']), styles['Normal']))
+    story += [
+        Spacer(1, 4 * mm),
+        Paragraph(f"<b>Invoice Number:</b> {data['id']:06d}", styles['Normal']),
+        Paragraph(f"<b>Date:</b> {escape(data['date'])}", styles['Normal']),
+        Paragraph(f"<b>Employee:</b> {escape(person['name'])}", styles['Normal']),
+        Spacer(1, 4 * mm),
+        Paragraph('<b>Bank Detail:</b>', styles['Normal']),
+    ]
+    bank_table = Table([
+        ['Bank', 'Bank Name', 'Account Number', 'Sort Code'],
+        [person['bank'], person['bank_name'], person['account'], person['sort_code']],
+    ], hAlign='LEFT')
+    bank_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
+    ]))
+    story += [bank_table, Spacer(1, 6 * mm)]
+
+    rows = [['Description', 'Hours', 'Rate', 'Subtotal']]
+    for item in data['items']:
+        rows.append([Paragraph(_multiline(item['description']), styles['Normal']), item['hours'], item['rate'], item['total_amount']])
+    rows.append(['', '', 'Total Amount', data['total_amount']])
+    items_table = Table(rows, colWidths=[95 * mm, 25 * mm, 25 * mm, 30 * mm])
+    items_table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), FONT_NAME),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
+        ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#dee2e6')),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    story.append(items_table)
+    if data['description']:
+        story += [Spacer(1, 6 * mm), Paragraph(_multiline(data['description']), styles['Normal'])]
+
+    output = BytesIO()
+    SimpleDocTemplate(
+        output, pagesize=A4, title=pdf_filename(data),
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+    ).build(story)
+    return output.getvalue()
+
+
+def _render_to_file(data, path):
+    """產生 PDF 並寫入快取檔（先寫暫存檔再 rename），刪除同一張發票的舊版本"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(render_invoice_pdf(data))
+    os.replace(tmp_path, path)
+    for old_path in glob.glob(os.path.join(os.path.dirname(path), f"invoice-{data['id']}-*.pdf")):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return path
+
+
+def get_invoice_pdf(invoice):
+    """回傳 (快取檔路徑, 下載檔名)；內容未變時直接使用快取"""
+    data = invoice_pdf_data(invoice)
+    path = cached_pdf_path(data)
+    if not os.path.exists(path):
+        _render_to_file(data, path)
+    return path, pdf_filename(data)
+
+
+class _ZipStream:
+    """只能附加寫入的緩衝區；ZipFile 寫入後由 generator 取走並送出"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+# 所有請求共用的 process pool（第一次批次匯出時建立），worker 數固定，
+# 同時有多個下載時工作在 pool 中排隊，不會每個請求各自建立一組 process。
+# worker 以 spawn 啟動：從多執行緒的 web server fork 可能複製到被其他 thread 持有的鎖
+# 與資料庫連線；worker 只匯入這個模組，不需要初始化 Django
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_workers():
+    """INVOICE_PDF_WORKERS，未設定時為 CPU 數（最多 4）；1 表示不使用 process pool"""
+    return getattr(settings, 'INVOICE_PDF_WORKERS', None) or min(os.cpu_count() or 1, 4)
+
+
+def render_pool():
+    global _pool
+    workers = pool_workers()
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    """worker 異常結束後 pool 無法再使用，下次重新建立"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_invoice_zip(invoices):
+    """逐一產生 ZIP 內容的 generator；invoices 需 select_related person、prefetch items"""
+    jobs = []
+    for invoice in invoices:
+        data = invoice_pdf_data(invoice)
+        jobs.append((data, cached_pdf_path(data), pdf_filename(data)))
+    missing = [(data, path) for data, path, _ in jobs if not os.path.exists(path)]
+
+    pool = render_pool() if len(missing) > 1 else None
+    pending = {}
+    if pool:
+        try:
+            pending = {path: pool.submit(_render_to_file, data, path) for data, path in missing}
+        except BrokenProcessPool:
+            _discard_pool(pool)
+    try:
+        buffer = _ZipStream()
+        archive = zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
+        for data, path, filename in jobs:
+            future = pending.pop(path, None)
+            if future is not None:
+                try:
+                    future.result()
+                except BrokenProcessPool:
+                    _discard_pool(pool)
+            if not os.path.exists(path):
+                _render_to_file(data, path)
+            with open(path, 'rb') as src, archive.open(filename, mode='w') as dest:
+                for chunk in iter(lambda: src.read(ZIP_CHUNK_SIZE), b''):
+                    dest.write(chunk)
+                    yield buffer.pop()
+            yield buffer.pop()
+        archive.close()
+        yield buffer.pop()
+    finally:
+        # 下載中斷時取消尚未開始的工作（共用的 pool 不關閉）
+        for future in pending.values():
+            future.cancel()
@@ -0,0 +1,120 @@
+"""月結發票：將一個月的排班批次轉成 Invoice / InvoiceItem
+
+每位員工一張發票，明細依 (品牌, 角色) 分組，時數扣除遲到時數後乘上該角色時薪
+（RoleRate）。已取消的班次不計。發票以 ``billing_month`` 標記所屬月份，
+同一員工同一月份已存在時略過（或以 replace=True 刪除該月全部發票後重新產生），因此可重複執行。
+收據編號為 ``YYYY-MM-<員工 id>``，每位員工每月唯一。
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Invoice, InvoiceItem, RoleRate, Schedule
+from .utilisation import month_bounds
+
+CENT = Decimal('0.01')
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def previous_month(day):
+    """day 前一個月的第一天"""
+    return (day.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def billable_rows(month_start, month_end, person_ids=None):
+    """(person, brand, role) 分組的工時與遲到時數"""
+    schedules = Schedule.objects.filter(
+        date__range=(month_start, month_end)
+    ).exclude(modification_status='cancelled')
+    if person_ids is not None:
+        schedules = schedules.filter(person_id__in=person_ids)
+    return schedules.values('person_id', 'brand__name', 'role').annotate(
+        minutes=Sum('duration_minutes'),
+        late_hours=Sum('late_hours'),
+        shifts=Count('id'),
+    ).order_by('person_id', 'brand__name', 'role')
+
+
+def build_item(row, rate):
+    worked = Decimal(row['minutes'] or 0) / 60
+    late = Decimal(row['late_hours'] or 0)
+    hours = _money(max(worked - late, Decimal(0)))
+    description = f"{row['brand__name'] or '無品牌'} - {row['role']}（{row['shifts']} 班）"
+    if late:
+        description += f"，扣除遲到 {_money(late)} 小時"
+    return InvoiceItem(
+        description=description[:255],
+        hours=hours,
+        rate=rate,
+        total_amount=_money(hours * rate),
+    )
+
+
+def generate_monthly_invoices(month, person_ids=None, company=None, replace=False):
+    """產生 month 所在月份的發票，回傳統計 dict
+
+    ``company`` 為 Company 物件（可省略）；``replace`` 為 True 時先刪除該月已產生的發票
+    （指定 person_ids 時只刪除這些員工的），包含本月已沒有可計費排班的員工。
+    """
+    month_start, month_end = month_bounds(month)
+    rates = dict(RoleRate.objects.values_list('role', 'hourly_rate'))
+    missing_rates = set()
+
+    items_by_person = defaultdict(list)
+    for row in billable_rows(month_start, month_end, person_ids):
+        rate = rates.get(row['role'])
+        if rate is None:
+            missing_rates.add(row['role'])
+            rate = Decimal('0.00')
+        items_by_person[row['person_id']].append(build_item(row, rate))
+
+    with transaction.atomic():
+        existing = Invoice.objects.filter(billing_month=month_start)
+        if person_ids is not None:
+            existing = existing.filter(person_id__in=person_ids)
+        deleted = 0
+        if replace:
+            deleted = existing.count()
+            existing.delete()
+            skipped = []
+        else:
+            skipped = sorted(existing.filter(person_id__in=list(items_by_person)).values_list('person_id', flat=True))
+
+        skipped_ids = set(skipped)
+        invoices = []
+        for person_id, items in items_by_person.items():
+            if person_id in skipped_ids:
+                continue
+            invoices.append(Invoice(
+                person_id=person_id,
+                company=company.name if company else '',
+                address=company.address if company else '',
+                description=f"{month_start:%Y-%m} 排班費用",
+                date=month_end,
+                receipt_number=f"{month_start:%Y-%m}-{person_id}",
+                total_amount=sum((item.total_amount for item in items), Decimal('0.00')),
+                billing_month=month_start,
+            ))
+        Invoice.objects.bulk_create(invoices)
+
+        items = []
+        for invoice in invoices:
+            for item in items_by_person[invoice.person_id]:
+                item.invoice = invoice
+                items.append(item)
+        InvoiceItem.objects.bulk_create(items, batch_size=1000)
+
+    return {
+        'month': month_start,
+        'created': len(invoices),
+        'items': len(items),
+        'deleted': deleted,
+        'skipped': skipped,
+        'missing_rates': sorted(missing_rates),
+    }
@@ -0,0 +1,81 @@
+"""發票清單：篩選與 keyset 分頁
+
+依 (date, id) 由新到舊排序，下一頁以最後一筆的 ``日期.id`` 作為游標，
+不使用 OFFSET，翻到後面的頁面也只讀取一頁的資料。
+"""
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from .models import Invoice, Person
+
+INVOICE_PAGE_SIZE = 50
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def invoice_filters(params):
+    """從 GET 參數取出有效的篩選條件：company、date_from、date_to、person"""
+    filters = {
+        'company': (params.get('company') or '').strip(),
+        'date_from': _parse_date(params.get('date_from')),
+        'date_to': _parse_date(params.get('date_to')),
+        'person': None,
+    }
+    person = params.get('person') or ''
+    if person.isdigit():
+        filters['person'] = int(person)
+    return filters
+
+
+def filter_invoices(filters):
+    invoices = Invoice.objects.select_related('person')
+    if filters['company']:
+        invoices = invoices.filter(company__icontains=filters['company'])
+    if filters['date_from']:
+        invoices = invoices.filter(date__gte=filters['date_from'])
+    if filters['date_to']:
+        invoices = invoices.filter(date__lte=filters['date_to'])
+    if filters['person']:
+        invoices = invoices.filter(person_id=filters['person'])
+    return invoices
+
+
+def encode_cursor(invoice):
+    return f'{invoice.date.isoformat()}.{invoice.id}'
+
+
+def decode_cursor(cursor):
+    """'YYYY-MM-DD.id' → (date, id)；格式錯誤時回傳 None（回到第一頁）"""
+    day, _, invoice_id = (cursor or '').partition('.')
+    day = _parse_date(day)
+    if not day or not invoice_id.isdigit():
+        return None
+    return day, int(invoice_id)
+
+
+def invoice_page(filters, cursor=None, page_size=INVOICE_PAGE_SIZE):
+    """回傳 (invoices, next_cursor)；沒有下一頁時 next_cursor 為 None"""
+    invoices = filter_invoices(filters).order_by('-date', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        day, invoice_id = position
+        invoices = invoices.filter(Q(date__lt=day) | Q(date=day, id__lt=invoice_id))
+    page = list(invoices[:page_size + 1])
+    next_cursor = encode_cursor(page[page_size - 1]) if len(page) > page_size else None
+    return page[:page_size], next_cursor
+
+
+def persons_with_invoice_totals():
+    """員工列表，附上每人發票數與總金額（一次 GROUP BY 查詢）"""
+    return Person.objects.annotate(
+        invoice_count=Count('invoice'),
+        invoice_total=Coalesce(
+            Sum('invoice__total_amount'), Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2)),
+    ).order_by('name')
@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from liveapp.benchmarking import compare_serializers
+from liveapp.models import Schedule
+
+
+class Command(BaseCommand):
+    help = '比較 liveapp.serializers（values()）與以 model instance 建立排班 JSON 資料的速度，並確認輸出相同'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='使用的排班筆數')
+        parser.add_argument('--repeat', type=int, default=5, help='每種寫法執行次數（取最快的一次）')
+        parser.add_argument('--json', dest='json_path', help='另外將結果寫入 JSON 檔')
+
+    def handle(self, *args, **options):
+        if not Schedule.objects.exists():
+            raise CommandError('資料庫中沒有排班，可先執行 loadtest 建立合成資料')
+        results = compare_serializers(options['rows'], options['repeat'])
+        self.stdout.write(f"{'format':<10} {'rows':>6} {'model ms/1k':>12} {'values ms/1k':>13} {'speedup':>8}  identical")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<10} {stats['rows']:>6} {stats['legacy_ms']:>12} {stats['values_ms']:>13} "
+                f"{stats['speedup']:>7}x  {stats['identical']}")
+        if not all(stats['identical'] for stats in results.values()):
+            raise CommandError('兩種寫法的輸出不同')
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2)
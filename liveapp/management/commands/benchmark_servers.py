@@ -0,0 +1,69 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from liveapp.benchmarking import SERVER_KINDS, fetch, is_error, latency_summary, local_server
+from liveapp.models import Person
+
+
+class Command(BaseCommand):
+    help = '以相同的並行請求比較 WSGI（gunicorn sync workers）與 ASGI（daphne）部署的 API 吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='每個端點的請求數')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn sync worker 數')
+        parser.add_argument('--db-latency', type=int, default=0, help='模擬每個 SQL 查詢的延遲（毫秒）')
+        parser.add_argument('--servers', default='wsgi,asgi', help='逗號分隔：wsgi, asgi')
+        parser.add_argument('--json', dest='json_path', help='另外將結果寫入 JSON 檔')
+
+    def _endpoints(self):
+        today = timezone.localdate()
+        person_id = Person.objects.order_by('id').values_list('id', flat=True).first()
+        endpoints = {
+            'timeline range': f'/timeline/?start={today - timedelta(days=10)}&end={today + timedelta(days=10)}',
+        }
+        if person_id:
+            endpoints['employee schedule'] = f'/api/employee-schedule/?employee_id={person_id}'
+        return endpoints
+
+    def _run(self, url, total, concurrency):
+        fetch(url)  # 暖機（建立連線、填入快取）
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, [url] * total))
+        elapsed = time.perf_counter() - started
+        stats = latency_summary(
+            [duration for duration, _ in results], sum(1 for _, status in results if is_error(status)), elapsed)
+        stats['seconds'] = round(elapsed, 3)
+        return stats
+
+    def handle(self, *args, **options):
+        servers = [kind.strip() for kind in options['servers'].split(',') if kind.strip()]
+        if set(servers) - set(SERVER_KINDS):
+            raise CommandError('--servers 只能是 wsgi、asgi')
+        endpoints = self._endpoints()
+
+        results = []
+        for kind in servers:
+            with local_server(kind, options['workers'], options['db_latency']) as base_url:
+                for name, path in endpoints.items():
+                    stats = self._run(f'{base_url}{path}', options['requests'], options['concurrency'])
+                    stats.update(server=kind, endpoint=name)
+                    results.append(stats)
+                    self.stdout.write(
+                        f"{kind:<5} {name:<18} {stats['rps']:>8} req/s  p50 {stats['p50_ms']:>7} ms  "
+                        f"p95 {stats['p95_ms']:>7} ms  errors {stats['errors']}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as fh:
+                json.dump({
+                    'concurrency': options['concurrency'],
+                    'workers': options['workers'],
+                    'db_latency_ms': options['db_latency'],
+                    'results': results,
+                }, fh, indent=2)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from liveapp.exports import iter_csv, schedule_export_rows, write_xlsx, xlsx_available
+
+
+class Command(BaseCommand):
+    help = '匯出排班資料（CSV / XLSX）供薪資使用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='開始日期 YYYY-MM-DD')
+        parser.add_argument('--end', help='結束日期 YYYY-MM-DD')
+        parser.add_argument('--person', type=int, action='append', dest='person_ids',
+                            help='只匯出指定員工 ID，可重複指定')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', '-o', help='輸出檔案；CSV 未指定時輸出到 stdout')
+
+    def _date(self, value, option):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'{option} 格式應為 YYYY-MM-DD')
+        return day
+
+    def handle(self, *args, **options):
+        start_date = self._date(options['start'], '--start')
+        end_date = self._date(options['end'], '--end')
+        rows = schedule_export_rows(start_date, end_date, options['person_ids'])
+
+        if options['format'] == 'xlsx':
+            if not xlsx_available():
+                raise CommandError('openpyxl 未安裝，無法匯出 XLSX')
+            if not options['output']:
+                raise CommandError('XLSX 匯出需要 --output')
+            with open(options['output'], 'wb') as fh:
+                write_xlsx(rows, fh)
+            return
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                fh.writelines(iter_csv(rows))
+        else:
+            for chunk in iter_csv(rows, bom=False):
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from liveapp.invoicing import generate_monthly_invoices, previous_month
+from liveapp.models import Company
+
+
+class Command(BaseCommand):
+    help = '依排班資料批次產生月結發票（每位員工每月一張，已產生者略過）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='結算月份 YYYY-MM，預設為上個月')
+        parser.add_argument('--person', type=int, action='append', dest='person_ids',
+                            help='只產生指定員工 ID，可重複指定')
+        parser.add_argument('--company', help='開立發票的公司名稱（Company）')
+        parser.add_argument('--replace', action='store_true', help='刪除並重新產生該月已產生的發票')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            month = parse_date(f"{options['month']}-01")
+            if month is None:
+                raise CommandError('--month 格式應為 YYYY-MM')
+        else:
+            month = previous_month(timezone.localdate())
+
+        company = None
+        if options['company']:
+            company = Company.objects.filter(name=options['company']).first()
+            if company is None:
+                raise CommandError(f"找不到公司：{options['company']}")
+
+        result = generate_monthly_invoices(
+            month, person_ids=options['person_ids'], company=company, replace=options['replace'])
+
+        if result['missing_rates']:
+            self.stdout.write(self.style.WARNING(
+                f"以下角色沒有設定時薪，金額以 0 計算：{', '.join(result['missing_rates'])}"))
+        if result['deleted']:
+            self.stdout.write(f"已刪除 {result['deleted']} 張本月原有的發票")
+        if result['skipped']:
+            self.stdout.write(f"{len(result['skipped'])} 位員工本月發票已存在，略過")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['month']:%Y-%m}：產生 {result['created']} 張發票、{result['items']} 筆明細"))
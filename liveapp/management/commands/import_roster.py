@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from liveapp.roster_import import import_roster
+
+
+class Command(BaseCommand):
+    help = '從 CSV 匯入排班表（date, person, role, start, end, brand, room），有錯誤時不寫入任何資料'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV 檔案路徑（UTF-8）')
+        parser.add_argument('--dry-run', action='store_true', help='只驗證，不寫入')
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'rb') as fh:
+            result = import_roster(fh, dry_run=options['dry_run'])
+        for row in result['errors']:
+            self.stderr.write(f"第 {row['line']} 行：{'；'.join(row['errors'])}")
+        if not result['success']:
+            raise CommandError(f"{len(result['errors'])} 列資料有誤，未匯入任何排班")
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{result['rows']} 列資料驗證通過"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"已匯入 {result['created']} 筆排班"))
@@ -0,0 +1,222 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from liveapp.benchmarking import SERVER_KINDS, fetch, is_error, latency_summary, local_server
+from liveapp.models import Person, Schedule
+from liveapp.synthetic import is_synthetic_dataset, seed_dataset
+
+# 預設流量組合（權重）
+DEFAULT_MIX = 'calendar=10,timeline=35,employee=30,update=15,cancel=10'
+SCENARIOS = ('calendar', 'timeline', 'employee', 'update', 'cancel')
+WRITE_SCENARIOS = ('update', 'cancel')
+# 流量集中在今天前後的日期
+WINDOW_DAYS = 7
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS or not weight.strip().isdigit():
+            raise CommandError(f'--mix 格式錯誤：{part}（可用：{", ".join(SCENARIOS)}）')
+        mix[name] = int(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    help = ('以合成資料與多個並行 client 重播實際的流量組合（日曆頁、時間軸單日、拖拽更新、取消、員工側欄），'
+            '回報每個端點的吞吐量與 p50 / p95 / p99 延遲。update / cancel 會寫入排班資料，'
+            '只在資料庫全部是合成資料時送出，否則需加 --allow-writes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='對已啟動的伺服器測試（需與本指令使用同一個資料庫），不另外啟動')
+        parser.add_argument('--server', choices=SERVER_KINDS, default='asgi',
+                            help='本機啟動的伺服器：asgi（daphne，與部署相同）或 wsgi（gunicorn）')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn sync worker 數')
+        parser.add_argument('--db-latency', type=int, default=0, help='模擬每個 SQL 查詢的延遲（毫秒）')
+        parser.add_argument('--clients', type=int, default=20, help='並行 client（thread）數')
+        parser.add_argument('--duration', type=float, default=30, help='測試秒數')
+        parser.add_argument('--max-requests', type=int, default=0, help='總請求數上限（0 為不限）')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'流量權重，預設 {DEFAULT_MIX}')
+        parser.add_argument('--read-only', action='store_true', help='不送出 update / cancel')
+        parser.add_argument('--allow-writes', action='store_true',
+                            help='資料庫不是合成資料（或使用 --url）時仍送出 update / cancel，會修改實際的排班與員工取消次數')
+        parser.add_argument('--persons', type=int, default=300, help='資料庫沒有排班時建立的員工數')
+        parser.add_argument('--brands', type=int, default=40, help='資料庫沒有排班時建立的品牌數')
+        parser.add_argument('--schedules', type=int, default=100_000, help='資料庫沒有排班時建立的排班數')
+        parser.add_argument('--seed', type=int, default=1, help='流量的亂數種子')
+        parser.add_argument('--json', dest='json_path', help='另外將結果寫入 JSON 檔')
+
+    def _ensure_dataset(self, options):
+        if Schedule.objects.exists():
+            self.stdout.write('使用資料庫中現有的資料')
+            return
+        self.stdout.write(
+            f"建立合成資料：{options['persons']} 位員工、{options['brands']} 個品牌、{options['schedules']} 筆排班…")
+        started = time.perf_counter()
+        seed_dataset(options['persons'], options['brands'], options['schedules'])
+        self.stdout.write(f'完成（{time.perf_counter() - started:.1f} 秒）')
+
+    def _check_writes_allowed(self, options):
+        """update / cancel 會修改排班狀態並增加員工取消次數，只能對合成資料執行"""
+        if options['url']:
+            # 無法確認遠端伺服器使用的資料庫
+            raise CommandError('使用 --url 時 update / cancel 可能寫入實際資料：請加 --read-only，或確認後加 --allow-writes')
+        if not is_synthetic_dataset():
+            raise CommandError('資料庫中有非合成資料，update / cancel 會修改實際排班：'
+                               '請改用空的資料庫（會自動建立合成資料）、加 --read-only，或確認後加 --allow-writes')
+
+    def _targets(self):
+        today = timezone.localdate()
+        window = (today - timedelta(days=WINDOW_DAYS), today + timedelta(days=WINDOW_DAYS))
+        schedules = list(Schedule.objects.filter(date__range=window).exclude(room=0).values(
+            'id', 'date', 'room', 'start_time', 'end_time'))
+        person_ids = list(Person.objects.values_list('id', flat=True))
+        if not schedules or not person_ids:
+            raise CommandError(f'今天前後 {WINDOW_DAYS} 天沒有排班，無法產生流量')
+        return {
+            'dates': sorted({schedule['date'] for schedule in schedules}),
+            'schedules': schedules,
+            'rooms': sorted({(schedule['date'], schedule['room']) for schedule in schedules}),
+            'person_ids': person_ids,
+        }
+
+    def _request(self, scenario, targets, rng, base_url):
+        """回傳 (url, POST body 或 None)"""
+        if scenario == 'calendar':
+            return f"{base_url}/date-form/?date={rng.choice(targets['dates'])}", None
+        if scenario == 'timeline':
+            return f"{base_url}/timeline/?date={rng.choice(targets['dates'])}", None
+        if scenario == 'employee':
+            return f"{base_url}/api/employee-schedule/?employee_id={rng.choice(targets['person_ids'])}", None
+        if scenario == 'update':
+            # 拖拽放回原位：與前端相同的請求與寫入，不會產生時段衝突
+            schedule = rng.choice(targets['schedules'])
+            payload = {
+                'id': schedule['id'],
+                'room': schedule['room'],
+                'start_time': schedule['start_time'].strftime('%H:%M'),
+                'end_time': schedule['end_time'].strftime('%H:%M'),
+            }
+            return f'{base_url}/api/update-schedule/', json.dumps(payload).encode()
+        day, room = rng.choice(targets['rooms'])
+        payload = {'date': day.strftime('%Y-%m-%d'), 'room': room, 'reason': 'cancel'}
+        return f'{base_url}/cancel-schedule/', json.dumps(payload).encode()
+
+    def _client(self, index, base_url, targets, mix, deadline, budget, options, records):
+        rng = random.Random(options['seed'] * 1000 + index)
+        names, weights = zip(*mix.items())
+        local = []
+        while time.monotonic() < deadline and budget():
+            scenario = rng.choices(names, weights)[0]
+            url, data = self._request(scenario, targets, rng, base_url)
+            duration, status = fetch(url, data)
+            local.append((scenario, duration, status))
+        records.extend(local)
+
+    def handle(self, *args, **options):
+        if not options['url'] and os.environ.get('RAILWAY_ENVIRONMENT'):
+            raise CommandError('loadtest 會寫入資料庫，不可在 Railway 環境執行')
+        mix = _parse_mix(options['mix'])
+        if options['read_only']:
+            mix = {name: weight for name, weight in mix.items() if name not in WRITE_SCENARIOS}
+        mix = {name: weight for name, weight in mix.items() if weight > 0}
+        if not mix:
+            raise CommandError('流量組合中沒有任何端點')
+
+        writes = bool(set(mix) & set(WRITE_SCENARIOS))
+        if not options['url']:
+            self._ensure_dataset(options)
+        if writes and not options['allow_writes']:
+            self._check_writes_allowed(options)
+        if writes and not options['url'] and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite 一次只允許一個寫入 transaction，並行的 update / cancel 可能回傳 500（database is locked）；'
+                '估算正式環境容量請以 DATABASE_URL 指向 PostgreSQL'))
+        targets = self._targets()
+
+        server = (nullcontext(options['url'].rstrip('/')) if options['url']
+                  else local_server(options['server'], options['workers'], options['db_latency']))
+        records = []
+        with server as base_url:
+            # 暖機：每種讀取請求各一次
+            warmup = random.Random(options['seed'])
+            for scenario in mix:
+                if scenario not in WRITE_SCENARIOS:
+                    fetch(*self._request(scenario, targets, warmup, base_url))
+
+            remaining = [options['max_requests']]
+            lock = threading.Lock()
+
+            def budget():
+                if not options['max_requests']:
+                    return True
+                with lock:
+                    remaining[0] -= 1
+                    return remaining[0] >= 0
+
+            started = time.perf_counter()
+            deadline = time.monotonic() + options['duration']
+            threads = [
+                threading.Thread(target=self._client, args=(
+                    index, base_url, targets, mix, deadline, budget, options, records))
+                for index in range(options['clients'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        by_scenario = defaultdict(list)
+        statuses = defaultdict(Counter)
+        for scenario, duration, status in records:
+            by_scenario[scenario].append(duration)
+            statuses[scenario][status] += 1
+        results = {}
+        for scenario in mix:
+            if not by_scenario[scenario]:
+                continue
+            errors = sum(count for status, count in statuses[scenario].items() if is_error(status))
+            results[scenario] = latency_summary(by_scenario[scenario], errors, elapsed)
+            results[scenario]['statuses'] = {str(status): count for status, count in sorted(statuses[scenario].items())}
+        results['total'] = latency_summary(
+            [duration for _, duration, _ in records],
+            sum(stats['errors'] for stats in results.values()), elapsed)
+
+        target = options['url'] or f"{options['server']} (本機)"
+        self.stdout.write(f"{target}，{options['clients']} 個 client，{elapsed:.1f} 秒")
+        self.stdout.write(f"{'endpoint':<10} {'requests':>8} {'errors':>6} {'req/s':>8} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for scenario, stats in results.items():
+            self.stdout.write(
+                f"{scenario:<10} {stats['requests']:>8} {stats['errors']:>6} {stats['rps']:>8} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {stats['max_ms']:>8}")
+        for scenario, stats in results.items():
+            failed = {status: count for status, count in stats.get('statuses', {}).items() if is_error(int(status))}
+            if failed:
+                # 0 為連線失敗；409 為排班時段衝突
+                self.stdout.write(self.style.WARNING(
+                    f"{scenario} 錯誤狀態碼：" + '、'.join(f'{status} × {count}' for status, count in failed.items())))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as fh:
+                json.dump({
+                    'target': target,
+                    'clients': options['clients'],
+                    'seconds': round(elapsed, 3),
+                    'mix': mix,
+                    'db_latency_ms': options['db_latency'],
+                    'results': results,
+                }, fh, indent=2)
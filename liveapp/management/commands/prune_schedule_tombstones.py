@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from liveapp.sync import prune_tombstones, tombstone_retention
+
+
+class Command(BaseCommand):
+    help = '刪除超過保留期限（SCHEDULE_TOMBSTONE_DAYS）的排班刪除紀錄'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(
+            f'已刪除 {deleted} 筆超過 {tombstone_retention().days} 天的排班刪除紀錄'))
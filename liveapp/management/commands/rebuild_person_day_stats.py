@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from liveapp.rollup import rebuild_all
+
+
+class Command(BaseCommand):
+    help = '從排班資料重建員工每日彙總表（PersonDayStats）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建 {total} 筆員工每日彙總'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from liveapp.conflicts import (
+    DROP_EXCLUSION_CONSTRAINTS_SQL, EXCLUSION_CONSTRAINTS_SQL, describe_conflict, find_conflicts, person_names,
+)
+from liveapp.models import Schedule
+
+
+class Command(BaseCommand):
+    help = '檢查排班時段衝突，或在 PostgreSQL 上啟用 / 移除防止重疊的 exclusion constraint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['check', 'enable', 'disable'])
+
+    def _all_conflicts(self):
+        rows = Schedule.objects.exclude(modification_status='cancelled').values(
+            'id', 'person_id', 'date', 'start_time', 'end_time', 'room', 'role')
+        return find_conflicts(rows.iterator(chunk_size=2000))
+
+    def handle(self, *args, **options):
+        action = options['action']
+        if action == 'check':
+            conflicts = self._all_conflicts()
+            names = person_names(conflicts)
+            for conflict in conflicts:
+                ids = ', '.join(str(schedule_id) for schedule_id in conflict['ids'])
+                self.stdout.write(f"{describe_conflict(conflict, names)}（排班 {ids}）")
+            style = self.style.WARNING if conflicts else self.style.SUCCESS
+            self.stdout.write(style(f'共 {len(conflicts)} 筆衝突'))
+            return
+
+        if connection.vendor != 'postgresql':
+            raise CommandError('exclusion constraint 僅支援 PostgreSQL；其他資料庫由應用程式檢查衝突')
+        if action == 'enable':
+            conflicts = self._all_conflicts()
+            if conflicts:
+                raise CommandError(f'現有資料有 {len(conflicts)} 筆衝突，請先以 check 列出並修正')
+            statements = DROP_EXCLUSION_CONSTRAINTS_SQL + EXCLUSION_CONSTRAINTS_SQL
+        else:
+            statements = DROP_EXCLUSION_CONSTRAINTS_SQL
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        self.stdout.write(self.style.SUCCESS('已啟用 exclusion constraint' if action == 'enable' else '已移除 exclusion constraint'))
@@ -0,0 +1,206 @@
+import cProfile
+import logging
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # 未安裝 brotli 時只使用 gzip
+    brotli = None
+
+from .instrumentation import current_metrics, finish_request, observe, server_timing, start_request
+from .profiling import merge_profiles, profile_requested, profile_trigger, save_profile
+
+logger = logging.getLogger(__name__)
+
+# 小於此大小的 JSON 不壓縮
+COMPRESS_MIN_BYTES = 200
+# 動態內容使用中等品質：壓縮率接近最高品質，耗時少一個數量級
+BROTLI_QUALITY = 5
+_accepts_br = re.compile(r'\bbr\b')
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+class JsonCompressionMiddleware(MiddlewareMixin):
+    """壓縮 JSON 回應：瀏覽器支援且已安裝 brotli 時用 br，否則 gzip
+
+    HTML 不壓縮（含 CSRF token，避免 BREACH）；靜態檔案由 WhiteNoise 處理。
+    需放在其他會讀取回應內容的 middleware 之前。settings.JSON_COMPRESSION = False 時停用。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'JSON_COMPRESSION', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith('application/json')
+                or len(response.content) < COMPRESS_MIN_BYTES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.headers.get('Accept-Encoding', '')
+        if brotli is not None and _accepts_br.search(accept):
+            encoding, content = 'br', brotli.compress(response.content, quality=BROTLI_QUALITY)
+        elif _accepts_gzip.search(accept):
+            encoding, content = 'gzip', compress_string(response.content)
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = encoding
+        # 與 GZipMiddleware 相同：內容經過轉換，強 ETag 改為弱 ETag
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+
+class PerformanceMetricsMiddleware:
+    """記錄每個請求的 SQL / 模板 / JSON 時間，輸出 Server-Timing 並累加到 /metrics 的指標
+
+    放在 WhiteNoiseMiddleware 之後，靜態檔案不列入統計。同時支援 WSGI 與 ASGI。
+    settings.PERFORMANCE_METRICS = False 時停用。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_request(token)
+        return self._finish(request, response, metrics, time.perf_counter() - started)
+
+    async def _acall(self, request):
+        metrics, token = start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_request(token)
+        return self._finish(request, response, metrics, time.perf_counter() - started)
+
+    def _finish(self, request, response, metrics, duration):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        size = None if response.streaming else len(response.content)
+        observe(view, request.method, response.status_code, metrics, duration, size)
+        response.headers['Server-Timing'] = server_timing(metrics, duration)
+        return response
+
+
+class RequestProfilerMiddleware:
+    """以 cProfile 執行 staff 指定或抽樣到的請求，profile 與 SQL 存到 PROFILE_DIR（liveapp.profiling）
+
+    需放在 AuthenticationMiddleware 之後。回應帶 X-Profile-Id header。
+    同一 process 同時只 profile 一個請求（cProfile 無法在同一 thread 重疊），其餘照常執行。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.busy = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _trigger(self, request):
+        if request.path_info.startswith('/profiles/'):
+            return None
+        trigger = profile_trigger(request)
+        if trigger is None or not self.busy.acquire(blocking=False):
+            return None
+        return trigger
+
+    def _begin(self):
+        metrics = current_metrics()
+        token = None
+        if metrics is None:
+            # PerformanceMetricsMiddleware 停用時自行記錄 SQL
+            metrics, token = start_request()
+        metrics.sql = []
+        return metrics, token
+
+    def _end(self, metrics, token):
+        if token is not None:
+            finish_request(token)
+        sql, metrics.sql = metrics.sql, None
+        return sql
+
+    def _save(self, request, response, profiler, sql, trigger, duration):
+        try:
+            response.headers['X-Profile-Id'] = save_profile(profiler, request, response, duration, sql, trigger)
+        except OSError:
+            logger.exception('儲存 profile 失敗')
+        finally:
+            self.busy.release()
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        metrics, token = self._begin()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.busy.release()
+            raise
+        finally:
+            profiler.disable()
+            sql = self._end(metrics, token)
+        return self._save(request, response, profiler, sql, trigger, time.perf_counter() - started)
+
+    async def _acall(self, request):
+        if profile_requested(request):
+            # 讀取 request.user 可能查詢資料庫
+            trigger = await sync_to_async(self._trigger)(request)
+        else:
+            trigger = self._trigger(request)
+        if trigger is None:
+            return await self.get_response(request)
+        metrics, token = self._begin()
+        # cProfile 只記錄呼叫 enable() 的 thread：sync view 與 sync middleware 在此請求
+        # ThreadSensitiveContext 的 worker thread 執行，需在該 thread 另開一個 profiler
+        profiler, worker = cProfile.Profile(), cProfile.Profile()
+        started = time.perf_counter()
+        await sync_to_async(worker.enable)()
+        profiler.enable()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self.busy.release()
+            raise
+        finally:
+            profiler.disable()
+            await sync_to_async(worker.disable)()
+            sql = self._end(metrics, token)
+        return await sync_to_async(self._save)(
+            request, response, merge_profiles(profiler, worker), sql, trigger, time.perf_counter() - started)
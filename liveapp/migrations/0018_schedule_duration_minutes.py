@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def backfill_duration_minutes(apps, schema_editor):
+    Schedule = apps.get_model('liveapp', 'Schedule')
+    batch = []
+    for schedule in Schedule.objects.only('id', 'start_time', 'end_time').iterator(chunk_size=2000):
+        start_minutes = schedule.start_time.hour * 60 + schedule.start_time.minute
+        end_minutes = schedule.end_time.hour * 60 + schedule.end_time.minute
+        schedule.duration_minutes = (end_minutes - start_minutes) % (24 * 60)
+        batch.append(schedule)
+        if len(batch) >= 2000:
+            Schedule.objects.bulk_update(batch, ['duration_minutes'])
+            batch = []
+    if batch:
+        Schedule.objects.bulk_update(batch, ['duration_minutes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liveapp', '0017_alter_company_options_schedule_modification_reason_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='時長(分鐘)'),
+        ),
+        migrations.RunPython(backfill_duration_minutes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_person_day_stats(apps, schema_editor):
+    Schedule = apps.get_model('liveapp', 'Schedule')
+    PersonDayStats = apps.get_model('liveapp', 'PersonDayStats')
+    rows = Schedule.objects.values('person_id', 'date').annotate(
+        scheduled_minutes=Sum('duration_minutes'),
+        late_hours=Sum('late_hours'),
+        cancellations=Count('id', filter=Q(is_late_cancellation=True)),
+        shift_count=Count('id'),
+    ).order_by()
+    batch = []
+    for row in rows.iterator(chunk_size=2000):
+        batch.append(PersonDayStats(
+            person_id=row['person_id'],
+            date=row['date'],
+            scheduled_minutes=row['scheduled_minutes'] or 0,
+            late_hours=row['late_hours'] or 0,
+            cancellations=row['cancellations'],
+            shift_count=row['shift_count'],
+        ))
+        if len(batch) >= 2000:
+            PersonDayStats.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PersonDayStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liveapp', '0020_invoice_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonDayStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled_minutes', models.PositiveIntegerField(default=0, verbose_name='排班分鐘')),
+                ('late_hours', models.DecimalField(decimal_places=2, default=0.0, max_digits=7, verbose_name='遲到時數')),
+                ('cancellations', models.PositiveIntegerField(default=0, verbose_name='取消班次')),
+                ('shift_count', models.PositiveIntegerField(default=0, verbose_name='班次數')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_stats', to='liveapp.person')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'person'], name='liveapp_pds_date_person_idx')],
+                'constraints': [models.UniqueConstraint(fields=('person', 'date'), name='liveapp_persondaystats_person_date')],
+            },
+        ),
+        migrations.RunPython(backfill_person_day_stats, migrations.RunPython.noop),
+    ]
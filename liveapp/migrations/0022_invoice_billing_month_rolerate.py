@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liveapp', '0021_persondaystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoleRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('主播', '主播'), ('運營', '運營')], max_length=50, unique=True)),
+                ('hourly_rate', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, verbose_name='時薪')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='billing_month',
+            field=models.DateField(blank=True, null=True, verbose_name='結算月份'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('person', 'billing_month'), name='liveapp_invoice_person_month'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('liveapp', '0022_invoice_billing_month_rolerate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='schedule',
+            name='modified_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='修改時間'),
+        ),
+        migrations.CreateModel(
+            name='ScheduleTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('schedule_id', models.BigIntegerField()),
+                ('person_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
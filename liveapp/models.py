@@ -1,6 +1,10 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
 from django.utils import timezone
 
+from .signals import notify_schedules_changed
+
 
 class Company(models.Model):
     name = models.CharField(max_length=200, verbose_name='')
@@ -25,9 +29,23 @@ class Person(models.Model):
     late_count = models.IntegerField(default=0, verbose_name='遲到次數')
     cancel_count = models.IntegerField(default=0, verbose_name='取消次數')
 
+    # 排班畫面會顯示的欄位，變更時才需要通知該員工的排班（見 signals._person_changed）
+    DISPLAY_FIELDS = ('name', 'nick_name')
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_display = tuple(instance.__dict__.get(field) for field in cls.DISPLAY_FIELDS)
+        return instance
+
+    def display_changed(self):
+        """姓名 / 暱稱是否與載入時不同（未由資料庫載入時視為已變更）"""
+        loaded = getattr(self, '_loaded_display', None)
+        return loaded != tuple(getattr(self, field) for field in self.DISPLAY_FIELDS)
+
 
 class Invoice(models.Model):
     person = models.ForeignKey(Person, on_delete=models.CASCADE)
@@ -38,6 +56,16 @@ class Invoice(models.Model):
     receipt_number = models.CharField(max_length=50, blank=True)
     total_amount = models.DecimalField(
         max_digits=10, decimal_places=2, default=0.00)
+    # 由排班自動產生的月結發票記錄所屬月份（該月第一天），手動建立的發票為空
+    billing_month = models.DateField(null=True, blank=True, verbose_name='結算月份')
+
+    class Meta:
+        # 發票清單依 (date, id) 做 keyset 分頁
+        indexes = [models.Index(fields=['date', 'id'], name='liveapp_invoice_date_id_idx')]
+        constraints = [
+            # 每位員工每月只會有一張自動產生的發票
+            models.UniqueConstraint(fields=['person', 'billing_month'], name='liveapp_invoice_person_month'),
+        ]
 
     def __str__(self):
         return f"Invoice {self.receipt_number or 'Unnamed'}"
@@ -55,6 +83,82 @@ class InvoiceItem(models.Model):
         return f"Item {self.hours} hrs @ {self.rate}"
 
 
+class RoleRate(models.Model):
+    """各角色的時薪，月結發票依此計算金額"""
+    role = models.CharField(max_length=50, unique=True, choices=[
+                            ('主播', '主播'), ('運營', '運營')])
+    hourly_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name='時薪')
+
+    def __str__(self):
+        return f"{self.role} @ {self.hourly_rate}"
+
+
+class ScheduleQuerySet(models.QuerySet):
+    """bulk_create / bulk_update / update 不會呼叫 save() 或送出 model signal，
+    在這裡同步維護 duration_minutes、modified_at 並送出 schedules_changed"""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.duration_minutes = Schedule.compute_duration_minutes(obj.start_time, obj.end_time)
+            obj.modified_at = now
+        created = super().bulk_create(objs, *args, **kwargs)
+        # ignore_conflicts 時資料庫不回傳 id，只能以 (person_id, date) 通知
+        ids = [obj.pk for obj in objs] if all(obj.pk for obj in objs) else ()
+        notify_schedules_changed(Schedule, {(obj.person_id, obj.date) for obj in objs}, ids=ids, created=True)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if 'start_time' in fields or 'end_time' in fields:
+            for obj in objs:
+                obj.duration_minutes = Schedule.compute_duration_minutes(obj.start_time, obj.end_time)
+            if 'duration_minutes' not in fields:
+                fields.append('duration_minutes')
+        now = timezone.now()
+        for obj in objs:
+            obj.modified_at = now
+        if 'modified_at' not in fields:
+            fields.append('modified_at')
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        notify_schedules_changed(
+            Schedule, {key for obj in objs for key in obj.change_keys()}, ids=[obj.pk for obj in objs])
+        for obj in objs:
+            obj._loaded_key = (obj.person_id, obj.date)
+        return rows
+
+    def update(self, **kwargs):
+        kwargs.setdefault('modified_at', timezone.now())
+        moved = bool({'date', 'person', 'person_id'} & set(kwargs))
+        matched = list(self.values_list('id', 'person_id', 'date'))
+        ids = [schedule_id for schedule_id, _, _ in matched]
+        keys = {(person_id, day) for _, person_id, day in matched}
+        if {'start_time', 'end_time'} & set(kwargs) and 'duration_minutes' not in kwargs:
+            with transaction.atomic(using=self.db):
+                rows = super().update(**kwargs)
+                self._recompute_durations(ids)
+        else:
+            rows = super().update(**kwargs)
+        if moved and rows:
+            keys |= set(Schedule.objects.filter(id__in=ids).values_list('person_id', 'date'))
+        notify_schedules_changed(Schedule, keys, ids=ids)
+        return rows
+
+    def _recompute_durations(self, ids):
+        """update() 改了開始 / 結束時間後重算時長；每筆時間不同，依重算結果分組更新
+        （跨夜班次無法以各資料庫通用的 SQL 計算）"""
+        by_duration = defaultdict(list)
+        rows = Schedule.objects.using(self.db).filter(id__in=ids).values_list('id', 'start_time', 'end_time')
+        for schedule_id, start_time, end_time in rows:
+            by_duration[Schedule.compute_duration_minutes(start_time, end_time)].append(schedule_id)
+        for minutes, schedule_ids in by_duration.items():
+            # 以 QuerySet.update 直接寫入，不再經過本類別的 update()（modified_at 與通知已處理）
+            models.QuerySet.update(
+                Schedule.objects.using(self.db).filter(id__in=schedule_ids), duration_minutes=minutes)
+
+
 class Schedule(models.Model):
     MODIFICATION_STATUS_CHOICES = [
         ('normal', '正常'),
@@ -69,6 +173,9 @@ class Schedule(models.Model):
                             ('主播', '主播'), ('運營', '運營')])
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # 班次時長（分鐘），每次儲存時由 start_time / end_time 計算，供資料庫直接 SUM
+    duration_minutes = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False, verbose_name='時長(分鐘)')
     # 品牌選項
     brand = models.ForeignKey(
         'Brand',
@@ -90,18 +197,54 @@ class Schedule(models.Model):
         verbose_name='修改狀態'
     )
     modification_reason = models.TextField(blank=True, verbose_name='修改原因')
-    modified_at = models.DateTimeField(null=True, blank=True, verbose_name='修改時間')
+    # 每次寫入（save / bulk_create / bulk_update / update）都會更新，供 delta sync 使用
+    modified_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name='修改時間')
+
+    objects = ScheduleQuerySet.as_manager()
+
+    @classmethod
+    def compute_duration_minutes(cls, start_time, end_time):
+        """計算班次分鐘數；end_time 早於 start_time 視為跨夜班次
+
+        只計整分鐘，秒數捨去（舊的 duration property 會把秒數算進時數）；排班表單與匯入的時間
+        都只到分鐘，秒數只可能來自 admin 或直接寫入的資料。
+        """
+        start_time = cls._meta.get_field('start_time').to_python(start_time)
+        end_time = cls._meta.get_field('end_time').to_python(end_time)
+        start_minutes = start_time.hour * 60 + start_time.minute
+        end_minutes = end_time.hour * 60 + end_time.minute
+        return (end_minutes - start_minutes) % (24 * 60)
+
+    def save(self, *args, **kwargs):
+        self.duration_minutes = self.compute_duration_minutes(self.start_time, self.end_time)
+        self.modified_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'modified_at'}
+            if {'start_time', 'end_time'} & update_fields:
+                update_fields.add('duration_minutes')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
 
     @property
     def duration(self):
-        """Calculate total hours for this schedule"""
-        # Calculate based on time components (hours and minutes)
-        start_minutes = self.start_time.hour * 60 + \
-            self.start_time.minute + self.start_time.second / 60
-        end_minutes = self.end_time.hour * 60 + \
-            self.end_time.minute + self.end_time.second / 60
-        total_hours = (end_minutes - start_minutes) / 60
-        return round(total_hours, 2)
+        """Total hours for this schedule, derived from the stored minutes"""
+        return round(self.duration_minutes / 60, 2)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 記錄載入時的員工與日期，改期或換人時舊的日期也要通知變更
+        instance._loaded_key = (instance.__dict__.get('person_id'), instance.__dict__.get('date'))
+        return instance
+
+    def change_keys(self):
+        """這筆排班變更時受影響的 (person_id, date)，包含載入時的舊值"""
+        keys = {(self.person_id, self.date)}
+        loaded_key = getattr(self, '_loaded_key', None)
+        if loaded_key and all(loaded_key):
+            keys.add(loaded_key)
+        return keys
 
 
 class Brand(models.Model):
@@ -137,3 +280,44 @@ class Brand(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class ScheduleVersion(models.Model):
+    """每個日期 / 員工的排班版本號，排班變更時遞增，供 ETag / Last-Modified 使用"""
+    # 'date:2024-01-31' 或 'person:12'
+    scope = models.CharField(max_length=40, unique=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+
+class ScheduleTombstone(models.Model):
+    """已刪除排班的紀錄（含刪除員工時連帶刪除的排班），供 delta sync 通知前端移除"""
+    schedule_id = models.BigIntegerField()
+    person_id = models.BigIntegerField()
+    date = models.DateField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Schedule {self.schedule_id} deleted at {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class PersonDayStats(models.Model):
+    """每位員工每日的排班彙總，排班變更時只重算受影響的 (員工, 日期)"""
+    person = models.ForeignKey(Person, on_delete=models.CASCADE, related_name='day_stats')
+    date = models.DateField()
+    scheduled_minutes = models.PositiveIntegerField(default=0, verbose_name='排班分鐘')
+    late_hours = models.DecimalField(max_digits=7, decimal_places=2, default=0.00, verbose_name='遲到時數')
+    cancellations = models.PositiveIntegerField(default=0, verbose_name='取消班次')
+    shift_count = models.PositiveIntegerField(default=0, verbose_name='班次數')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['person', 'date'], name='liveapp_persondaystats_person_date'),
+        ]
+        indexes = [models.Index(fields=['date', 'person'], name='liveapp_pds_date_person_idx')]
+
+    def __str__(self):
+        return f"{self.person_id} {self.date}"
@@ -0,0 +1,177 @@
+"""請求 profiler 與 profile 存放
+
+``RequestProfilerMiddleware`` 在以下情況以 cProfile 執行整個請求：
+
+- staff 使用者帶 ``X-Profile: 1`` header 或 ``?_profile=1``
+- 依 ``settings.PROFILE_SAMPLE_RATE``（0–1，預設 0）隨機抽樣
+
+profile（pstats 格式）與同一請求的 SQL（語句與耗時，不含參數）存到
+``settings.PROFILE_DIR``，每個 profile 一個 ``.prof`` 與一個 ``.json``，
+超過 ``settings.PROFILE_MAX_FILES`` 筆時刪除最舊的。staff 可在 /profiles/ 列出、下載與比較。
+
+cProfile 只記錄執行 profiler 的 thread。ASGI 下另在請求的 sync worker thread
+（sync view、sync middleware 與 thread_sensitive 的 sync_to_async 呼叫）開一個 profiler，
+儲存時與 event loop 的合併；同一 event loop 上其他請求的執行仍可能被算入。
+"""
+import io
+import json
+import os
+import pstats
+import random
+import re
+import secrets
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+PROFILE_ID_RE = re.compile(r'^\d{8}-\d{12}-[0-9a-f]{6}$')
+# 單一 profile 最多保存的 SQL 數
+MAX_SQL = 1000
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'profiles'))
+
+
+def profile_requested(request):
+    return request.headers.get('X-Profile') == '1' or request.GET.get('_profile') == '1'
+
+
+def profile_trigger(request):
+    """回傳 'staff'、'sample' 或 None（不 profile）；只有帶了 profile 旗標時才讀取 request.user"""
+    if profile_requested(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return 'staff'
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    if rate > 0 and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def _path(profile_id, suffix):
+    if not PROFILE_ID_RE.match(profile_id or ''):
+        raise FileNotFoundError(profile_id)
+    return os.path.join(profile_dir(), f'{profile_id}{suffix}')
+
+
+def merge_profiles(profiler, *others):
+    """把其他 thread 的 profiler 合併到 profiler，回傳可 dump_stats 的 pstats.Stats；沒有記錄的略過"""
+    stats = pstats.Stats(profiler)
+    for other in others:
+        other.create_stats()
+        if other.stats:
+            stats.add(other)
+    return stats
+
+
+def save_profile(profiler, request, response, duration, sql, trigger):
+    """儲存 profile 與 metadata，回傳 profile id"""
+    now = timezone.now()
+    # 依時間排序即為建立順序（rotate 時刪除最舊的）
+    profile_id = f'{now:%Y%m%d-%H%M%S%f}-{secrets.token_hex(3)}'
+    os.makedirs(profile_dir(), exist_ok=True)
+    profiler.dump_stats(_path(profile_id, '.prof'))
+    match = request.resolver_match
+    meta = {
+        'id': profile_id,
+        'created': now.isoformat(),
+        'view': match.view_name if match else '<unresolved>',
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'trigger': trigger,
+        'duration_ms': round(duration * 1000, 2),
+        'sql_count': len(sql),
+        'sql_ms': round(sum(elapsed for _, elapsed in sql) * 1000, 2),
+        'sql': [{'sql': statement, 'ms': round(elapsed * 1000, 3)} for statement, elapsed in sql[:MAX_SQL]],
+    }
+    with open(_path(profile_id, '.json'), 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh, ensure_ascii=False)
+    rotate_profiles()
+    return profile_id
+
+
+def rotate_profiles():
+    """只保留最新的 PROFILE_MAX_FILES 筆"""
+    keep = getattr(settings, 'PROFILE_MAX_FILES', 200)
+    ids = sorted(name[:-5] for name in os.listdir(profile_dir()) if name.endswith('.json'))
+    for profile_id in ids[:max(len(ids) - keep, 0)]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(_path(profile_id, suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """所有 profile 的 metadata（不含 SQL），新的在前"""
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            meta = load_profile(name[:-5])
+        except (OSError, ValueError):
+            continue
+        meta.pop('sql', None)
+        profiles.append(meta)
+    return profiles
+
+
+def load_profile(profile_id):
+    with open(_path(profile_id, '.json'), encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def profile_file(profile_id):
+    path = _path(profile_id, '.prof')
+    if not os.path.exists(path):
+        raise FileNotFoundError(profile_id)
+    return path
+
+
+def profile_report(profile_id, sort='cumulative', limit=40):
+    """pstats 文字報表"""
+    output = io.StringIO()
+    stats = pstats.Stats(profile_file(profile_id), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def repeated_sql(meta, limit=10):
+    """同一語句執行多次（常見於 N+1）的 SQL，依次數排序"""
+    counts = Counter(entry['sql'] for entry in meta.get('sql', []))
+    return [(statement, count) for statement, count in counts.most_common(limit) if count > 1]
+
+
+def _function_times(profile_id):
+    stats = pstats.Stats(profile_file(profile_id))
+    return {
+        pstats.func_std_string(func): (calls, total, cumulative)
+        for func, (_, calls, total, cumulative, _) in stats.stats.items()
+    }
+
+
+def diff_profiles(base_id, other_id, limit=30):
+    """比較兩個 profile 每個函式的 cumulative time，依差異絕對值排序"""
+    base, other = _function_times(base_id), _function_times(other_id)
+    rows = []
+    for func in base.keys() | other.keys():
+        base_calls, _, base_cumulative = base.get(func, (0, 0.0, 0.0))
+        other_calls, _, other_cumulative = other.get(func, (0, 0.0, 0.0))
+        rows.append({
+            'function': func,
+            'base_calls': base_calls,
+            'other_calls': other_calls,
+            'base_ms': round(base_cumulative * 1000, 3),
+            'other_ms': round(other_cumulative * 1000, 3),
+            'delta_ms': round((other_cumulative - base_cumulative) * 1000, 3),
+        })
+    rows.sort(key=lambda row: abs(row['delta_ms']), reverse=True)
+    return rows[:limit]
@@ -0,0 +1,136 @@
+"""排班即時更新（Django Channels）
+
+每個日期一個 channel group（``schedules.YYYY-MM-DD``），時間軸與日曆頁面透過
+WebSocket 訂閱畫面上已載入的日期。收到 ``schedules_changed`` 時先記下變更的排班 id，
+transaction commit 後以一次查詢讀取最新資料，依日期送出差異：
+
+    {"type": "diff", "date": "2026-11-10", "changes": [
+        {"op": "created" | "updated" | "cancelled", "schedule": {...}},
+        {"op": "deleted", "id": 12},
+    ]}
+
+``schedule`` 與時間軸 API 的排班格式相同（``serializers.timeline_schedule``）；排班改期或刪除時，
+舊日期收到 ``deleted``。員工 / 品牌資料變更時，受影響日期的排班以 ``updated`` 重送。
+Channel layer 由 settings.CHANNEL_LAYERS 設定（預設 in-memory，REDIS_URL 時使用 Redis）。
+"""
+import logging
+import threading
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+
+from .signals import schedules_changed
+from .serializers import timeline_schedule, timeline_values
+
+logger = logging.getLogger(__name__)
+
+GROUP_PREFIX = 'schedules'
+MESSAGE_TYPE = 'schedule.diff'
+
+_local = threading.local()
+
+
+def date_group(day):
+    return f'{GROUP_PREFIX}.{day:%Y-%m-%d}'
+
+
+class _PendingChanges:
+    """同一個 transaction 內累積的變更，commit 後由 on_commit 呼叫 flush 一次送出"""
+
+    def __init__(self):
+        self.dates_by_id = defaultdict(set)
+        self.created = set()
+        # 沒有排班 id 的變更（員工 / 品牌資料），重送這些 (person_id, date) 的排班
+        self.keys = set()
+
+    def add(self, keys, ids, created):
+        dates = {day for _, day in keys if day}
+        if ids:
+            for schedule_id in ids:
+                self.dates_by_id[schedule_id] |= dates
+            if created:
+                self.created |= set(ids)
+        else:
+            self.keys |= {(person_id, day) for person_id, day in keys if person_id and day}
+
+    def messages(self):
+        """回傳 {date: [change, ...]}"""
+        ids = set(self.dates_by_id)
+        if not ids and not self.keys:
+            return {}
+        current = {}
+        if ids:
+            current.update((row['id'], row) for row in timeline_values(id__in=ids))
+        if self.keys:
+            candidates = timeline_values(
+                person_id__in={person_id for person_id, _ in self.keys},
+                date__in={day for _, day in self.keys},
+            )
+            current.update((row['id'], row) for row in candidates if (row['person_id'], row['date']) in self.keys)
+
+        changes = defaultdict(list)
+        for row in sorted(current.values(), key=lambda row: (row['date'], row['start_time'], row['id'])):
+            if row['id'] in self.created:
+                op = 'created'
+            elif row['modification_status'] == 'cancelled':
+                op = 'cancelled'
+            else:
+                op = 'updated'
+            changes[row['date']].append({'op': op, 'schedule': timeline_schedule(row)})
+        for schedule_id, dates in self.dates_by_id.items():
+            row = current.get(schedule_id)
+            for day in dates:
+                if row is None or row['date'] != day:
+                    changes[day].append({'op': 'deleted', 'id': schedule_id})
+        return changes
+
+    def flush(self):
+        if getattr(_local, 'pending', None) is self:
+            _local.pending = None
+        try:
+            broadcast(self.messages())
+        except Exception:
+            # 推播失敗不影響已 commit 的資料，前端重新整理即可取得最新狀態
+            logger.exception('排班即時更新推播失敗')
+
+
+def broadcast(changes):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    group_send = async_to_sync(layer.group_send)
+    for day, day_changes in sorted(changes.items()):
+        group_send(date_group(day), {
+            'type': MESSAGE_TYPE,
+            'date': day.strftime('%Y-%m-%d'),
+            'changes': day_changes,
+        })
+
+
+def _awaiting_commit(pending):
+    """pending.flush 是否仍登記在目前 transaction 的 on_commit；rollback 時 Django 會移除登記"""
+    connection = transaction.get_connection()
+    return any(func == pending.flush for _, func, *_ in connection.run_on_commit)
+
+
+@receiver(schedules_changed)
+def _queue_broadcast(sender, keys, ids=frozenset(), created=False, **kwargs):
+    pending = getattr(_local, 'pending', None)
+    if pending is None or not _awaiting_commit(pending):
+        # 第一次變更，或先前的 transaction 已 rollback（其變更不推播）：重新開始累積
+        pending = _local.pending = _PendingChanges()
+        pending.add(keys, ids, created)
+        # 不在 transaction 中時 on_commit 會立即執行
+        transaction.on_commit(pending.flush)
+    else:
+        pending.add(keys, ids, created)
+
+
+@receiver(request_finished)
+def _discard_pending(sender, **kwargs):
+    # 請求結束時丟棄 rollback 留下的變更，不帶到同一個 thread 的下一個請求
+    _local.pending = None
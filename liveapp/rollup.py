@@ -0,0 +1,112 @@
+"""員工每日排班彙總（PersonDayStats）
+
+收到 ``schedules_changed`` 時只重算受影響的 (person_id, date)，
+統計畫面直接讀取彙總列，不再掃描所有排班；員工班表（單一與批次 API）的本月統計
+以 ``month_stats_values`` / ``employee_stats`` 計算。
+``rebuild_person_day_stats`` 指令可從頭重建整張表。
+"""
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+from django.dispatch import receiver
+
+from .models import PersonDayStats, Schedule
+from .signals import schedules_changed
+from .utilisation import month_bounds
+
+STAT_FIELDS = ['scheduled_minutes', 'late_hours', 'cancellations', 'shift_count']
+
+
+def aggregate_person_days(schedules):
+    """將排班依 (person, date) 彙總成 PersonDayStats 欄位"""
+    return schedules.values('person_id', 'date').annotate(
+        scheduled_minutes=Sum('duration_minutes'),
+        late_hours=Sum('late_hours'),
+        cancellations=Count('id', filter=Q(is_late_cancellation=True)),
+        shift_count=Count('id'),
+    ).order_by()
+
+
+def stats_from_row(row):
+    return PersonDayStats(
+        person_id=row['person_id'],
+        date=row['date'],
+        scheduled_minutes=row['scheduled_minutes'] or 0,
+        late_hours=row['late_hours'] or 0,
+        cancellations=row['cancellations'],
+        shift_count=row['shift_count'],
+    )
+
+
+def month_stats_values(person_ids, today):
+    """person_ids 在 today 所在月份的分鐘數、班次數與取消數，每位員工一列"""
+    return PersonDayStats.objects.filter(
+        person_id__in=person_ids, date__range=month_bounds(today),
+    ).values('person_id').annotate(
+        minutes=Sum('scheduled_minutes'),
+        total=Sum('shift_count'),
+        cancelled=Sum('cancellations'),
+    ).order_by()
+
+
+def employee_stats(row=None):
+    """員工班表的統計格式；row 為 month_stats_values 的一列，本月沒有排班時為 None"""
+    row = row or {}
+    total = row.get('total') or 0
+    cancelled = row.get('cancelled') or 0
+    return {
+        'total_hours': round((row.get('minutes') or 0) / 60, 1),
+        'attendance_rate': round((total - cancelled) / total * 100, 1) if total > 0 else 100,
+        'total_schedules': total,
+        'cancelled_schedules': cancelled,
+    }
+
+
+def _keys_filter(keys):
+    dates_by_person = defaultdict(set)
+    for person_id, day in keys:
+        dates_by_person[person_id].add(day)
+    condition = Q()
+    for person_id, dates in dates_by_person.items():
+        condition |= Q(person_id=person_id, date__in=dates)
+    return condition
+
+
+def refresh_person_days(keys):
+    """重算指定 (person_id, date) 的彙總列；已無排班的列會被刪除"""
+    keys = {(person_id, day) for person_id, day in keys if person_id and day}
+    if not keys:
+        return
+    condition = _keys_filter(keys)
+    rows = [stats_from_row(row) for row in aggregate_person_days(Schedule.objects.filter(condition))]
+    if rows:
+        PersonDayStats.objects.bulk_create(
+            rows, update_conflicts=True,
+            unique_fields=['person', 'date'], update_fields=STAT_FIELDS)
+    empty = keys - {(row.person_id, row.date) for row in rows}
+    if empty:
+        PersonDayStats.objects.filter(_keys_filter(empty)).delete()
+
+
+@receiver(schedules_changed)
+def _refresh_on_change(sender, keys, **kwargs):
+    # 員工 / 品牌資料變更不影響時數統計
+    if sender is Schedule:
+        refresh_person_days(keys)
+
+
+def rebuild_all(batch_size=2000):
+    """清空並重建整張彙總表，回傳寫入的列數"""
+    PersonDayStats.objects.all().delete()
+    batch = []
+    total = 0
+    for row in aggregate_person_days(Schedule.objects.all()).iterator(chunk_size=batch_size):
+        batch.append(stats_from_row(row))
+        if len(batch) >= batch_size:
+            PersonDayStats.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        PersonDayStats.objects.bulk_create(batch)
+        total += len(batch)
+    return total
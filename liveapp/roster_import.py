@@ -0,0 +1,197 @@
+"""排班表 CSV 匯入
+
+CSV 欄位（第一列為標題）：date, person, role, start, end, brand, room。
+person 可填姓名或暱稱，brand、room 可留空。員工與品牌在每個檔案只查詢一次，
+建立記憶體索引後逐列驗證；只要有任何錯誤就全部不寫入，並一次回報所有錯誤。
+全部通過後再檢查時段衝突（檔案內部與既有班次），
+沒有衝突才在單一 transaction 內以 bulk_create 寫入。
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_time
+
+from .conflicts import check_schedules, checks_enabled, describe_conflict, person_names
+from .models import Brand, Person, Schedule
+
+IMPORT_BATCH_SIZE = 500
+
+# 標題別名 → 標準欄位名
+HEADER_ALIASES = {
+    'date': 'date', '日期': 'date',
+    'person': 'person', 'name': 'person', 'nick_name': 'person', 'employee': 'person', '員工': 'person',
+    'role': 'role', '角色': 'role',
+    'start': 'start', 'start_time': 'start', '開始': 'start',
+    'end': 'end', 'end_time': 'end', '結束': 'end',
+    'brand': 'brand', '品牌': 'brand',
+    'room': 'room', '房間': 'room',
+}
+REQUIRED_COLUMNS = ['date', 'person', 'role', 'start', 'end']
+ROLE_ALIASES = {
+    '主播': '主播', 'streamer': '主播', 'anchor': '主播',
+    '運營': '運營', 'operator': '運營',
+}
+_ROOM_RE = re.compile(r'\d+')
+
+
+def _key(value):
+    return (value or '').strip().casefold()
+
+
+class RosterIndex:
+    """員工（姓名 / 暱稱）與品牌名稱的記憶體索引，每個檔案建立一次"""
+
+    def __init__(self):
+        self.persons = {}
+        self.ambiguous = set()
+        for person_id, name, nick_name in Person.objects.values_list('id', 'name', 'nick_name'):
+            for label in {_key(name), _key(nick_name)} - {''}:
+                if label in self.persons and self.persons[label] != person_id:
+                    self.ambiguous.add(label)
+                self.persons.setdefault(label, person_id)
+        # 同名品牌取 id 最小者（與 update_schedule_api 相同）
+        self.brands = {}
+        for brand_id, name in Brand.objects.order_by('-id').values_list('id', 'name'):
+            self.brands[_key(name)] = brand_id
+
+    def person(self, label):
+        key = _key(label)
+        if key in self.ambiguous:
+            raise ValueError(f'員工名稱「{label}」對應到多位員工')
+        if key not in self.persons:
+            raise ValueError(f'找不到員工「{label}」')
+        return self.persons[key]
+
+    def brand(self, label):
+        if not _key(label):
+            return None
+        if _key(label) not in self.brands:
+            raise ValueError(f'找不到品牌「{label}」')
+        return self.brands[_key(label)]
+
+
+def _parse_row(row, index):
+    """驗證單列並回傳未儲存的 Schedule；錯誤以訊息列表回傳"""
+    errors = []
+    fields = {}
+
+    def check(name, func):
+        try:
+            fields[name] = func()
+        except ValueError as exc:
+            errors.append(str(exc))
+
+    def date_value():
+        try:
+            value = parse_date(row['date'].strip())
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValueError(f"無效的日期「{row['date']}」")
+        return value
+
+    def time_value(column):
+        def parse():
+            try:
+                value = parse_time(row[column].strip())
+            except ValueError:
+                value = None
+            if value is None:
+                raise ValueError(f"無效的{'開始' if column == 'start' else '結束'}時間「{row[column]}」")
+            return value
+        return parse
+
+    def role_value():
+        role = ROLE_ALIASES.get(_key(row['role']))
+        if role is None:
+            raise ValueError(f"無效的角色「{row['role']}」")
+        return role
+
+    def room_value():
+        room = (row.get('room') or '').strip()
+        if not room or room == '未分配房間':
+            return 0
+        numbers = _ROOM_RE.findall(room)
+        if not numbers:
+            raise ValueError(f'無效的房間「{room}」')
+        return int(numbers[0])
+
+    check('date', date_value)
+    check('person_id', lambda: index.person(row['person']))
+    check('role', role_value)
+    check('start_time', time_value('start'))
+    check('end_time', time_value('end'))
+    check('brand_id', lambda: index.brand(row.get('brand')))
+    check('room', room_value)
+    if not errors and fields['start_time'] == fields['end_time']:
+        errors.append('開始與結束時間相同')
+    return (None if errors else Schedule(**fields)), errors
+
+
+def read_roster(file_or_text):
+    """讀取 CSV（檔案物件、bytes 或字串），回傳 (標準化後的資料列, 欄位錯誤)"""
+    if hasattr(file_or_text, 'read'):
+        file_or_text = file_or_text.read()
+    if isinstance(file_or_text, bytes):
+        file_or_text = file_or_text.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(file_or_text.lstrip('\ufeff')))
+    columns = {name: HEADER_ALIASES.get(_key(name)) for name in reader.fieldnames or []}
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns.values()]
+    if missing:
+        return [], [f"缺少欄位：{', '.join(missing)}"]
+    rows = []
+    for raw in reader:
+        row = {}
+        for name, value in raw.items():
+            if columns.get(name) and not row.get(columns[name]):
+                row[columns[name]] = value or ''
+        rows.append(row)
+    return rows, []
+
+
+def import_roster(file_or_text, dry_run=False):
+    """匯入排班表，回傳 {'success', 'created', 'rows', 'errors': [{'line', 'errors'}]}
+
+    任何一列驗證失敗時不寫入資料；dry_run 只驗證不寫入。
+    """
+    rows, header_errors = read_roster(file_or_text)
+    if header_errors:
+        return {'success': False, 'created': 0, 'rows': 0, 'errors': [{'line': 1, 'errors': header_errors}]}
+
+    index = RosterIndex()
+    schedules = []
+    errors = []
+    lines = []
+    invalid_rows = 0
+    # 第 1 行為標題，資料從第 2 行開始
+    for line, row in enumerate(rows, start=2):
+        if not any(value.strip() for value in row.values()):
+            continue
+        schedule, row_errors = _parse_row(row, index)
+        if row_errors:
+            errors.append({'line': line, 'errors': row_errors})
+            invalid_rows += 1
+        else:
+            schedules.append(schedule)
+            lines.append(line)
+
+    if not errors and checks_enabled():
+        # 檔案內部以及與既有班次的重疊，錯誤記在牽涉的每一列
+        conflict_errors = defaultdict(list)
+        conflicts = check_schedules(schedules)
+        names = person_names(conflicts)
+        for conflict in conflicts:
+            for candidate in conflict['candidates']:
+                conflict_errors[lines[candidate]].append(describe_conflict(conflict, names))
+        errors = [{'line': line, 'errors': messages} for line, messages in sorted(conflict_errors.items())]
+
+    result = {'success': not errors, 'created': 0, 'rows': len(lines) + invalid_rows, 'errors': errors}
+    if errors or dry_run:
+        return result
+    with transaction.atomic():
+        Schedule.objects.bulk_create(schedules, batch_size=IMPORT_BATCH_SIZE)
+    result['created'] = len(schedules)
+    return result
@@ -0,0 +1,224 @@
+"""排班 JSON 格式（時間軸、delta sync、即時更新、員工班表、日曆 API 共用）
+
+以 ``values()`` 一次 JOIN 取得需要的欄位，不建立 model instance；時間、日期與時數的
+換算以 lru_cache 快取（排班的開始 / 結束時間與時長只有少數幾種），其餘以 isoformat 取代
+較慢的 strftime。輸出與以 model instance 建立的舊格式逐位元組相同
+（benchmark_serializers 指令比對並量測兩者）。
+
+時間軸另有精簡格式（``compact_timeline``）：員工、品牌與狀態等字串各送一次對照表，
+排班改為整數陣列，由 timeline_view.js 還原成與一般格式相同的物件。
+"""
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from .models import Schedule
+
+NO_BRAND_COLOR = '#6c757d'
+
+# 時間軸前端使用的欄位（timeline_schedule 的輸入）
+TIMELINE_FIELDS = (
+    'id', 'date', 'person_id', 'role', 'start_time', 'end_time', 'duration_minutes', 'room',
+    'modification_status', 'modification_reason', 'is_late_cancellation', 'late_hours', 'modified_at',
+    'person__name', 'person__nick_name', 'brand_id', 'brand__name', 'brand__color', 'brand__responsible__name',
+)
+EMPLOYEE_FIELDS = (
+    'id', 'person_id', 'date', 'start_time', 'end_time', 'duration_minutes', 'role', 'room',
+    'is_late_cancellation', 'modification_status', 'brand_id', 'brand__name', 'brand__color',
+)
+CALENDAR_FIELDS = (
+    'id', 'date', 'role', 'start_time', 'end_time', 'duration_minutes', 'room',
+    'is_late_cancellation', 'person__name', 'brand__name', 'brand__color',
+)
+
+
+@lru_cache(maxsize=4096)
+def format_time(value):
+    """等同 strftime('%H:%M')"""
+    return value.isoformat('minutes')
+
+
+@lru_cache(maxsize=4096)
+def format_date(value):
+    """等同 strftime('%Y-%m-%d')"""
+    return value.isoformat()
+
+
+@lru_cache(maxsize=4096)
+def format_date_display(value):
+    return value.strftime('%m/%d')
+
+
+@lru_cache(maxsize=4096)
+def hours(minutes):
+    """與 Schedule.duration 相同的換算"""
+    return float(round(minutes / 60, 2))
+
+
+@lru_cache(maxsize=1024)
+def decimal_float(value):
+    return float(value)
+
+
+def format_minute(value):
+    """等同 strftime('%Y-%m-%d %H:%M')（isoformat 的前 16 個字元，之後為秒數與時區）"""
+    return value.isoformat(' ', 'minutes')[:16]
+
+
+def timeline_values(*args, **filters):
+    return Schedule.objects.filter(*args, **filters).values(*TIMELINE_FIELDS)
+
+
+def timeline_schedule(row):
+    """時間軸前端使用的排班資料格式（row 為 TIMELINE_FIELDS 的 values() 結果）"""
+    has_brand = row['brand_id'] is not None
+    modified_at = row['modified_at']
+    return {
+        'id': row['id'],
+        'person_name': row['person__name'],
+        'person_nick_name': row['person__nick_name'] or '',
+        'role': row['role'],
+        'start_time': format_time(row['start_time']),
+        'end_time': format_time(row['end_time']),
+        'duration': hours(row['duration_minutes']),
+        'brand_id': row['brand_id'],
+        'brand_name': row['brand__name'] if has_brand else '',
+        'brand_color': row['brand__color'] if has_brand else NO_BRAND_COLOR,
+        'brand_responsible': row['brand__responsible__name'] or '',
+        'room': row['room'],
+        'modification_status': row['modification_status'],
+        'modification_reason': row['modification_reason'] or '',
+        'is_late_cancellation': row['is_late_cancellation'],
+        'late_hours': decimal_float(row['late_hours']),
+        'modified_at': format_minute(modified_at) if modified_at else '',
+    }
+
+
+def sync_schedule(row):
+    """delta sync 格式：時間軸格式加上日期"""
+    data = timeline_schedule(row)
+    data['date'] = format_date(row['date'])
+    return data
+
+
+def employee_values(*args, **filters):
+    return Schedule.objects.filter(*args, **filters).values(*EMPLOYEE_FIELDS)
+
+
+def employee_schedule(row, today):
+    """員工班表側欄的排班格式（row 為 EMPLOYEE_FIELDS 的 values() 結果）"""
+    day = row['date']
+    has_brand = row['brand_id'] is not None
+    return {
+        'id': row['id'],
+        'date': format_date(day),
+        'date_display': format_date_display(day),
+        'start_time': format_time(row['start_time']),
+        'end_time': format_time(row['end_time']),
+        'duration': hours(row['duration_minutes']),
+        'role': row['role'],
+        'brand_name': row['brand__name'] if has_brand else '無品牌',
+        'brand_color': row['brand__color'] if has_brand else NO_BRAND_COLOR,
+        'room': row['room'],
+        'is_cancelled': row['is_late_cancellation'],
+        'modification_status': row['modification_status'],
+        'is_past': day < today,
+        'is_today': day == today,
+        'is_future': day > today,
+    }
+
+
+def calendar_values(*args, **filters):
+    return Schedule.objects.filter(*args, **filters).values(*CALENDAR_FIELDS)
+
+
+def calendar_schedule(row):
+    """日曆頁面（date_form.js）使用的排班格式"""
+    return {
+        'id': row['id'],
+        'person_name': row['person__name'],
+        'brand_name': row['brand__name'] or '',
+        'brand_color': row['brand__color'] or '',
+        'role': row['role'],
+        'start_time': format_time(row['start_time']),
+        'end_time': format_time(row['end_time']),
+        'duration': hours(row['duration_minutes']),
+        'room': row['room'],
+        'is_late_cancellation': row['is_late_cancellation'],
+    }
+
+
+# 精簡時間軸格式：?format=compact 或 Accept 含 COMPACT_TIMELINE_TYPE 時使用（timeline_view.js 解碼）
+COMPACT_TIMELINE_FORMAT = 'compact-v1'
+COMPACT_TIMELINE_TYPE = 'application/vnd.liveapp.timeline-compact+json'
+# 每筆排班陣列的欄位順序；person / brand / role / status / reason 為對照表的索引（無品牌為 null），
+# start / end 為當天第幾分鐘，modified 為 UTC epoch 分鐘（未修改為 null）
+COMPACT_FIELDS = (
+    'id', 'person', 'brand', 'role', 'start', 'end', 'duration', 'room',
+    'status', 'reason', 'late_cancellation', 'late_hours', 'modified',
+)
+
+
+@lru_cache(maxsize=4096)
+def _minute_of_day(value):
+    return int(value[:2]) * 60 + int(value[3:5])
+
+
+def _epoch_minute(value):
+    """'YYYY-MM-DD HH:MM'（UTC）轉成 epoch 分鐘"""
+    return int(datetime.fromisoformat(value).replace(tzinfo=dt_timezone.utc).timestamp()) // 60
+
+
+class _Table:
+    """字串（或 tuple）對照表：第一次出現時加入，回傳索引"""
+
+    def __init__(self):
+        self.index = {}
+
+    def __call__(self, value):
+        position = self.index.get(value)
+        if position is None:
+            position = self.index[value] = len(self.index)
+        return position
+
+    def values(self):
+        return list(self.index)
+
+
+def compact_timeline(schedules_by_date):
+    """將 {'YYYY-MM-DD': [timeline_schedule, ...]} 轉成以對照表去除重複字串的精簡格式"""
+    persons, brands, roles, statuses, reasons = _Table(), _Table(), _Table(), _Table(), _Table()
+    encoded = {}
+    for day, schedules in schedules_by_date.items():
+        encoded[day] = [
+            [
+                schedule['id'],
+                persons((schedule['person_name'], schedule['person_nick_name'])),
+                brands((schedule['brand_id'], schedule['brand_name'], schedule['brand_color'],
+                        schedule['brand_responsible'])) if schedule['brand_id'] is not None else None,
+                roles(schedule['role']),
+                _minute_of_day(schedule['start_time']),
+                _minute_of_day(schedule['end_time']),
+                schedule['duration'],
+                schedule['room'],
+                statuses(schedule['modification_status']),
+                reasons(schedule['modification_reason']),
+                int(schedule['is_late_cancellation']),
+                schedule['late_hours'],
+                _epoch_minute(schedule['modified_at']) if schedule['modified_at'] else None,
+            ]
+            for schedule in schedules
+        ]
+    return {
+        'format': COMPACT_TIMELINE_FORMAT,
+        'fields': COMPACT_FIELDS,
+        'persons': persons.values(),
+        'brands': brands.values(),
+        'roles': roles.values(),
+        'statuses': statuses.values(),
+        'reasons': reasons.values(),
+        'schedules_by_date': encoded,
+    }
+
+
+def wants_compact_timeline(request):
+    return request.GET.get('format') == 'compact' or COMPACT_TIMELINE_TYPE in request.headers.get('Accept', '')
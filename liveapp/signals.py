@@ -0,0 +1,71 @@
+"""排班變更通知
+
+``schedules_changed`` 在任何排班（或排班畫面會顯示的員工 / 品牌資料）變更時送出，
+參數 ``keys`` 為受影響的 ``(person_id, date)`` 集合；只影響員工本身時 date 為 None。
+``ids`` 為變更的排班 id（員工 / 品牌資料變更時為空），``created`` 表示這些排班是新建立的。
+單筆 save / delete 由下方 model signal 轉發，bulk_create / bulk_update / update
+則由 ``ScheduleQuerySet`` 直接呼叫 ``notify_schedules_changed``。
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+schedules_changed = Signal()
+
+# 員工姓名 / 暱稱變更時通知今天前後多少天內的排班（日曆最多載入約一年的月份）
+PERSON_CHANGE_DAYS = 366
+
+
+def notify_schedules_changed(sender, keys, ids=(), created=False):
+    keys = frozenset((person_id, day) for person_id, day in keys if person_id or day)
+    if keys:
+        schedules_changed.send(sender=sender, keys=keys, ids=frozenset(ids), created=created)
+
+
+def _schedule_keys(**filters):
+    from .models import Schedule
+    return set(Schedule.objects.filter(**filters).values_list('person_id', 'date').distinct())
+
+
+@receiver(post_save, sender='liveapp.Schedule')
+@receiver(post_delete, sender='liveapp.Schedule')
+def _schedule_changed(sender, instance, created=False, **kwargs):
+    notify_schedules_changed(sender, instance.change_keys(), ids=[instance.pk], created=created)
+    instance._loaded_key = (instance.person_id, instance.date)
+
+
+@receiver(post_save, sender='liveapp.Person')
+@receiver(post_delete, sender='liveapp.Person')
+def _person_changed(sender, instance, signal, created=False, update_fields=None, **kwargs):
+    keys = {(instance.pk, None)}
+    if signal is post_delete or _display_updated(instance, created, update_fields):
+        # 姓名 / 暱稱出現在本人的排班與其負責品牌的排班上；只通知前端可能開啟的日期，
+        # 更早 / 更晚日期的時間軸快取在 TIMELINE_CACHE_TIMEOUT 後自然過期
+        from .models import Schedule
+        today = timezone.localdate()
+        window = timedelta(days=PERSON_CHANGE_DAYS)
+        keys |= set(Schedule.objects.filter(
+            Q(person_id=instance.pk) | Q(brand__responsible_id=instance.pk),
+            date__range=(today - window, today + window),
+        ).values_list('person_id', 'date').distinct())
+    notify_schedules_changed(sender, keys)
+    instance._loaded_display = tuple(getattr(instance, field) for field in instance.DISPLAY_FIELDS)
+
+
+def _display_updated(instance, created, update_fields):
+    # 新員工還沒有排班；cancel_count 等計數欄位的更新不影響排班畫面
+    if created:
+        return False
+    if update_fields is not None and not set(update_fields) & set(instance.DISPLAY_FIELDS):
+        return False
+    return instance.display_changed()
+
+
+@receiver(post_save, sender='liveapp.Brand')
+@receiver(pre_delete, sender='liveapp.Brand')
+def _brand_changed(sender, instance, **kwargs):
+    # 刪除品牌時排班的 brand 會被 SET_NULL（不觸發 Schedule signal），所以在刪除前通知
+    notify_schedules_changed(sender, _schedule_keys(brand_id=instance.pk))
@@ -0,0 +1,101 @@
+/**
+ * 排班即時更新
+ * 透過 /ws/schedules/ 訂閱已載入的日期，收到差異時就地更新本地資料，不需重新整理頁面
+ */
+
+class ScheduleSocket {
+    /**
+     * @param {Object} options
+     * @param {Function} options.onDiff (date, changes) => void
+     * @param {Function} [options.onReconnect] 斷線重連後呼叫（斷線期間的變更需重新取得）
+     * @param {Function} [options.onRejected] (dates) => void，超過每個連線的訂閱上限、不會收到更新的日期
+     */
+    constructor({ onDiff, onReconnect = null, onRejected = null }) {
+        this.onDiff = onDiff;
+        this.onReconnect = onReconnect;
+        this.onRejected = onRejected;
+        this.dates = new Set();
+        this.socket = null;
+        this.retryDelay = 1000;
+        this.maxRetryDelay = 30000;
+        this.connectedBefore = false;
+        if ('WebSocket' in window) {
+            this.connect();
+        }
+    }
+
+    connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(`${scheme}://${window.location.host}/ws/schedules/`);
+        this.socket = socket;
+
+        socket.addEventListener('open', () => {
+            this.retryDelay = 1000;
+            this.send('subscribe', [...this.dates]);
+            if (this.connectedBefore && this.onReconnect) {
+                this.onReconnect();
+            }
+            this.connectedBefore = true;
+        });
+
+        socket.addEventListener('message', (event) => {
+            let message;
+            try {
+                message = JSON.parse(event.data);
+            } catch (e) {
+                return;
+            }
+            if (message.type === 'diff') {
+                this.onDiff(message.date, message.changes);
+            } else if (message.type === 'error') {
+                console.warn('Schedule socket:', message.error);
+                if (Array.isArray(message.rejected) && message.rejected.length) {
+                    // 伺服器沒有訂閱這些日期：不再視為已訂閱，取消其他日期後可重新訂閱
+                    message.rejected.forEach(date => this.dates.delete(date));
+                    if (this.onRejected) this.onRejected(message.rejected);
+                }
+            }
+        });
+
+        socket.addEventListener('close', () => {
+            // 指數退避重連
+            setTimeout(() => this.connect(), this.retryDelay);
+            this.retryDelay = Math.min(this.retryDelay * 2, this.maxRetryDelay);
+        });
+    }
+
+    send(action, dates) {
+        if (!dates.length || !this.socket || this.socket.readyState !== WebSocket.OPEN) return;
+        this.socket.send(JSON.stringify({ action, dates }));
+    }
+
+    subscribe(dates) {
+        const added = [...dates].filter(date => !this.dates.has(date));
+        added.forEach(date => this.dates.add(date));
+        this.send('subscribe', added);
+    }
+
+    unsubscribe(dates) {
+        const removed = [...dates].filter(date => this.dates.has(date));
+        removed.forEach(date => this.dates.delete(date));
+        this.send('unsubscribe', removed);
+    }
+
+    /**
+     * 將差異套用到某一天的排班列表，回傳新的列表（依開始時間排序）
+     */
+    static applyDiff(schedules, changes) {
+        const byId = new Map((schedules || []).map(schedule => [schedule.id, schedule]));
+        changes.forEach(change => {
+            if (change.op === 'deleted') {
+                byId.delete(change.id);
+            } else {
+                byId.set(change.schedule.id, { ...byId.get(change.schedule.id), ...change.schedule });
+            }
+        });
+        return [...byId.values()].sort((a, b) =>
+            a.start_time.localeCompare(b.start_time) || a.id - b.id);
+    }
+}
+
+window.ScheduleSocket = ScheduleSocket;
@@ -213,20 +213,94 @@ document.addEventListener("DOMContentLoaded", () => {
                     }
                 });
 
-            // Build schedulesByDate mapping from Django context
-            // Get schedule data from json_script
-            // Get schedule data from json_script
-            let schedulesByDate = {};
-            const schedulesEl = document.getElementById("schedules-data");
-            if (schedulesEl) {
-                try {
-                    schedulesByDate = JSON.parse(schedulesEl.textContent);
-                } catch (e) {
-                    console.error("Invalid schedules-data JSON", e);
-                    schedulesByDate = {};
+            // schedulesByDate is filled lazily, one month at a time, from /api/calendar-schedules/
+            const schedulesByDate = {};
+            const loadedMonths = new Set();
+
+            function formatLocalDate(d) {
+                const year = d.getFullYear();
+                const month = String(d.getMonth() + 1).padStart(2, "0");
+                const day = String(d.getDate()).padStart(2, "0");
+                return `${year}-${month}-${day}`;
+            }
+
+            // Fetch every month touched by the rendered week and the 30-day utilization window
+            // that is not cached yet, in a single request. Resolves true when new data arrived.
+            async function ensureSchedulesLoaded(monday) {
+                const rangeStart = new Date(monday);
+                rangeStart.setDate(rangeStart.getDate() - 23);
+                const rangeEnd = new Date(monday);
+                rangeEnd.setDate(rangeEnd.getDate() + 6);
+
+                const missing = [];
+                const cursor = new Date(rangeStart.getFullYear(), rangeStart.getMonth(), 1);
+                while (cursor <= rangeEnd) {
+                    const key = formatLocalDate(cursor).slice(0, 7);
+                    if (!loadedMonths.has(key)) missing.push(key);
+                    cursor.setMonth(cursor.getMonth() + 1);
+                }
+                if (!missing.length) return false;
+
+                const [lastYear, lastMonth] = missing[missing.length - 1].split("-").map(Number);
+                const start = `${missing[0]}-01`;
+                const end = formatLocalDate(new Date(lastYear, lastMonth, 0));
+                const response = await fetch(`/api/calendar-schedules/?start=${start}&end=${end}`, {
+                    headers: { "X-Requested-With": "XMLHttpRequest" },
+                });
+                const data = await response.json();
+                if (!data.success) {
+                    throw new Error(data.error || "Failed to load schedules");
                 }
+                // Days with no schedules are absent from the response: drop what was cached for the
+                // reloaded months first, so shifts deleted since the last load (e.g. while disconnected) go away
+                const reloaded = new Set(missing);
+                Object.keys(schedulesByDate)
+                    .filter((date) => reloaded.has(date.slice(0, 7)))
+                    .forEach((date) => delete schedulesByDate[date]);
+                Object.assign(schedulesByDate, data.data.schedules_by_date);
+                missing.forEach((key) => loadedMonths.add(key));
+                scheduleSocket.subscribe(datesBetween(start, end));
+                return true;
             }
 
+            function datesBetween(start, end) {
+                const dates = [];
+                const cursor = new Date(`${start}T00:00:00`);
+                const last = new Date(`${end}T00:00:00`);
+                while (cursor <= last) {
+                    dates.push(formatLocalDate(cursor));
+                    cursor.setDate(cursor.getDate() + 1);
+                }
+                return dates;
+            }
+
+            // Live updates from other tabs / users: patch loaded months and redraw the week
+            const scheduleSocket = new ScheduleSocket({
+                onDiff(date, changes) {
+                    if (!loadedMonths.has(date.slice(0, 7))) return;
+                    schedulesByDate[date] = ScheduleSocket.applyDiff(schedulesByDate[date], changes);
+                    // The week view and the 30-day utilization panel both read these dates
+                    const windowStart = new Date(currentMonday);
+                    windowStart.setDate(windowStart.getDate() - 23);
+                    const windowEnd = new Date(currentMonday);
+                    windowEnd.setDate(windowEnd.getDate() + 6);
+                    if (date >= formatLocalDate(windowStart) && date <= formatLocalDate(windowEnd)) {
+                        redrawWeek(date);
+                    }
+                },
+                // Changes made while disconnected were missed: reload the visible months (their cached
+                // days are replaced when they load; other months are refetched when next shown)
+                onReconnect() {
+                    loadedMonths.clear();
+                    showWeek(currentMonday);
+                },
+                // Over the per-connection subscription limit: these dates get no live updates,
+                // so forget their months and fetch them again the next time they are shown
+                onRejected(dates) {
+                    dates.forEach((date) => loadedMonths.delete(date.slice(0, 7)));
+                },
+            });
+
             const months = [
                 "January",
                 "February",
@@ -823,7 +897,38 @@ document.addEventListener("DOMContentLoaded", () => {
         })();
     }
 
-    renderWeek(currentMonday);
+    // Redraw the current week without losing the selected date; refresh its schedule list
+    // unless the user is in the middle of filling in the form
+    function redrawWeek(changedDate) {
+        const selectedDate = document.getElementById("form-date").value;
+        renderWeek(currentMonday);
+        bindCancelSidebarEvents();
+        const selectedSpan = selectedDate && document.querySelector(`.calendar-day-span[data-date="${selectedDate}"]`);
+        if (!selectedSpan) return;
+        if (changedDate === selectedDate && !empSelect.value) {
+            selectedSpan.click();
+        } else {
+            selectedSpan.classList.add("calendar-selected");
+        }
+    }
+
+    // Render with whatever is cached, then again once the missing months have arrived
+    function showWeek(monday) {
+        renderWeek(monday);
+        bindCancelSidebarEvents();
+        ensureSchedulesLoaded(monday)
+            .then((fetched) => {
+                if (fetched) {
+                    renderWeek(currentMonday);
+                    bindCancelSidebarEvents();
+                }
+            })
+            .catch((error) => {
+                console.error("Error loading schedules:", error);
+                showNotification("❌ Failed to load schedules", "error");
+            });
+    }
+
     // Bind close button to open cancel sidebar
     function bindCancelSidebarEvents() {
         document.querySelectorAll(".close-btn").forEach((btn) => {
@@ -913,21 +1018,17 @@ document.addEventListener("DOMContentLoaded", () => {
             });
         });
     }
-    bindCancelSidebarEvents();
+    showWeek(currentMonday);
 
     prevBtn.addEventListener("click", () => {
         currentMonday.setDate(currentMonday.getDate() - 7);
         resetSelections();
-        renderWeek(currentMonday);
-        // Re-bind close button after week change
-        bindCancelSidebarEvents();
+        showWeek(currentMonday);
     });
     nextBtn.addEventListener("click", () => {
         currentMonday.setDate(currentMonday.getDate() + 7);
         resetSelections();
-        renderWeek(currentMonday);
-        // Re-bind close button after week change
-        bindCancelSidebarEvents();
+        showWeek(currentMonday);
     });
 
     startTimeInput.addEventListener("change", function() {
@@ -1029,8 +1130,49 @@ document.addEventListener("DOMContentLoaded", () => {
             }
         });
     }
+
+    // 排班表 CSV 匯入：一次上傳整份檔案，錯誤逐列列出
+    const rosterImportForm = document.getElementById("roster-import-form");
+    if (rosterImportForm) {
+        rosterImportForm.addEventListener("submit", async(e) => {
+            e.preventDefault();
+            const resultBox = document.getElementById("roster-import-result");
+            resultBox.textContent = "Importing...";
+            try {
+                const response = await fetch(rosterImportForm.action, {
+                    method: "POST",
+                    headers: { "X-Requested-With": "XMLHttpRequest" },
+                    body: new FormData(rosterImportForm),
+                });
+                const data = await response.json();
+                if (!data.success) {
+                    const lines = (data.errors || []).map(
+                        (row) => `<li>Line ${row.line}: ${row.errors.map(escapeHtml).join("; ")}</li>`
+                    );
+                    resultBox.innerHTML = `<div class="text-danger">${escapeHtml(data.error || "Import failed")}</div>` +
+                        (lines.length ? `<ul class="text-danger mb-0">${lines.join("")}</ul>` : "");
+                    return;
+                }
+                if (rosterImportForm.querySelector("[name=dry_run]").checked) {
+                    resultBox.innerHTML = `<div class="text-success">${data.rows} rows are valid</div>`;
+                    return;
+                }
+                showNotification(`✅ Imported ${data.created} schedules`);
+                window.location.reload();
+            } catch (error) {
+                console.error("Roster import failed:", error);
+                resultBox.innerHTML = '<div class="text-danger">Import failed, please try again</div>';
+            }
+        });
+    }
 }); // end DOMContentLoaded listener
 
+function escapeHtml(text) {
+    const div = document.createElement("div");
+    div.textContent = text;
+    return div.innerHTML;
+}
+
 // 載入員工班表數據
 function loadEmployeeSchedule(employeeId = null) {
     const url = new URL(window.location.origin + '/api/employee-schedule/');
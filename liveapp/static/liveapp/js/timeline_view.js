@@ -80,6 +80,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                 });
 
+                // One request for the visible days plus a week either side
+                await fetchScheduleRange(shiftDate(selectedDate, -3 - PREFETCH_DAYS), shiftDate(selectedDate, 3 + PREFETCH_DAYS));
+
                 // Load schedules for all initially visible dates
                 for (let dayOffset = -3; dayOffset <= 3; dayOffset++) {
                     const date = new Date(currentDate);
@@ -459,30 +462,19 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Add to visible days array
                 visibleDays.unshift(dateString);
 
-                // Fetch data if not already loaded
-                if (!schedulesData[dateString]) {
-                    try {
-                        const data = await fetchScheduleData(dateString);
-                        if (data) {
-                            schedulesData[dateString] = data;
-                        }
-                        prependDay(previousDate);
-                        // 等待 DOM 更新後載入排班資料
-                        setTimeout(async() => {
-                            await loadSchedulesForDate(dateString);
-                        }, 50);
-                    } catch (error) {
-                        console.error('Error loading previous day:', error);
-                    } finally {
-                        isLoading = false;
-                        showLoading(false);
+                // Fetch data if not already loaded (prefetches the week before it as well)
+                try {
+                    if (schedulesData[dateString] === undefined) {
+                        await prefetchAround(dateString);
                     }
-                } else {
                     prependDay(previousDate);
-                    // 等待 DOM 更新後載入排班資料  
+                    // 等待 DOM 更新後載入排班資料
                     setTimeout(async() => {
                         await loadSchedulesForDate(dateString);
                     }, 50);
+                } catch (error) {
+                    console.error('Error loading previous day:', error);
+                } finally {
                     isLoading = false;
                     showLoading(false);
                 }
@@ -529,24 +521,16 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Add to visible days array
                 visibleDays.push(dateString);
 
-                // Fetch data if not already loaded
-                if (!schedulesData[dateString]) {
-                    try {
-                        const data = await fetchScheduleData(dateString);
-                        if (data) {
-                            schedulesData[dateString] = data;
-                        }
-                        appendDay(nextDate);
-                        await loadSchedulesForDate(dateString);
-                    } catch (error) {
-                        console.error('Error loading next day:', error);
-                    } finally {
-                        isLoading = false;
-                        showLoading(false);
+                // Fetch data if not already loaded (prefetches the week after it as well)
+                try {
+                    if (schedulesData[dateString] === undefined) {
+                        await prefetchAround(dateString);
                     }
-                } else {
                     appendDay(nextDate);
                     await loadSchedulesForDate(dateString);
+                } catch (error) {
+                    console.error('Error loading next day:', error);
+                } finally {
                     isLoading = false;
                     showLoading(false);
                 }
@@ -607,40 +591,194 @@ document.addEventListener('DOMContentLoaded', function() {
                 loadSchedulesForDate(dateString);
             }
 
-            // Fetch schedule data from server
-            async function fetchScheduleData(dateString) {
-                try {
-                    console.log(`Fetching data for ${dateString}...`);
-                    const response = await fetch(`/timeline/?date=${dateString}`, {
+            const PREFETCH_DAYS = 7; // Days fetched on either side of the visible window
+
+            function shiftDate(dateString, days) {
+                const date = new Date(dateString);
+                date.setUTCDate(date.getUTCDate() + days);
+                return date.toISOString().split('T')[0];
+            }
+
+            // Compact timeline format (?format=compact): person / brand / role / status / reason
+            // strings are sent once as lookup tables and each schedule is an array in COMPACT_FIELDS order
+            const COMPACT_FORMAT = 'compact-v1';
+            const NO_BRAND = { id: null, name: '', color: '#6c757d', responsible: '' };
+
+            function minutesToTime(minutes) {
+                return `${String(Math.floor(minutes / 60)).padStart(2, '0')}:${String(minutes % 60).padStart(2, '0')}`;
+            }
+
+            // Rebuild the same objects as the regular format, keyed by date
+            function decodeCompactTimeline(data) {
+                const brands = data.brands.map(([id, name, color, responsible]) => ({ id, name, color, responsible }));
+                const schedulesByDate = {};
+                Object.entries(data.schedules_by_date).forEach(([date, rows]) => {
+                    schedulesByDate[date] = rows.map(([id, person, brand, role, start, end, duration, room,
+                        status, reason, lateCancellation, lateHours, modified]) => {
+                        const [personName, personNickName] = data.persons[person];
+                        const brandInfo = brand === null ? NO_BRAND : brands[brand];
+                        return {
+                            id,
+                            person_name: personName,
+                            person_nick_name: personNickName,
+                            role: data.roles[role],
+                            start_time: minutesToTime(start),
+                            end_time: minutesToTime(end),
+                            duration,
+                            brand_id: brandInfo.id,
+                            brand_name: brandInfo.name,
+                            brand_color: brandInfo.color,
+                            brand_responsible: brandInfo.responsible,
+                            room,
+                            modification_status: data.statuses[status],
+                            modification_reason: data.reasons[reason],
+                            is_late_cancellation: lateCancellation === 1,
+                            late_hours: lateHours,
+                            // UTC epoch minutes -> 'YYYY-MM-DD HH:MM' (UTC, same as the regular format)
+                            modified_at: modified === null ? '' : new Date(modified * 60000).toISOString().slice(0, 16).replace('T', ' '),
+                        };
+                    });
+                });
+                return schedulesByDate;
+            }
+
+            // Range requests are chained so each one sees what the previous one cached
+            let rangeRequestChain = Promise.resolve();
+
+            // Fetch every uncached day in [startString, endString] with a single request.
+            // Days without schedules come back as empty lists so they are not refetched.
+            function fetchScheduleRange(startString, endString) {
+                rangeRequestChain = rangeRequestChain.then(async() => {
+                    let start = startString;
+                    let end = endString;
+                    while (start <= end && schedulesData[start] !== undefined) start = shiftDate(start, 1);
+                    while (end >= start && schedulesData[end] !== undefined) end = shiftDate(end, -1);
+                    if (start > end) return;
+
+                    console.log(`Fetching schedules for ${start} ~ ${end}...`);
+                    const response = await fetch(`/timeline/?start=${start}&end=${end}&format=compact`, {
                         headers: {
                             'X-Requested-With': 'XMLHttpRequest'
                         }
                     });
+                    if (!response.ok) {
+                        console.warn(`Failed to fetch schedules for ${start} ~ ${end}: ${response.status}`);
+                        return;
+                    }
+                    const data = await response.json();
+                    const fetched = data.format === COMPACT_FORMAT ? decodeCompactTimeline(data) : (data.schedules_by_date || {});
+                    Object.assign(schedulesData, fetched);
+                    scheduleSocket.subscribe(Object.keys(fetched));
+                    // Keep the oldest cursor so a later delta sync covers every cached day
+                    if (data.cursor && (!syncCursor || Number(data.cursor) < Number(syncCursor))) {
+                        syncCursor = data.cursor;
+                    }
+                    console.log(`Fetched ${data.count} schedules for ${start} ~ ${end}`);
+                }).catch(error => {
+                    console.error('Error fetching schedule range:', error);
+                });
+                return rangeRequestChain;
+            }
 
-                    if (response.ok) {
-                        const data = await response.json();
-                        const schedules = data.schedules || [];
-                        console.log(`Fetched ${schedules.length} schedules for ${dateString}`);
+            function prefetchAround(dateString) {
+                return fetchScheduleRange(shiftDate(dateString, -PREFETCH_DAYS), shiftDate(dateString, PREFETCH_DAYS));
+            }
 
-                        // 檢查排班的ID結構
-                        if (schedules.length > 0) {
-                            console.log('Sample schedule data structure:', {
-                                first_schedule: schedules[0],
-                                ids_sample: schedules.slice(0, 3).map(s => ({ id: s.id, type: typeof s.id, person: s.person_name }))
-                            });
-                        }
+            // Live updates: patch cached days in place when other users change schedules
+            const deferredRenderDates = new Set();
 
-                        return schedules;
-                    } else {
-                        console.warn(`Failed to fetch data for ${dateString}: ${response.status}`);
-                        return [];
+            function renderPatchedDate(date) {
+                if (!document.querySelector(`.day-container[data-date="${date}"]`)) return;
+                // Re-rendering mid-drag would drop the dragged element; wait for dragend
+                if (document.querySelector('.schedule-item.dragging')) {
+                    deferredRenderDates.add(date);
+                    return;
+                }
+                loadSchedulesForDate(date);
+            }
+
+            document.addEventListener('dragend', () => {
+                setTimeout(() => {
+                    const dates = [...deferredRenderDates];
+                    deferredRenderDates.clear();
+                    dates.forEach(renderPatchedDate);
+                }, 0);
+            });
+
+            function dropScheduleCache() {
+                Object.keys(schedulesData).forEach(date => delete schedulesData[date]);
+                syncCursor = null;
+                document.querySelectorAll('.day-container[data-date]').forEach(container => {
+                    loadSchedulesForDate(container.getAttribute('data-date'));
+                });
+            }
+
+            // Cursor from the range / sync responses; /api/schedule-sync/ returns only what changed after it
+            let syncCursor = null;
+            const SYNC_MAX_DAYS = 93;
+
+            // Bring every cached day up to date with one delta request (used after a reconnect)
+            async function syncCachedDays() {
+                const dates = Object.keys(schedulesData).sort();
+                if (!dates.length) return;
+                const start = dates[0];
+                const end = dates[dates.length - 1];
+                if (!syncCursor || shiftDate(start, SYNC_MAX_DAYS - 1) < end) {
+                    dropScheduleCache();
+                    return;
+                }
+                try {
+                    const response = await fetch(`/api/schedule-sync/?start=${start}&end=${end}&since=${syncCursor}`, {
+                        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+                    });
+                    const result = await response.json();
+                    if (!response.ok || !result.success) throw new Error(result.error || response.status);
+                    const data = result.data;
+
+                    const changesByDate = {};
+                    const addChange = (date, change) => (changesByDate[date] = changesByDate[date] || []).push(change);
+                    if (data.reset) {
+                        dates.forEach(date => {
+                            schedulesData[date] = [];
+                            changesByDate[date] = [];
+                        });
                     }
+                    const dateById = {};
+                    dates.forEach(date => schedulesData[date].forEach(schedule => { dateById[schedule.id] = date; }));
+                    data.deleted.forEach(id => {
+                        if (dateById[id]) addChange(dateById[id], { op: 'deleted', id });
+                    });
+                    data.schedules.forEach(schedule => {
+                        if (dateById[schedule.id] && dateById[schedule.id] !== schedule.date) {
+                            addChange(dateById[schedule.id], { op: 'deleted', id: schedule.id });
+                        }
+                        if (schedulesData[schedule.date] !== undefined) {
+                            addChange(schedule.date, { op: 'updated', schedule });
+                        }
+                    });
+                    Object.entries(changesByDate).forEach(([date, changes]) => {
+                        schedulesData[date] = ScheduleSocket.applyDiff(schedulesData[date], changes);
+                        renderPatchedDate(date);
+                    });
+                    syncCursor = data.cursor;
+                    console.log(`Synced ${data.schedules.length} changed / ${data.deleted.length} deleted schedules`);
                 } catch (error) {
-                    console.error('Error fetching schedule data:', error);
-                    return [];
+                    console.error('Delta sync failed, reloading schedules:', error);
+                    dropScheduleCache();
                 }
             }
 
+            const scheduleSocket = new ScheduleSocket({
+                onDiff(date, changes) {
+                    if (schedulesData[date] === undefined) return;
+                    schedulesData[date] = ScheduleSocket.applyDiff(schedulesData[date], changes);
+                    renderPatchedDate(date);
+                },
+                // Changes made while disconnected were missed: fetch just those
+                onReconnect: syncCachedDays
+            });
+            scheduleSocket.subscribe(Object.keys(schedulesData));
+
             // Update date selector based on scroll position (optimized)
             function updateDateSelector(scrollTop) {
                 // 降低更新頻率
@@ -689,19 +827,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Load schedules for specific date
             async function loadSchedulesForDate(date) {
-                let daySchedules = schedulesData[date] || [];
-
-                // If no schedules in cache, fetch from server
-                if (daySchedules.length === 0) {
+                // If the day is not cached yet, fetch it together with the surrounding week
+                if (schedulesData[date] === undefined) {
                     console.log(`No cached schedules for ${date}, fetching from server...`);
-                    try {
-                        daySchedules = await fetchScheduleData(date);
-                        schedulesData[date] = daySchedules; // Cache the results
-                    } catch (error) {
-                        console.error(`Failed to fetch schedules for ${date}:`, error);
-                        daySchedules = [];
-                    }
+                    await prefetchAround(date);
                 }
+                const daySchedules = schedulesData[date] || [];
 
                 console.log(`Loading schedules for ${date}:`, daySchedules);
 
@@ -2324,39 +2455,89 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // Update schedule on server
-    async function updateScheduleOnServer(updatedSchedule) {
+    // Drags made within BATCH_UPDATE_DELAY of each other are coalesced into one
+    // request to the batch endpoint. The endpoint is all-or-nothing: on a 409 the
+    // edits named in the conflicts are rejected with that conflict's message and the
+    // rest (which were not written either) are sent again in a new batch.
+    const BATCH_UPDATE_DELAY = 300;
+    let pendingScheduleUpdates = [];
+    let batchUpdateTimer = null;
+
+    function updateScheduleOnServer(updatedSchedule) {
+        const operation = {
+            room: updatedSchedule.room,
+            brand_name: updatedSchedule.brand_name,
+            start_time: updatedSchedule.start_time,
+            end_time: updatedSchedule.end_time
+        };
+        if (updatedSchedule.is_merged_update && updatedSchedule.all_schedule_ids) {
+            operation.ids = updatedSchedule.all_schedule_ids;
+        } else {
+            operation.id = updatedSchedule.id;
+        }
+
+        return new Promise((resolve, reject) => {
+            pendingScheduleUpdates.push({ operation, resolve, reject });
+            clearTimeout(batchUpdateTimer);
+            batchUpdateTimer = setTimeout(flushScheduleUpdates, BATCH_UPDATE_DELAY);
+        });
+    }
+
+    async function flushScheduleUpdates() {
+        const batch = pendingScheduleUpdates;
+        pendingScheduleUpdates = [];
+        batchUpdateTimer = null;
+        await sendScheduleUpdates(batch);
+    }
+
+    async function sendScheduleUpdates(batch) {
+        if (batch.length === 0) return;
+
+        let success = false;
         try {
-            console.log('Updating schedule on server:', updatedSchedule);
-            console.log('Schedule ID:', updatedSchedule.id, 'Type:', typeof updatedSchedule.id);
-            console.log('Is merged update:', updatedSchedule.is_merged_update);
-            console.log('All schedule IDs:', updatedSchedule.all_schedule_ids);
-            
-            const response = await fetch('/api/update-schedule/', {
+            const response = await fetch('/api/update-schedules/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': getCsrfToken()
                 },
-                body: safeStringify(updatedSchedule)
-            });            if (response.ok) {
-                const result = await response.json();
-                if (result.success) {
-                    console.log('Schedule updated successfully:', result.data);
-                    return true;
-                } else {
-                    console.error('Failed to update schedule:', result.error);
-                    return false;
+                body: JSON.stringify({ operations: batch.map(item => item.operation) })
+            });
+            const result = await response.json();
+            if (response.ok && result.success) {
+                console.log(`Batch updated ${result.updated_count} schedules`, result.results);
+                success = true;
+            } else if (response.status === 409) {
+                // 時段與其他排班重疊，整批未寫入：退回造成衝突的操作，其餘重新送出
+                const messages = new Map();
+                (result.conflicts || []).forEach(conflict => {
+                    (conflict.operations || []).forEach(index => {
+                        messages.set(index, [...(messages.get(index) || []), conflict.message]);
+                    });
+                });
+                if (messages.size === 0) {
+                    const error = new Error(result.error || '排班時段衝突');
+                    batch.forEach(item => item.reject(error));
+                    return;
                 }
+                const retry = [];
+                batch.forEach((item, index) => {
+                    if (messages.has(index)) {
+                        item.reject(new Error(messages.get(index).join('；')));
+                    } else {
+                        retry.push(item);
+                    }
+                });
+                await sendScheduleUpdates(retry);
+                return;
             } else {
-                const errorData = await response.json();
-                console.error('HTTP error:', response.status, errorData);
-                return false;
+                console.error('Failed to update schedules:', response.status, result.error, result.errors || result.missing_ids);
             }
-
         } catch (error) {
-            console.error('Network error updating schedule:', error);
-            return false;
+            console.error('Network error updating schedules:', error);
         }
+
+        batch.forEach(item => item.resolve(success));
     }
 
     // Update local schedule data
@@ -2591,8 +2772,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // Recreate timeline with new date
             createTimelineStructure();
 
-            // Load schedules for all visible dates (7 days)
+            // Load schedules for all visible dates (7 days), prefetching a week either side
             setTimeout(async() => {
+                await fetchScheduleRange(shiftDate(selectedDate, -3 - PREFETCH_DAYS), shiftDate(selectedDate, 3 + PREFETCH_DAYS));
                 for (let dayOffset = -3; dayOffset <= 3; dayOffset++) {
                     const date = new Date(currentDate);
                     date.setDate(date.getDate() + dayOffset);
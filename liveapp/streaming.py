@@ -0,0 +1,43 @@
+"""依伺服器類型選擇 StreamingHttpResponse 的 iterator
+
+Django 4.2 在 ASGI 下會以 ``sync_to_async(list)`` 一次讀完同步 iterator，在 WSGI 下
+則會一次讀完 async iterator，兩者都會把整個回應放在記憶體中。``streaming_response``
+在 ASGI 請求時把同步 generator 包成 async iterator：每次在 thread 中取下一段
+（資料庫 cursor 與 generator 都留在同一個 thread-sensitive thread），WSGI 時直接使用原本的 generator。
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+def _next_batch(iterator, size):
+    return list(islice(iterator, size))
+
+
+def _close(iterator):
+    close = getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+async def aiter_in_thread(iterable, batch_size=1):
+    """逐段在 thread 中讀取同步 iterable 的 async generator"""
+    iterator = iter(iterable)
+    try:
+        while True:
+            batch = await sync_to_async(_next_batch)(iterator, batch_size)
+            if not batch:
+                return
+            for item in batch:
+                yield item
+    finally:
+        # 客戶端中途斷線時也要關閉 generator（釋放資料庫 cursor、暫存資源）
+        await sync_to_async(_close)(iterator)
+
+
+def streaming_response(request, iterable, **kwargs):
+    if isinstance(request, ASGIRequest):
+        iterable = aiter_in_thread(iterable)
+    return StreamingHttpResponse(iterable, **kwargs)
@@ -0,0 +1,115 @@
+"""排班 delta sync
+
+前端保留一段日期區間的排班副本，之後只以 ``?since=<cursor>`` 取得 cursor 之後
+新增 / 修改的排班（依 ``Schedule.modified_at``）與被刪除的排班 id（``ScheduleTombstone``）。
+
+cursor 為伺服器時間（epoch 微秒）減去 ``CURSOR_LAG``：modified_at 在 commit 前就已寫入，
+較晚 commit 的 transaction 仍會落在下一次同步的範圍內；因此同一筆變更可能重複收到，
+前端以 id 覆蓋即可。cursor 早於 ``sync_max_age()``（tombstone 保留期限與
+``SCHEDULE_SYNC_MAX_AGE_HOURS`` 較短者），或改期到區間外的排班超過 ``MOVED_OUT_LIMIT`` 筆時
+回傳 ``reset``，前端改用完整資料取代；因此找出移出區間的排班時只需掃描最近修改的排班。
+
+員工姓名 / 暱稱、品牌名稱 / 顏色 / 負責人的修改與品牌刪除不會更新排班的 modified_at
+（modified_at 會顯示為排班的修改時間，不能借用），因此記在 ``DISPLAY_SCOPE`` 的
+``ScheduleVersion``；cursor 之後有這類修改時同樣回傳 ``reset``。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Schedule, ScheduleTombstone, ScheduleVersion
+from .serializers import sync_schedule, timeline_values
+from .signals import schedules_changed
+from .versioning import bump_versions
+
+CURSOR_LAG = timedelta(seconds=10)
+MOVED_OUT_LIMIT = 1000
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# 員工 / 品牌的顯示資料最後一次變更的時間
+DISPLAY_SCOPE = 'display'
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SCHEDULE_TOMBSTONE_DAYS', 30))
+
+
+def sync_max_age():
+    max_age = timedelta(hours=getattr(settings, 'SCHEDULE_SYNC_MAX_AGE_HOURS', 24))
+    return min(max_age, tombstone_retention())
+
+
+def make_cursor(now=None):
+    moment = (now or timezone.now()) - CURSOR_LAG
+    return str((moment - _EPOCH) // timedelta(microseconds=1))
+
+
+def parse_cursor(cursor):
+    """cursor 字串轉成 aware datetime；格式錯誤時 ValueError"""
+    if not cursor or not cursor.isdigit():
+        raise ValueError('invalid cursor')
+    return _EPOCH + timedelta(microseconds=int(cursor))
+
+
+def window_snapshot(start_date, end_date):
+    return [
+        sync_schedule(row)
+        for row in timeline_values(date__range=(start_date, end_date)).order_by('date', 'start_time', 'id')
+    ]
+
+
+def _full_sync(cursor, start_date, end_date):
+    return {'cursor': cursor, 'reset': True, 'schedules': window_snapshot(start_date, end_date), 'deleted': []}
+
+
+def schedule_changes(start_date, end_date, since=None):
+    """[start_date, end_date] 區間的同步資料
+
+    回傳 {'cursor', 'reset', 'schedules', 'deleted'}。since 為 None、早於 sync_max_age()、
+    之後有員工 / 品牌顯示資料的變更或移出區間的排班過多時 reset 為 True，schedules 為區間內全部排班；否則只含 since 之後的變更，
+    deleted 為刪除或移出區間的排班 id。
+    """
+    cursor = make_cursor()
+    if since is None or since < timezone.now() - sync_max_age():
+        return _full_sync(cursor, start_date, end_date)
+    if ScheduleVersion.objects.filter(scope=DISPLAY_SCOPE, updated_at__gt=since).exists():
+        return _full_sync(cursor, start_date, end_date)
+
+    changed = timeline_values(
+        modified_at__gt=since, date__range=(start_date, end_date),
+    ).order_by('date', 'start_time', 'id')
+    # 改期到區間外的排班：前端若持有就移除（區間外的修改太多時改回傳完整資料）
+    moved_out = list(Schedule.objects.filter(modified_at__gt=since).exclude(
+        date__range=(start_date, end_date)).values_list('id', flat=True)[:MOVED_OUT_LIMIT + 1])
+    if len(moved_out) > MOVED_OUT_LIMIT:
+        return _full_sync(cursor, start_date, end_date)
+    deleted = ScheduleTombstone.objects.filter(
+        deleted_at__gt=since, date__range=(start_date, end_date)).values_list('schedule_id', flat=True)
+    return {
+        'cursor': cursor,
+        'reset': False,
+        'schedules': [sync_schedule(row) for row in changed],
+        'deleted': sorted(set(moved_out) | set(deleted)),
+    }
+
+
+def prune_tombstones(now=None):
+    """刪除超過保留期限的 tombstone，回傳刪除筆數"""
+    cutoff = (now or timezone.now()) - tombstone_retention()
+    deleted, _ = ScheduleTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+@receiver(schedules_changed)
+def _record_display_change(sender, keys, **kwargs):
+    # 員工 / 品牌的通知只有在排班畫面的顯示資料改變時才帶有日期
+    if sender is not Schedule and any(day for _, day in keys):
+        bump_versions([DISPLAY_SCOPE])
+
+
+@receiver(post_delete, sender=Schedule)
+def _record_tombstone(sender, instance, **kwargs):
+    ScheduleTombstone.objects.create(
+        schedule_id=instance.pk, person_id=instance.person_id, date=instance.date)
@@ -0,0 +1,82 @@
+"""效能測試用的合成資料（回歸測試與 loadtest 指令共用）
+
+每位員工每天一個兩小時班次，依序填滿日期；同一 (房間, 角色) 只有一位員工，
+因此資料本身沒有時段衝突。排班集中在今天前後（約 3/4 在今天之前），涵蓋本月與時間軸預設區間。
+"""
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Brand, Company, Invoice, InvoiceItem, Person, Schedule
+
+SEED_BATCH_SIZE = 2000
+# 合成員工的姓名格式，例如「A員工0000」；loadtest 以此判斷資料庫是否只有合成資料
+SYNTHETIC_PERSON_NAME = r'^[A-Z]員工[0-9]{4}$'
+# 依員工錯開開始時間
+SHIFT_STARTS = [time(hour) for hour in (8, 10, 12, 14, 16, 18)]
+
+
+def seed_schedules(persons, brands, total, first_day, seed=20240101):
+    rng = random.Random(seed)
+    batch = []
+    for index in range(total):
+        position, offset = index % len(persons), index // len(persons)
+        person = persons[position]
+        start = SHIFT_STARTS[position % len(SHIFT_STARTS)]
+        status = rng.choices(['normal', 'late', 'cancelled'], weights=[90, 6, 4])[0]
+        batch.append(Schedule(
+            date=first_day + timedelta(days=offset),
+            person=person,
+            role='主播' if position % 2 == 0 else '運營',
+            start_time=start,
+            end_time=time(start.hour + 2),
+            brand=rng.choice(brands),
+            room=position // 2 + 1,
+            modification_status=status,
+            is_late_cancellation=status == 'cancelled',
+            late_hours=Decimal('0.5') if status == 'late' else Decimal('0'),
+        ))
+        if len(batch) >= SEED_BATCH_SIZE:
+            Schedule.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Schedule.objects.bulk_create(batch)
+
+
+def synthetic_person_name(index):
+    return f'{chr(ord("A") + index % 26)}員工{index:04d}'
+
+
+def is_synthetic_dataset():
+    """資料庫中有員工，且全部都是 seed_dataset 建立的合成員工"""
+    persons = Person.objects.all()
+    return persons.exists() and not persons.exclude(name__regex=SYNTHETIC_PERSON_NAME).exists()
+
+
+def seed_dataset(persons=300, brands=40, schedules=100_000, today=None):
+    """建立員工、品牌、公司、發票與排班，回傳建立的員工列表"""
+    today = today or timezone.localdate()
+    person_objs = Person.objects.bulk_create([
+        Person(name=synthetic_person_name(index), bank='Bank', account=f'{index:08d}')
+        for index in range(persons)
+    ])
+    brand_objs = Brand.objects.bulk_create([
+        Brand(name=f'品牌{index:03d}', color=f'#{index * 6151 % 0xFFFFFF:06x}', coop_hours=Decimal('120'),
+              start_date=today - timedelta(days=180), end_date=today + timedelta(days=180))
+        for index in range(brands)
+    ])
+    Company.objects.bulk_create([Company(name=f'公司{index}', address='London') for index in range(5)])
+    invoices = Invoice.objects.bulk_create([
+        Invoice(person=person, date=today - timedelta(days=index), total_amount=Decimal('100'))
+        for index, person in enumerate(person_objs)
+    ])
+    InvoiceItem.objects.bulk_create([
+        InvoiceItem(invoice=invoice, description='直播', hours=Decimal('10'), rate=Decimal('10'),
+                    total_amount=Decimal('100'))
+        for invoice in invoices
+    ])
+    days = -(-schedules // persons)
+    seed_schedules(person_objs, brand_objs, schedules, today - timedelta(days=days * 3 // 4))
+    return person_objs
@@ -1,3 +1,961 @@
-from django.test import TestCase
+"""liveapp 測試
 
-# Create your tests here.
+行為測試（衝突檢查、匯入、發票、彙總表、同步、即時更新等）使用少量資料，執行很快。
+
+``ViewPerformanceTests``（tag ``performance``）以 liveapp.synthetic 建立合成資料，每個 view
+在清空快取後重複請求數次，檢查：
+
+- 查詢數不超過 ``max_queries``（任何 N+1 回歸都會讓查詢數隨資料量增加），一律檢查
+- 延遲中位數不超過 ``budget_ms`` × ``PERF_LATENCY_FACTOR``，以及 serializers 的加速倍數：
+  與機器快慢有關，只有設定 ``PERF_BUDGETS=1`` 時才檢查
+
+``PERF_BUDGETS=1`` 時預設使用接近正式環境規模的資料（300 位員工、40 個品牌、100,000 筆排班），
+否則預設 10,000 筆排班；資料量可用 ``PERF_PERSONS`` / ``PERF_BRANDS`` / ``PERF_SCHEDULES`` 調整。
+每次執行都會把量測結果寫到 ``PERF_RESULTS_DIR``（預設 ``perf_results/``）下的 JSON 檔，
+方便比較不同版本的趨勢；可以 ``manage.py test --exclude-tag performance`` 略過。
+"""
+import asyncio
+import io
+import json
+import os
+import platform
+import pstats
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+import django
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .benchmarking import compare_serializers
+from .conflicts import conflicts_in_range, find_conflicts
+from .exports import HEADER, xlsx_available
+from .consumers import ScheduleConsumer
+from .invoice_pdf import pdf_available, pdf_filename, render_invoice_pdf
+from .invoicing import generate_monthly_invoices
+from .ledger import invoice_filters, invoice_page
+from .profiling import profile_file
+from .models import Brand, Invoice, InvoiceItem, Person, PersonDayStats, RoleRate, Schedule
+from .rollup import aggregate_person_days
+from .roster_import import import_roster
+from .serializers import NO_BRAND_COLOR
+from .signals import schedules_changed
+from .sync import schedule_changes, sync_max_age
+from .synthetic import seed_dataset
+from .timeline_cache import cache_stats, day_key, day_schedules, range_schedules, reset_cache_stats, week_key
+
+# 延遲預算與加速倍數只在明確要求時檢查（CI 機器的速度差異會讓這些檢查不穩定）
+BUDGETS = os.environ.get('PERF_BUDGETS') == '1'
+PERSONS = int(os.environ.get('PERF_PERSONS', 300))
+BRANDS = int(os.environ.get('PERF_BRANDS', 40))
+SCHEDULES = int(os.environ.get('PERF_SCHEDULES', 100_000 if BUDGETS else 10_000))
+# 較慢的 CI 機器可放寬延遲預算，例如 PERF_LATENCY_FACTOR=3
+LATENCY_FACTOR = float(os.environ.get('PERF_LATENCY_FACTOR', 1))
+RUNS = int(os.environ.get('PERF_RUNS', 5))
+RESULTS_DIR = os.environ.get('PERF_RESULTS_DIR', os.path.join(settings.BASE_DIR, 'perf_results'))
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+# 測試環境沒有 collectstatic 產生的 manifest
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+@tag('performance')
+class ViewPerformanceTests(TestCase):
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        started = time.perf_counter()
+        cls.today = timezone.localdate()
+        persons = seed_dataset(PERSONS, BRANDS, SCHEDULES, cls.today)
+        cls.seed_seconds = time.perf_counter() - started
+        cls.person_id = persons[0].id
+        cls.room = 1  # persons[0] 與 persons[1] 的房間
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.results:
+            cls._write_results()
+
+    @classmethod
+    def _write_results(cls):
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        now = datetime.now()
+        path = os.path.join(RESULTS_DIR, f'perf-{now:%Y%m%d-%H%M%S}.json')
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump({
+                'timestamp': now.isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'dataset': {'persons': PERSONS, 'brands': BRANDS, 'schedules': SCHEDULES},
+                'seed_seconds': round(cls.seed_seconds, 2),
+                'latency_factor': LATENCY_FACTOR,
+                'budgets_checked': BUDGETS,
+                'results': sorted(cls.results, key=lambda result: result['name']),
+            }, fh, ensure_ascii=False, indent=2)
+
+    def measure(self, name, request, max_queries, budget_ms, expected_status=200):
+        """清空快取後執行 request() RUNS 次，檢查最大查詢數與延遲中位數"""
+        timings = []
+        queries = 0
+        for _ in range(RUNS):
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - started
+            self.assertEqual(response.status_code, expected_status, getattr(response, 'content', b'')[:500])
+            timings.append(elapsed * 1000)
+            queries = max(queries, len(captured))
+
+        median_ms = statistics.median(timings)
+        budget = budget_ms * LATENCY_FACTOR
+        self.results.append({
+            'name': name,
+            'queries': queries,
+            'max_queries': max_queries,
+            'median_ms': round(median_ms, 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'budget_ms': budget,
+        })
+        self.assertLessEqual(queries, max_queries, f'{name} 執行了 {queries} 個查詢（上限 {max_queries}）')
+        if BUDGETS:
+            self.assertLessEqual(median_ms, budget, f'{name} 延遲中位數 {median_ms:.1f} ms 超過預算 {budget:.0f} ms')
+        return response
+
+    def post_json(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_person_list(self):
+        self.measure('person_list', lambda: self.client.get(reverse('person_list')),
+                     max_queries=4, budget_ms=800)
+
+    def test_calendar(self):
+        url = f"{reverse('date_form')}?date={self.today}"
+        self.measure('calendar', lambda: self.client.get(url), max_queries=5, budget_ms=800)
+
+    def test_invoice_create(self):
+        self.measure('invoice_create', lambda: self.client.get(reverse('invoice_create')),
+                     max_queries=4, budget_ms=800)
+
+    def test_timeline_page(self):
+        url = f"{reverse('timeline_view')}?date={self.today}"
+        # 品牌列表 + 快取的版本號（整頁不做條件式 GET，需另外查詢）
+        self.measure('timeline_view (page)', lambda: self.client.get(url), max_queries=2, budget_ms=500)
+
+    def test_timeline_day(self):
+        url = f"{reverse('timeline_view')}?date={self.today}"
+        self.measure('timeline_view (AJAX day)', lambda: self.client.get(url, **AJAX),
+                     max_queries=2, budget_ms=300)
+
+    def test_timeline_range(self):
+        url = (f"{reverse('timeline_view')}?start={self.today - timedelta(days=10)}"
+               f"&end={self.today + timedelta(days=10)}")
+        response = self.measure('timeline_view (AJAX range)', lambda: self.client.get(url, **AJAX),
+                                max_queries=2, budget_ms=2000)
+        self.assertEqual(len(response.json()['schedules_by_date']), 21)
+
+    def test_timeline_range_compact(self):
+        url = (f"{reverse('timeline_view')}?start={self.today - timedelta(days=10)}"
+               f"&end={self.today + timedelta(days=10)}")
+        response = self.measure('timeline_view (AJAX range, compact)',
+                                lambda: self.client.get(f'{url}&format=compact', **AJAX),
+                                max_queries=2, budget_ms=2000)
+        self.assertEqual(response.json()['format'], 'compact-v1')
+        full = self.client.get(url, **AJAX)
+        self.assertEqual(response.json()['count'], full.json()['count'])
+        self.assertLess(len(response.content) * 4, len(full.content))
+
+    def test_get_employee_schedule(self):
+        url = f"{reverse('get_employee_schedule')}?employee_id={self.person_id}"
+        response = self.measure('get_employee_schedule', lambda: self.client.get(url),
+                                max_queries=4, budget_ms=300)
+        expected = Schedule.objects.filter(
+            person_id=self.person_id,
+            date__range=(self.today - timedelta(days=30), self.today + timedelta(days=30))).count()
+        self.assertEqual(len(response.json()['data']['schedules']), expected)
+
+    def test_cancel_schedule(self):
+        payload = {'date': str(self.today + timedelta(days=1)), 'room': self.room,
+                   'reason': 'late', 'late_hours': 1}
+        response = self.measure('cancel_schedule', lambda: self.post_json(reverse('cancel_schedule'), payload),
+                                max_queries=14, budget_ms=300)
+        self.assertEqual(response.json()['updated_count'], 2)
+
+    def test_update_schedule_api(self):
+        schedule = Schedule.objects.get(person_id=self.person_id, date=self.today)
+        payload = {'id': schedule.id, 'room': schedule.room, 'start_time': '08:30', 'end_time': '10:30'}
+        self.measure('update_schedule_api', lambda: self.post_json(reverse('update_schedule_api'), payload),
+                     max_queries=7, budget_ms=300)
+
+    def test_serializers(self):
+        """serializers 的輸出與以 model instance 建立的舊格式相同（PERF_BUDGETS=1 時另外檢查較快）"""
+        recent = Schedule.objects.order_by('-date', 'id')
+        ids = list(recent.values_list('id', flat=True)[:1000])
+        # 合成資料沒有的情況：無品牌、品牌負責人、修改時間與原因
+        Brand.objects.filter(id__in=Brand.objects.order_by('id')[:5].values('id')).update(
+            responsible_id=self.person_id)
+        Schedule.objects.filter(id__in=ids[::7]).update(brand=None)
+        Schedule.objects.filter(id__in=ids[::3]).update(
+            modified_at=timezone.now(), modification_reason='遲到', late_hours=Decimal('1.25'))
+
+        results = compare_serializers(rows=1000, repeat=3)
+        self.results.append({'name': 'serializers', **results})
+        for name, stats in results.items():
+            self.assertTrue(stats['identical'], f'{name} 的輸出與舊格式不同')
+            if BUDGETS:
+                self.assertGreater(stats['speedup'], 1.5, f'{name} 只快了 {stats["speedup"]} 倍')
+
+
+class ScheduleExportStreamingTests(SimpleTestCase):
+    """ASGI 下 CSV 匯出需逐段送出，而不是先讀完整個 generator"""
+    TOTAL_ROWS = 3000
+
+    async def test_csv_streams_incrementally_under_asgi(self):
+        produced = [0]
+
+        def fake_rows(*args, **kwargs):
+            for index in range(self.TOTAL_ROWS):
+                produced[0] += 1
+                yield [f'2026-01-{index % 28 + 1:02d}', f'員工{index}']
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': reverse('export_schedules'), 'raw_path': reverse('export_schedules').encode(),
+            'query_string': b'start=2026-01-01&end=2026-01-31', 'root_path': '',
+            'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        received = []
+        produced_at_first_chunk = []
+
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # 不會斷線
+
+        bodies = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                self.assertEqual(message['status'], 200)
+            elif message['type'] == 'http.response.body' and message.get('body'):
+                if not bodies:
+                    produced_at_first_chunk.append(produced[0])
+                bodies.append(message['body'])
+
+        with mock.patch('liveapp.exports.schedule_export_rows', fake_rows):
+            await ASGIHandler()(scope, receive, send)
+
+        self.assertEqual(produced[0], self.TOTAL_ROWS)
+        self.assertGreater(len(bodies), 1)
+        self.assertLess(produced_at_first_chunk[0], self.TOTAL_ROWS)
+        csv_text = b''.join(bodies).decode('utf-8-sig')
+        self.assertEqual(csv_text.count('\r\n'), self.TOTAL_ROWS + 1)
+
+
+@skipUnless(pdf_available(), 'reportlab 未安裝')
+class RequestProfilerAsgiTests(SimpleTestCase):
+    """ASGI 下 sync view 在 worker thread 執行，profile 仍需包含 view 本身"""
+
+    async def test_sync_view_appears_in_profile(self):
+        path = reverse('timeline_cache_stats_api')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        received = []
+
+        async def receive():
+            if not received:
+                received.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # 不會斷線
+
+        headers = {}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                self.assertEqual(message['status'], 200)
+                headers.update((key.decode(), value.decode()) for key, value in message['headers'])
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            with override_settings(PROFILE_SAMPLE_RATE=1, PROFILE_DIR=profile_dir):
+                await ASGIHandler()(scope, receive, send)
+                stats = pstats.Stats(profile_file(headers['X-Profile-Id']))
+        functions = {name for _, _, name in stats.stats}
+        self.assertIn('timeline_cache_stats_api', functions)
+
+
+@skipUnless(xlsx_available(), 'openpyxl 未安裝')
+class ScheduleExportXlsxTests(TestCase):
+    def test_xlsx_contains_header_and_rows(self):
+        import openpyxl
+
+        person = Person.objects.create(name='測試員工')
+        Schedule.objects.create(date=datetime(2026, 1, 5).date(), person=person, role='主播',
+                                start_time='10:00', end_time='12:00')
+        response = self.client.get(reverse('export_schedules'),
+                                   {'start': '2026-01-01', 'end': '2026-01-31', 'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        sheet = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), HEADER)
+        self.assertEqual(len(rows), 2)
+        self.assertIn('測試員工', rows[1])
+
+
+class InvoicePdfTests(SimpleTestCase):
+    def test_markup_in_fields_is_escaped(self):
+        data = {
+            'id': 1, 'receipt_number': 'R<1>', 'company': 'A & B <Ltd>', 'address': 'x < y\n& z',
+            'description': '<b>bold</b> & <font size=40>big', 'date': '2026-01-01', 'total_amount': '10',
+            'person': {'name': '王 <小明>', 'bank': 'b', 'bank_name': 'n', 'account': 'a', 'sort_code': 's'},
+            'items': [{'description': 'Live < 2h & more', 'hours': '1', 'rate': '10', 'total_amount': '10'}],
+        }
+        self.assertTrue(render_invoice_pdf(data).startswith(b'%PDF'))
+
+    def test_filename_is_sanitized(self):
+        data = {'id': 7, 'receipt_number': '2026-01/3', 'person': {'name': '../王 小明\\x'}}
+        filename = pdf_filename(data)
+        self.assertEqual(filename, 'Invoice_Payment_for_2026-01_3_.._王_小明_x_7.pdf')
+        self.assertNotIn('/', filename)
+
+
+class ScheduleDurationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = Person.objects.create(name='測試員工')
+
+    def create(self, start, end):
+        return Schedule.objects.create(
+            date=datetime(2026, 1, 5).date(), person=self.person, role='主播', start_time=start, end_time=end)
+
+    def test_overnight_shift_and_seconds(self):
+        self.assertEqual(Schedule.compute_duration_minutes('22:00', '02:00'), 240)
+        # 只計整分鐘，秒數捨去
+        self.assertEqual(Schedule.compute_duration_minutes('10:00:30', '12:00:59'), 120)
+
+    def test_queryset_update_recomputes_duration(self):
+        first = self.create('10:00', '12:00')
+        second = self.create('20:00', '23:30')
+        Schedule.objects.filter(id__in=[first.id, second.id]).update(start_time='11:00')
+        self.assertEqual(
+            dict(Schedule.objects.values_list('id', 'duration_minutes')), {first.id: 60, second.id: 750})
+        Schedule.objects.filter(id=first.id).update(end_time='01:00')
+        first.refresh_from_db()
+        self.assertEqual(first.duration_minutes, 840)
+
+
+class ScheduleSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = Person.objects.create(name='測試員工')
+        cls.day = datetime(2026, 1, 5).date()
+        cls.schedules = [
+            Schedule.objects.create(date=cls.day, person=cls.person, role='主播', start_time=start, end_time='23:00')
+            for start in ('10:00', '12:00')
+        ]
+
+    def test_old_cursor_returns_full_window(self):
+        since = timezone.now() - sync_max_age() - timedelta(minutes=1)
+        data = schedule_changes(self.day, self.day, since)
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['schedules']), 2)
+
+    def test_moved_out_schedules_are_bounded(self):
+        since = timezone.now() - timedelta(minutes=1)
+        next_week = self.day + timedelta(days=7)
+        Schedule.objects.filter(id=self.schedules[0].id).update(date=next_week)
+        data = schedule_changes(self.day, self.day, since)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['deleted'], [self.schedules[0].id])
+
+        Schedule.objects.filter(id=self.schedules[1].id).update(date=next_week)
+        with mock.patch('liveapp.sync.MOVED_OUT_LIMIT', 1):
+            data = schedule_changes(self.day, self.day, since)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['schedules'], [])
+
+    def test_person_rename_resets(self):
+        since = timezone.now() - timedelta(minutes=1)
+        self.assertFalse(schedule_changes(self.day, self.day, since)['reset'])
+        self.person.name = '改名員工'
+        self.person.save()
+        data = schedule_changes(self.day, self.day, since)
+        self.assertTrue(data['reset'])
+        self.assertEqual({schedule['person_name'] for schedule in data['schedules']}, {'改名員工'})
+
+    def test_brand_delete_resets(self):
+        brand = Brand.objects.create(name='測試品牌')
+        Schedule.objects.filter(id=self.schedules[0].id).update(brand=brand)
+        since = timezone.now() - timedelta(minutes=1)
+        self.assertFalse(schedule_changes(self.day, self.day, since)['reset'])
+        brand.delete()
+        data = schedule_changes(self.day, self.day, since)
+        self.assertTrue(data['reset'])
+        self.assertEqual([schedule['brand_id'] for schedule in data['schedules']], [None, None])
+
+
+class RealtimeTests(TransactionTestCase):
+    """on_commit 與 rollback 需要實際的 transaction，不能包在 TestCase 的 transaction 中"""
+
+    def setUp(self):
+        self.person = Person.objects.create(name='測試員工')
+        self.day = datetime(2026, 1, 5).date()
+
+    def create(self, day):
+        return Schedule.objects.create(date=day, person=self.person, role='主播', start_time='10:00', end_time='12:00')
+
+    def test_rolled_back_changes_are_not_broadcast(self):
+        with mock.patch('liveapp.realtime.broadcast') as broadcast:
+            try:
+                with transaction.atomic():
+                    self.create(self.day)
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                kept = self.create(self.day + timedelta(days=1))
+        broadcast.assert_called_once()
+        (changes,), _ = broadcast.call_args
+        self.assertEqual(list(changes), [kept.date])
+
+    def test_person_counter_update_skips_schedule_lookup(self):
+        self.create(self.day)
+        person = Person.objects.get(pk=self.person.pk)
+        received = []
+        schedules_changed.connect(lambda sender, keys, **kwargs: received.append(keys), weak=False,
+                                  dispatch_uid='test_person_counter')
+        try:
+            person.cancel_count += 1
+            with CaptureQueriesContext(connection) as queries:
+                person.save(update_fields=['cancel_count'])
+            person.nick_name = '小明'
+            person.save()
+        finally:
+            schedules_changed.disconnect(dispatch_uid='test_person_counter')
+        self.assertFalse([query for query in queries if 'liveapp_schedule"' in query['sql']])
+        self.assertEqual(received[0], {(person.pk, None)})
+        self.assertIn((person.pk, self.day), received[1])
+
+
+class ScheduleConsumerTests(SimpleTestCase):
+    async def test_dates_over_limit_are_rejected_with_error(self):
+        communicator = WebsocketCommunicator(ScheduleConsumer.as_asgi(), '/ws/schedules/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        with mock.patch('liveapp.consumers.MAX_SUBSCRIBED_DATES', 2):
+            await communicator.send_json_to(
+                {'action': 'subscribe', 'dates': ['2026-01-03', '2026-01-01', '2026-01-02']})
+            error = await communicator.receive_json_from()
+            subscribed = await communicator.receive_json_from()
+        await communicator.disconnect()
+        self.assertEqual(error['type'], 'error')
+        self.assertEqual(error['rejected'], ['2026-01-03'])
+        self.assertEqual(subscribed, {'type': 'subscribed', 'count': 2})
+
+
+class MonthlyInvoiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        RoleRate.objects.create(role='主播', hourly_rate=Decimal('100.00'))
+        cls.persons = [Person.objects.create(name=name) for name in ('甲', '乙')]
+        cls.month = datetime(2026, 1, 1).date()
+        for person in cls.persons:
+            Schedule.objects.create(
+                date=cls.month + timedelta(days=4), person=person, role='主播', start_time='10:00', end_time='12:30')
+
+    def test_replace_regenerates_whole_month(self):
+        first = generate_monthly_invoices(self.month)
+        again = generate_monthly_invoices(self.month)
+        self.assertEqual((first['created'], again['created'], len(again['skipped'])), (2, 0, 2))
+
+        replaced = generate_monthly_invoices(self.month, replace=True)
+        self.assertEqual((replaced['deleted'], replaced['created']), (2, 2))
+        invoices = Invoice.objects.filter(billing_month=self.month)
+        self.assertEqual(invoices.count(), 2)
+        self.assertEqual(sorted(invoices.values_list('total_amount', flat=True)), [Decimal('250.00')] * 2)
+        self.assertEqual(len(set(invoices.values_list('receipt_number', flat=True))), 2)
+
+        # 已沒有可計費排班的員工，重新產生時舊發票也要刪除
+        Schedule.objects.filter(person=self.persons[1]).update(modification_status='cancelled')
+        replaced = generate_monthly_invoices(self.month, replace=True)
+        self.assertEqual((replaced['deleted'], replaced['created']), (2, 1))
+        self.assertEqual(
+            list(Invoice.objects.filter(billing_month=self.month).values_list('person_id', flat=True)),
+            [self.persons[0].pk])
+        self.assertEqual(InvoiceItem.objects.count(), 1)
+
+
+class CalendarScheduleApiTests(TestCase):
+    def test_range_is_capped(self):
+        from .views import CALENDAR_MAX_RANGE_DAYS
+
+        person = Person.objects.create(name='測試員工')
+        start = datetime(2026, 1, 1).date()
+        Schedule.objects.create(date=start, person=person, role='主播', start_time='10:00', end_time='12:00')
+        url = reverse('calendar_schedules_api')
+
+        last_allowed = start + timedelta(days=CALENDAR_MAX_RANGE_DAYS - 1)
+        response = self.client.get(url, {'start': start, 'end': last_allowed})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']['schedules_by_date']['2026-01-01']), 1)
+
+        for params in ({'start': start, 'end': last_allowed + timedelta(days=1)},
+                       {'start': start, 'end': start - timedelta(days=1)},
+                       {'start': 'x', 'end': start}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(response.json()['success'])
+
+
+class BrandUtilisationTests(TestCase):
+    def test_totals_match_hand_computed_period(self):
+        person = Person.objects.create(name='測試員工')
+        brand = Brand.objects.create(name='品牌甲', coop_hours=Decimal('10'),
+                                     start_date=datetime(2026, 1, 10).date(), end_date=datetime(2026, 2, 10).date())
+        idle = Brand.objects.create(name='品牌乙', coop_hours=Decimal('5'))
+        for month, day, start, end, schedule_brand in (
+            (1, 5, '10:00', '12:00', brand),    # 查詢區間內、合作期間前：2h
+            (1, 15, '10:00', '13:00', brand),   # 兩者皆是：3h
+            (2, 5, '14:00', '15:30', brand),    # 只在合作期間內：1.5h
+            (1, 20, '10:00', '14:00', None),    # 沒有品牌，不計入
+        ):
+            Schedule.objects.create(date=datetime(2026, month, day).date(), person=person, role='主播',
+                                    start_time=start, end_time=end, brand=schedule_brand)
+
+        response = self.client.get(reverse('brand_utilisation_api'), {'start': '2026-01-01', 'end': '2026-01-31'})
+        self.assertEqual(response.status_code, 200)
+        report = {row['id']: row for row in response.json()['data']['brands']}
+        self.assertEqual(
+            {key: report[brand.id][key] for key in ('hours', 'period_hours', 'remaining_hours', 'progress')},
+            {'hours': 5.0, 'period_hours': 4.5, 'remaining_hours': 5.5, 'progress': 45.0})
+        self.assertEqual(
+            {key: report[idle.id][key] for key in ('hours', 'period_hours', 'remaining_hours', 'progress')},
+            {'hours': 0.0, 'period_hours': 0.0, 'remaining_hours': 5.0, 'progress': 0.0})
+
+
+class ConditionalGetTests(TestCase):
+    def test_not_modified_until_schedule_saved(self):
+        person = Person.objects.create(name='測試員工')
+        schedule = Schedule.objects.create(date=datetime(2026, 1, 5).date(), person=person, role='主播',
+                                           start_time='10:00', end_time='12:00')
+        url = reverse('calendar_schedules_api')
+        params = {'start': '2026-01-01', 'end': '2026-01-31'}
+        etag = self.client.get(url, params)['ETag']
+
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        schedule.room = 2
+        schedule.save()
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['data']['schedules_by_date']['2026-01-05'][0]['room'], 2)
+
+
+class InvoiceLedgerTests(TestCase):
+    def test_keyset_pages_have_no_gaps_or_duplicates(self):
+        person = Person.objects.create(name='測試員工')
+        # 同一天多張發票，讓頁面邊界落在同一日期中間
+        for day in (3, 3, 3, 3, 2, 1, 1):
+            Invoice.objects.create(person=person, date=datetime(2026, 1, day).date())
+        expected = list(Invoice.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        filters = invoice_filters({})
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, cursor = invoice_page(filters, cursor, page_size=3)
+            seen.extend(invoice.id for invoice in page)
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_invalid_cursor_returns_first_page(self):
+        person = Person.objects.create(name='測試員工')
+        Invoice.objects.create(person=person, date=datetime(2026, 1, 1).date())
+        page, _ = invoice_page(invoice_filters({}), 'not-a-cursor')
+        self.assertEqual(len(page), 1)
+
+
+class BatchUpdateConflictTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = datetime(2026, 1, 5).date()
+        cls.schedules = [
+            Schedule.objects.create(
+                date=cls.day, person=Person.objects.create(name=name), role='主播',
+                start_time=start, end_time=end, room=room)
+            for name, start, end, room in (('甲', '10:00', '12:00', 1), ('乙', '14:00', '16:00', 2), ('丙', '10:00', '12:00', 3))
+        ]
+
+    def test_conflict_names_the_operations_involved(self):
+        occupied, moved, other = self.schedules
+        operations = [
+            {'id': moved.id, 'room': occupied.room, 'start_time': '11:00', 'end_time': '13:00'},
+            {'id': other.id, 'start_time': '09:00', 'end_time': '12:00'},
+        ]
+        response = self.client.post(
+            reverse('batch_update_schedules_api'), json.dumps({'operations': operations}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        conflicts = response.json()['conflicts']
+        self.assertEqual([conflict['operations'] for conflict in conflicts], [[0]])
+        self.assertIn('房間 1', conflicts[0]['message'])
+        other.refresh_from_db()
+        self.assertEqual(other.start_time.hour, 10)
+
+
+class EmployeeStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = Person.objects.create(name='測試員工')
+        today = timezone.localdate()
+        for start, end, cancelled in (('10:00', '12:30', False), ('13:00', '15:00', True)):
+            Schedule.objects.create(
+                date=today, person=cls.person, role='主播', start_time=start, end_time=end,
+                is_late_cancellation=cancelled)
+
+    def test_single_and_batch_stats_match(self):
+        single = self.client.get(reverse('get_employee_schedule'), {'employee_id': self.person.pk}).json()
+        batch = self.client.get(reverse('get_employee_schedules_batch'), {'ids': self.person.pk}).json()
+        stats = batch['data']['employees'][str(self.person.pk)]['stats']
+        self.assertEqual(single['data']['stats'], stats)
+        self.assertEqual(stats, {
+            'total_hours': 4.5, 'attendance_rate': 50.0, 'total_schedules': 2, 'cancelled_schedules': 1})
+
+
+class TimelineCacheStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+
+    def test_lookups_are_counted_in_process_and_exported(self):
+        day = datetime(2026, 1, 5).date()
+        with mock.patch.object(cache, 'incr') as incr, mock.patch.object(cache, 'add') as add:
+            day_schedules(day)
+            day_schedules(day)
+        incr.assert_not_called()
+        add.assert_not_called()
+        self.assertEqual((cache_stats()['hits'], cache_stats()['misses']), (1, 1))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('liveapp_timeline_cache_events_total{event="hits"} 1', body)
+
+    def test_reset_requires_staff_and_csrf(self):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        day_schedules(datetime(2026, 1, 5).date())
+        url = reverse('timeline_cache_stats_api')
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        csrf_client = Client(enforce_csrf_checks=True)
+        csrf_client.force_login(staff)
+        self.assertEqual(csrf_client.post(url).status_code, 403)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+        self.client.force_login(staff)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['misses'], 0)
+
+
+class TimelineCacheVersionTests(TestCase):
+    """併發請求在失效之後才把舊資料寫回快取時，讀取端以版本號判定過時"""
+
+    def setUp(self):
+        cache.clear()
+        self.day = datetime(2026, 1, 7).date()
+        person = Person.objects.create(name='測試員工')
+        self.schedule = Schedule.objects.create(
+            person=person, date=self.day, role='主播', room=1,
+            start_time=datetime.strptime('10:00', '%H:%M').time(),
+            end_time=datetime.strptime('12:00', '%H:%M').time())
+
+    def _change_and_write_back(self, key):
+        stale = cache.get(key)
+        self.schedule.room = 2
+        self.schedule.save()
+        cache.set(key, stale)
+
+    def test_stale_day_fill_is_ignored(self):
+        self.assertEqual(day_schedules(self.day)[0]['room'], 1)
+        self._change_and_write_back(day_key(self.day))
+        self.assertEqual(day_schedules(self.day)[0]['room'], 2)
+
+    def test_stale_week_fill_is_ignored(self):
+        day = self.day.strftime('%Y-%m-%d')
+        self.assertEqual(range_schedules(self.day, self.day)[day][0]['room'], 1)
+        self._change_and_write_back(week_key(self.day - timedelta(days=self.day.weekday())))
+        self.assertEqual(range_schedules(self.day, self.day)[day][0]['room'], 2)
+
+
+def _shift(schedule_id, person_id, day, start, end, room=1, role='主播'):
+    return {
+        'id': schedule_id, 'person_id': person_id, 'date': day, 'room': room, 'role': role,
+        'start_time': datetime.strptime(start, '%H:%M').time(), 'end_time': datetime.strptime(end, '%H:%M').time(),
+    }
+
+
+class ConflictSweepTests(SimpleTestCase):
+    day = datetime(2026, 1, 5).date()
+
+    def test_overnight_shift_overlaps_next_day(self):
+        next_day = self.day + timedelta(days=1)
+        conflicts = find_conflicts([
+            _shift(1, 1, self.day, '22:00', '02:00', room=0),
+            _shift(2, 1, next_day, '01:00', '03:00', room=0),
+        ])
+        self.assertEqual(conflicts, [{
+            'kind': 'person', 'ids': [1, 2], 'date': '2026-01-06', 'start': '01:00', 'end': '02:00', 'person_id': 1,
+        }])
+
+    def test_room_overlap_only_for_same_role(self):
+        conflicts = find_conflicts([
+            _shift(1, 1, self.day, '10:00', '12:00'),
+            _shift(2, 2, self.day, '11:00', '13:00'),
+            _shift(3, 3, self.day, '11:00', '13:00', role='運營'),
+            # 房間 0（未分配）與首尾相接的班次不算衝突
+            _shift(4, 4, self.day, '10:00', '12:00', room=0),
+            _shift(5, 5, self.day, '13:00', '14:00'),
+        ])
+        self.assertEqual([(c['kind'], c['ids'], c['room'], c['role']) for c in conflicts],
+                         [('room', [1, 2], 1, '主播')])
+        self.assertEqual((conflicts[0]['start'], conflicts[0]['end']), ('11:00', '12:00'))
+
+
+class ConflictsInRangeTests(TestCase):
+    def test_previous_day_overnight_shift_and_cancellations(self):
+        person = Person.objects.create(name='測試員工')
+        day = datetime(2026, 1, 5).date()
+        Schedule.objects.create(date=day - timedelta(days=1), person=person, role='主播',
+                                start_time='23:00', end_time='02:00')
+        kept = Schedule.objects.create(date=day, person=person, role='主播', start_time='01:00', end_time='03:00')
+        Schedule.objects.create(date=day, person=person, role='主播', start_time='01:30', end_time='02:30',
+                                modification_status='cancelled')
+        conflicts = conflicts_in_range(day, day)
+        self.assertEqual([(c['kind'], c['date'], c['start'], c['end']) for c in conflicts],
+                         [('person', '2026-01-05', '01:00', '02:00')])
+        self.assertIn(kept.id, conflicts[0]['ids'])
+
+
+class RosterImportTests(TestCase):
+    HEADER = '日期,員工,角色,開始,結束,品牌,房間\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = Person.objects.create(name='王小明', nick_name='小明')
+        Brand.objects.create(name='品牌A')
+
+    def test_valid_file_is_imported(self):
+        result = import_roster(self.HEADER + '2026-01-05,小明,streamer,10:00,12:00,品牌a,房間 2\n')
+        self.assertEqual((result['success'], result['created']), (True, 1))
+        schedule = Schedule.objects.get()
+        self.assertEqual((schedule.role, schedule.room, schedule.duration_minutes), ('主播', 2, 120))
+
+    def test_validation_errors_are_reported_per_line_and_nothing_is_written(self):
+        result = import_roster(
+            self.HEADER
+            + '2026-01-05,小明,主播,10:00,12:00,,\n'
+            + '2026-01-05,不存在,主播,25:00,12:00,,\n'
+            + '2026-13-01,小明,經理,10:00,12:00,無此品牌,\n')
+        self.assertFalse(result['success'])
+        self.assertEqual([row['line'] for row in result['errors']], [3, 4])
+        self.assertEqual([len(row['errors']) for row in result['errors']], [2, 3])
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_conflicts_reject_the_whole_file(self):
+        Schedule.objects.create(date=datetime(2026, 1, 5).date(), person=self.person, role='主播',
+                                start_time='11:00', end_time='13:00')
+        result = import_roster(
+            self.HEADER
+            + '2026-01-06,小明,主播,10:00,12:00,,\n'
+            + '2026-01-05,小明,主播,12:00,14:00,,\n')
+        self.assertFalse(result['success'])
+        self.assertEqual([row['line'] for row in result['errors']], [3])
+        self.assertEqual(Schedule.objects.count(), 1)
+
+    def test_failed_write_rolls_back(self):
+        rows = ''.join(f'2026-01-0{day},小明,主播,10:00,12:00,,\n' for day in range(1, 6))
+        with mock.patch('liveapp.models.notify_schedules_changed', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                import_roster(self.HEADER + rows)
+        self.assertFalse(Schedule.objects.exists())
+
+
+class PersonDayStatsRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.person = Person.objects.create(name='測試員工')
+        cls.day = datetime(2026, 1, 5).date()
+
+    def stats(self):
+        return {
+            (row.person_id, row.date): (row.scheduled_minutes, row.cancellations, row.shift_count)
+            for row in PersonDayStats.objects.all()
+        }
+
+    def assertRollupMatchesSchedules(self):
+        expected = {
+            (row['person_id'], row['date']): (row['scheduled_minutes'], row['cancellations'], row['shift_count'])
+            for row in aggregate_person_days(Schedule.objects.all())
+        }
+        self.assertEqual(self.stats(), expected)
+
+    def test_save_and_delete(self):
+        schedule = Schedule.objects.create(
+            date=self.day, person=self.person, role='主播', start_time='10:00', end_time='12:00')
+        self.assertEqual(self.stats(), {(self.person.pk, self.day): (120, 0, 1)})
+        schedule.date = self.day + timedelta(days=1)
+        schedule.is_late_cancellation = True
+        schedule.save()
+        self.assertEqual(self.stats(), {(self.person.pk, schedule.date): (120, 1, 1)})
+        schedule.delete()
+        self.assertEqual(self.stats(), {})
+
+    def test_bulk_operations(self):
+        schedules = Schedule.objects.bulk_create([
+            Schedule(date=self.day + timedelta(days=offset), person=self.person, role='主播',
+                     start_time='10:00', end_time='11:30')
+            for offset in range(3)
+        ])
+        self.assertRollupMatchesSchedules()
+        for schedule in schedules:
+            schedule.end_time = datetime.strptime('13:00', '%H:%M').time()
+        Schedule.objects.bulk_update(schedules, ['end_time'])
+        self.assertRollupMatchesSchedules()
+        Schedule.objects.filter(id=schedules[0].id).update(date=self.day + timedelta(days=1), start_time='09:00')
+        self.assertRollupMatchesSchedules()
+        self.assertEqual(self.stats()[(self.person.pk, self.day + timedelta(days=1))], (420, 0, 2))
+        Schedule.objects.filter(date__gt=self.day).delete()
+        self.assertEqual(self.stats(), {})
+
+
+class CancelScheduleCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.streamer = Person.objects.create(name='主播甲')
+        cls.operator = Person.objects.create(name='運營乙')
+        cls.day = datetime(2026, 1, 5).date()
+        for person, role, room, start, end in (
+            (cls.streamer, '主播', 1, '10:00', '12:00'),
+            (cls.operator, '運營', 1, '10:00', '12:00'),
+            (cls.streamer, '主播', 2, '14:00', '16:00'),
+        ):
+            Schedule.objects.create(date=cls.day, person=person, role=role, room=room, start_time=start, end_time=end)
+
+    def post(self, **payload):
+        return self.client.post(reverse('cancel_schedule'), json.dumps(payload), content_type='application/json')
+
+    def counters(self):
+        return dict(Person.objects.values_list('name', 'cancel_count')), dict(Person.objects.values_list('name', 'late_count'))
+
+    def test_cancel_counts_every_schedule_of_every_target(self):
+        response = self.post(reason='cancel', items=[
+            {'date': '2026-01-05', 'room': 1}, {'date': '2026-01-05', 'room': 2}, {'date': '2026-01-06', 'room': 1}])
+        data = response.json()
+        self.assertEqual((data['affected_count'], data['updated_count']), (3, 3))
+        self.assertEqual(data['missing'], [{'date': '2026-01-06', 'room': 1}])
+        self.assertEqual(self.counters()[0], {'主播甲': 2, '運營乙': 1})
+        self.assertEqual(set(Schedule.objects.values_list('modification_status', 'is_late_cancellation')),
+                         {('cancelled', True)})
+
+    def test_late_only_counts_selected_roles(self):
+        self.post(reason='late', date='2026-01-05', room=1, late_hours=1.5, selected_roles=['streamer'])
+        self.post(reason='late', date='2026-01-05', room=1, late_hours=1.5, selected_roles=['streamer'])
+        cancels, lates = self.counters()
+        self.assertEqual((cancels, lates), ({'主播甲': 0, '運營乙': 0}, {'主播甲': 2, '運營乙': 0}))
+        late_hours = dict(Schedule.objects.filter(room=1).values_list('role', 'late_hours'))
+        self.assertEqual(late_hours, {'主播': Decimal('1.50'), '運營': Decimal('0.00')})
+
+
+def _decode_compact_timeline(data):
+    """與 timeline_view.js 的 decodeCompactTimeline 相同的還原方式"""
+    fields = list(data['fields'])
+    no_brand = (None, '', NO_BRAND_COLOR, '')
+    decoded = {}
+    for day, rows in data['schedules_by_date'].items():
+        decoded[day] = []
+        for values in rows:
+            row = dict(zip(fields, values))
+            name, nick_name = data['persons'][row['person']]
+            brand_id, brand_name, brand_color, responsible = (
+                no_brand if row['brand'] is None else data['brands'][row['brand']])
+            modified = row['modified']
+            decoded[day].append({
+                'id': row['id'],
+                'person_name': name,
+                'person_nick_name': nick_name,
+                'role': data['roles'][row['role']],
+                'start_time': f"{row['start'] // 60:02d}:{row['start'] % 60:02d}",
+                'end_time': f"{row['end'] // 60:02d}:{row['end'] % 60:02d}",
+                'duration': row['duration'],
+                'brand_id': brand_id,
+                'brand_name': brand_name,
+                'brand_color': brand_color,
+                'brand_responsible': responsible,
+                'room': row['room'],
+                'modification_status': data['statuses'][row['status']],
+                'modification_reason': data['reasons'][row['reason']],
+                'is_late_cancellation': row['late_cancellation'] == 1,
+                'late_hours': row['late_hours'],
+                'modified_at': '' if modified is None else
+                datetime.fromtimestamp(modified * 60, dt_timezone.utc).strftime('%Y-%m-%d %H:%M'),
+            })
+    return decoded
+
+
+class CompactTimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = Person.objects.create(name='經理')
+        streamer = Person.objects.create(name='主播甲', nick_name='甲')
+        brand = Brand.objects.create(name='品牌A', color='#123456', responsible=manager)
+        cls.day = datetime(2026, 1, 5).date()
+        Schedule.objects.create(date=cls.day, person=streamer, role='主播', brand=brand, room=1,
+                                start_time='22:30', end_time='01:15', late_hours=Decimal('0.25'),
+                                modification_reason='遲到')
+        Schedule.objects.create(date=cls.day, person=manager, role='運營', start_time='10:00', end_time='12:00')
+        # 未修改過的排班 modified_at 為 None
+        Schedule.objects.bulk_create([Schedule(date=cls.day + timedelta(days=1), person=streamer, role='主播',
+                                               start_time='09:00', end_time='10:00')])
+        Schedule.objects.filter(date=cls.day + timedelta(days=1)).update(modified_at=None)
+
+    def setUp(self):
+        # TestCase 不會 commit，其他測試留下的同一週快取不會被清除
+        cache.clear()
+
+    def test_round_trip_matches_regular_format(self):
+        params = {'start': '2026-01-05', 'end': '2026-01-07'}
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        regular = self.client.get(reverse('timeline_view'), params, **headers).json()
+        compact = self.client.get(reverse('timeline_view'), dict(params, format='compact'), **headers).json()
+        self.assertEqual(compact['format'], 'compact-v1')
+        self.assertEqual(_decode_compact_timeline(compact), regular['schedules_by_date'])
+
+        schedules = [schedule for day in regular['schedules_by_date'].values() for schedule in day]
+        self.assertEqual(len(schedules), 3)
+        self.assertIn(None, [schedule['brand_id'] for schedule in schedules])
+        self.assertIn('', [schedule['modified_at'] for schedule in schedules])
+        self.assertEqual(regular['schedules_by_date']['2026-01-07'], [])
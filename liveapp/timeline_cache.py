@@ -0,0 +1,204 @@
+"""時間軸排班資料快取
+
+每日的排班列表以日期為 key、多日範圍以週（週一）為 key 存在 Django cache，
+所有使用者共用。收到 ``schedules_changed`` 時只刪除受影響日期與其所在週的快取
+（transaction commit 後才刪除）。
+
+快取值帶著寫入時各日期的 ``ScheduleVersion`` 版本號，讀取時先查目前版本號再比對：
+併發請求在刪除之後才把舊資料寫回快取時，舊資料的版本號已經過時，會被當成未命中重新查詢。
+版本號必須在查詢排班之前讀取，讀到新版本時查到的一定是已 commit 的新資料；
+呼叫端已讀過版本號（``request.schedule_versions``）時可傳入 ``versions`` 省下這次查詢。
+命中 / 未命中 / 失效次數記在 process 內（``instrumentation.TIMELINE_CACHE``），查詢快取時
+不再多送 cache 請求；由 ``/metrics`` 輸出，多個 worker 時由 Prometheus 加總。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+
+from .instrumentation import TIMELINE_CACHE, count_event, counter_values, reset_counter
+from .serializers import format_date, timeline_schedule, timeline_values
+from .signals import schedules_changed
+from .versioning import ascope_versions, date_scope, scope_versions
+
+# v2：快取值為 (版本號, 資料)
+KEY_PREFIX = 'timeline:v2'
+STAT_NAMES = ('hits', 'misses', 'invalidations')
+
+
+def _timeout():
+    return getattr(settings, 'TIMELINE_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def day_key(day):
+    return f'{KEY_PREFIX}:day:{day:%Y-%m-%d}'
+
+
+def week_key(monday):
+    return f'{KEY_PREFIX}:week:{monday:%Y-%m-%d}'
+
+
+def _count(name, amount=1):
+    count_event(TIMELINE_CACHE, name, amount)
+
+
+def _known(scopes, versions):
+    """versions 涵蓋所有 scope 時直接使用，否則回傳 None（需查詢）"""
+    if versions is not None and all(scope in versions for scope in scopes):
+        return versions
+    return None
+
+
+def day_schedules(day, versions=None):
+    """指定日期的排班列表（依開始時間排序）"""
+    key = day_key(day)
+    scopes = [date_scope(day)]
+    version = (_known(scopes, versions) or scope_versions(scopes))[scopes[0]]
+    cached = cache.get(key)
+    if cached is not None and cached[0] == version:
+        _count('hits')
+        return cached[1]
+    _count('misses')
+    schedules = [timeline_schedule(row) for row in timeline_values(date=day).order_by('start_time')]
+    cache.set(key, (version, schedules), _timeout())
+    return schedules
+
+
+def _mondays(start_date, end_date):
+    mondays = []
+    monday = _week_start(start_date)
+    while monday <= end_date:
+        mondays.append(monday)
+        monday += timedelta(days=7)
+    return mondays
+
+
+def _week_scopes(mondays):
+    return [date_scope(monday + timedelta(days=offset)) for monday in mondays for offset in range(7)]
+
+
+def range_scopes(start_date, end_date):
+    """``range_schedules`` 比對的版本 scope：涵蓋區間所在的整週"""
+    return _week_scopes(_mondays(start_date, end_date))
+
+
+def _week_version(versions, monday):
+    return tuple(versions[date_scope(monday + timedelta(days=offset))] for offset in range(7))
+
+
+def _current_weeks(mondays, versions, cached):
+    """版本號與目前相同的快取週：回傳 (weeks, 未命中的週)"""
+    weeks = {}
+    for monday in mondays:
+        entry = cached.get(week_key(monday))
+        if entry is not None and entry[0] == _week_version(versions, monday):
+            weeks[monday] = entry[1]
+    missing = [monday for monday in mondays if monday not in weeks]
+    _count('hits', len(weeks))
+    _count('misses', len(missing))
+    return weeks, missing
+
+
+def _week_entries(fetched, versions):
+    return {week_key(monday): (_week_version(versions, monday), days) for monday, days in fetched.items()}
+
+
+def _empty_weeks(mondays):
+    return {
+        monday: {(monday + timedelta(days=offset)).strftime('%Y-%m-%d'): [] for offset in range(7)}
+        for monday in mondays
+    }
+
+
+def _weeks_query(mondays):
+    in_weeks = Q()
+    for monday in mondays:
+        in_weeks |= Q(date__range=(monday, monday + timedelta(days=6)))
+    return timeline_values(in_weeks).order_by('date', 'start_time')
+
+
+def _add_to_week(weeks, row):
+    day = row['date']
+    weeks[_week_start(day)][format_date(day)].append(timeline_schedule(row))
+
+
+def _days_from_weeks(start_date, end_date, weeks):
+    schedules_by_date = {}
+    day = start_date
+    while day <= end_date:
+        schedules_by_date[day.strftime('%Y-%m-%d')] = weeks[_week_start(day)][day.strftime('%Y-%m-%d')]
+        day += timedelta(days=1)
+    return schedules_by_date
+
+
+def range_schedules(start_date, end_date, versions=None):
+    """[start_date, end_date] 每一天的排班，以週為單位快取；未命中的週以一次查詢補齊
+
+    回傳 ``{'YYYY-MM-DD': [...]}``，沒有排班的日期為空列表。
+    """
+    mondays = _mondays(start_date, end_date)
+    scopes = _week_scopes(mondays)
+    versions = _known(scopes, versions) or scope_versions(scopes)
+    weeks, missing = _current_weeks(mondays, versions, cache.get_many([week_key(monday) for monday in mondays]))
+    if missing:
+        fetched = _empty_weeks(missing)
+        for row in _weeks_query(missing):
+            _add_to_week(fetched, row)
+        cache.set_many(_week_entries(fetched, versions), _timeout())
+        weeks.update(fetched)
+    return _days_from_weeks(start_date, end_date, weeks)
+
+
+async def arange_schedules(start_date, end_date, versions=None):
+    """``range_schedules`` 的 async 版本（async cache API 與 ORM ``aiterator``）"""
+    mondays = _mondays(start_date, end_date)
+    scopes = _week_scopes(mondays)
+    versions = _known(scopes, versions) or await ascope_versions(scopes)
+    weeks, missing = _current_weeks(
+        mondays, versions, await cache.aget_many([week_key(monday) for monday in mondays]))
+    if missing:
+        fetched = _empty_weeks(missing)
+        async for row in _weeks_query(missing).aiterator():
+            _add_to_week(fetched, row)
+        await cache.aset_many(_week_entries(fetched, versions), _timeout())
+        weeks.update(fetched)
+    return _days_from_weeks(start_date, end_date, weeks)
+
+
+def invalidate_dates(dates):
+    keys = set()
+    for day in dates:
+        keys.add(day_key(day))
+        keys.add(week_key(_week_start(day)))
+    if keys:
+        cache.delete_many(list(keys))
+        _count('invalidations', len(keys))
+
+
+@receiver(schedules_changed)
+def _invalidate_on_change(sender, keys, **kwargs):
+    dates = {day for _, day in keys if day}
+    if dates:
+        transaction.on_commit(lambda: invalidate_dates(dates))
+
+
+def cache_stats():
+    """目前 process 的命中 / 未命中統計"""
+    values = counter_values(TIMELINE_CACHE)
+    stats = {name: values.get(name, 0) for name in STAT_NAMES}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups * 100, 1) if lookups else 0.0
+    stats['backend'] = type(caches[DEFAULT_CACHE_ALIAS]).__name__
+    stats['timeout'] = _timeout()
+    return stats
+
+
+def reset_cache_stats():
+    reset_counter(TIMELINE_CACHE)
@@ -5,13 +5,29 @@ urlpatterns = [
     path('', views.person_list, name='person_list'),
     path('person/create/', views.person_create, name='person_create'),
     path('invoice/create/', views.invoice_create, name='invoice_create'),
+    path('invoice/<int:pk>/pdf/', views.invoice_pdf, name='invoice_pdf'),
+    path('invoice/export/zip/', views.invoice_pdf_zip, name='invoice_pdf_zip'),
     path('date-form/', views.calendar, name='date_form'),
+    path('api/calendar-schedules/', views.calendar_schedules_api, name='calendar_schedules_api'),
+    path('api/schedule-sync/', views.schedule_sync_api, name='schedule_sync_api'),
+    path('date-form/import/', views.import_roster_view, name='import_roster'),
     path('date-form/delete/<int:pk>/',
          views.schedule_delete, name='schedule_delete'),
     path('brand/create/', views.brand_create, name='brand_create'),
+    path('api/brand-utilisation/', views.brand_utilisation_api, name='brand_utilisation_api'),
+    path('api/schedule-conflicts/', views.schedule_conflicts_api, name='schedule_conflicts_api'),
     path('schedule/edit/<int:pk>/', views.schedule_edit, name='schedule_edit'),
     path('cancel-schedule/', views.cancel_schedule, name='cancel_schedule'),
+    path('export/schedules/', views.export_schedules, name='export_schedules'),
     path('api/employee-schedule/', views.get_employee_schedule, name='get_employee_schedule'),
+    path('api/employee-schedules/', views.get_employee_schedules_batch, name='get_employee_schedules_batch'),
     path('api/update-schedule/', views.update_schedule_api, name='update_schedule_api'),
+    path('api/update-schedules/', views.batch_update_schedules_api, name='batch_update_schedules_api'),
     path('timeline/', views.timeline_view, name='timeline_view'),
+    path('api/timeline-cache-stats/', views.timeline_cache_stats_api, name='timeline_cache_stats_api'),
+    path('metrics', views.metrics, name='metrics'),
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/diff/', views.profile_diff, name='profile_diff'),
+    path('profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
+    path('profiles/<str:profile_id>/download/', views.profile_download, name='profile_download'),
 ]
@@ -0,0 +1,76 @@
+"""品牌合作時數使用率：以單一 GROUP BY 查詢彙總每個品牌的排班時數"""
+import datetime
+
+from django.db.models import F, Q, Sum
+
+from .models import Brand, Schedule
+
+
+def month_bounds(day):
+    """回傳 day 所在月份的第一天與最後一天"""
+    first = day.replace(day=1)
+    next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first, next_month - datetime.timedelta(days=1)
+
+
+def brand_hours(start, end):
+    """Hours per brand for [start, end] and for each brand's own cooperation period.
+
+    Returns ``{brand_id: {'hours': ..., 'period_hours': ...}}`` where ``hours``
+    covers the requested range and ``period_hours`` covers the brand's
+    ``start_date``..``end_date``. Brands without schedules are omitted.
+    """
+    in_range = Q(date__range=(start, end))
+    in_period = Q(date__gte=F('brand__start_date'), date__lte=F('brand__end_date'))
+    rows = Schedule.objects.filter(
+        in_range | in_period, brand__isnull=False
+    ).values('brand_id').annotate(
+        range_minutes=Sum('duration_minutes', filter=in_range),
+        period_minutes=Sum('duration_minutes', filter=in_period),
+    ).order_by()
+    return {
+        row['brand_id']: {
+            'hours': round((row['range_minutes'] or 0) / 60, 2),
+            'period_hours': round((row['period_minutes'] or 0) / 60, 2),
+        }
+        for row in rows
+    }
+
+
+def attach_brand_utilisation(brands, start, end):
+    """Set ``month_hours``, ``period_hours`` and ``progress`` on each brand.
+
+    ``progress`` is the share of ``coop_hours`` already used within the
+    brand's cooperation period, as a percentage.
+    """
+    hours_by_brand = brand_hours(start, end)
+    for brand in brands:
+        hours = hours_by_brand.get(brand.id, {'hours': 0.0, 'period_hours': 0.0})
+        total_coop = float(brand.coop_hours) if brand.coop_hours is not None else 0.0
+        brand.month_hours = hours['hours']
+        brand.period_hours = hours['period_hours']
+        brand.progress = round(hours['period_hours'] / total_coop * 100, 2) if total_coop > 0 else 0.0
+    return brands
+
+
+def brand_utilisation_report(start, end):
+    """JSON 報表資料：每個品牌在區間內與合作期間內的時數及使用率"""
+    brands = attach_brand_utilisation(
+        list(Brand.objects.select_related('responsible').order_by('name')), start, end)
+    report = []
+    for brand in brands:
+        coop_hours = float(brand.coop_hours or 0)
+        report.append({
+            'id': brand.id,
+            'name': brand.name,
+            'color': brand.color,
+            'responsible': brand.responsible.name if brand.responsible else '',
+            'start_date': brand.start_date.strftime('%Y-%m-%d'),
+            'end_date': brand.end_date.strftime('%Y-%m-%d'),
+            'coop_hours': coop_hours,
+            'hours': brand.month_hours,
+            'period_hours': brand.period_hours,
+            'remaining_hours': round(coop_hours - brand.period_hours, 2),
+            'progress': brand.progress,
+        })
+    return report
@@ -0,0 +1,136 @@
+"""排班資料版本號與條件式 GET（ETag / Last-Modified）
+
+每個日期與員工各有一筆 ``ScheduleVersion``，收到 ``schedules_changed`` 時遞增。
+JSON 端點用 ``schedule_condition`` 包裝後，客戶端帶著 If-None-Match /
+If-Modified-Since 重新請求且資料沒變時，只需一次版本查詢就回傳 304，
+不會再組裝排班資料。讀到的版本號存在 ``request.schedule_versions``，
+view 可直接交給 timeline_cache 比對，不必再查一次。
+"""
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import ScheduleVersion
+from .signals import schedules_changed
+
+
+def date_scope(day):
+    return f'date:{day:%Y-%m-%d}'
+
+
+def person_scope(person_id):
+    return f'person:{person_id}'
+
+
+def bump_versions(scopes):
+    """將指定 scope 的版本號加一（不存在的先建立）"""
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    now = timezone.now()
+    ScheduleVersion.objects.bulk_create(
+        [ScheduleVersion(scope=scope, updated_at=now) for scope in scopes],
+        ignore_conflicts=True)
+    ScheduleVersion.objects.filter(scope__in=scopes).update(
+        version=F('version') + 1, updated_at=now)
+
+
+@receiver(schedules_changed)
+def _bump_on_change(sender, keys, **kwargs):
+    scopes = set()
+    for person_id, day in keys:
+        if person_id:
+            scopes.add(person_scope(person_id))
+        if day:
+            scopes.add(date_scope(day))
+    bump_versions(scopes)
+
+
+def scope_versions(scopes):
+    """各 scope 目前的版本號；尚未有變更紀錄的 scope 為 0"""
+    rows = dict(ScheduleVersion.objects.filter(scope__in=set(scopes)).values_list('scope', 'version'))
+    return {scope: rows.get(scope, 0) for scope in scopes}
+
+
+async def ascope_versions(scopes):
+    """``scope_versions`` 的 async 版本"""
+    rows = {
+        scope: version async for scope, version in ScheduleVersion.objects.filter(
+            scope__in=set(scopes)).values_list('scope', 'version')
+    }
+    return {scope: rows.get(scope, 0) for scope in scopes}
+
+
+def version_state(scopes, salt=''):
+    """回傳 (etag, last_modified, {scope: 版本號})；尚未有變更紀錄的 scope 視為版本 0"""
+    scopes = sorted(set(scopes))
+    rows = dict(
+        (scope, (version, updated_at))
+        for scope, version, updated_at in ScheduleVersion.objects.filter(
+            scope__in=scopes).values_list('scope', 'version', 'updated_at'))
+    digest = hashlib.sha1(salt.encode())
+    for scope in scopes:
+        digest.update(f'|{scope}={rows.get(scope, (0,))[0]}'.encode())
+    last_modified = max((updated_at for _, updated_at in rows.values()), default=None)
+    return digest.hexdigest(), last_modified, {scope: rows.get(scope, (0,))[0] for scope in scopes}
+
+
+def _precondition(request, etag, last_modified):
+    """與 django.views.decorators.http.condition 相同的判斷；回傳 (304/412 回應或 None, etag, timestamp)"""
+    etag = quote_etag(etag) if etag is not None else None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp), etag, timestamp
+
+
+def _finish(request, response, etag, timestamp):
+    if request.method in ('GET', 'HEAD'):
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        if etag:
+            response.headers.setdefault('ETag', etag)
+    if response.has_header('ETag'):
+        # 要求瀏覽器每次都帶版本重新驗證，而不是依 Last-Modified 推測快取
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def schedule_condition(scopes_func):
+    """以版本號處理條件式 GET 的 view decorator（支援 sync 與 async view）
+
+    ``scopes_func(request, *args, **kwargs)`` 回傳 ``(scopes, salt)``，或在
+    不適用（非 AJAX、參數錯誤等）時回傳 None，交給 view 照常處理。
+    Django 4.2 的 ``condition`` 不支援 async view，因此在這裡直接處理。
+    """
+    def state(request, *args, **kwargs):
+        spec = scopes_func(request, *args, **kwargs)
+        if not spec:
+            return None, None
+        etag, last_modified, request.schedule_versions = version_state(*spec)
+        return etag, last_modified
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_inner(request, *args, **kwargs):
+                response, etag, timestamp = _precondition(
+                    request, *await sync_to_async(state)(request, *args, **kwargs))
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _finish(request, response, etag, timestamp)
+            return async_inner
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response, etag, timestamp = _precondition(request, *state(request, *args, **kwargs))
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return _finish(request, response, etag, timestamp)
+        return inner
+    return decorator
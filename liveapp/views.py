@@ -1,46 +1,98 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.utils.dateparse import parse_date, parse_time
-from .models import Person, Invoice, Schedule, Brand, Company
+from .models import Person, Invoice, Schedule, Brand, Company, PersonDayStats
 from .forms import PersonForm, InvoiceForm, InvoiceItemFormSet, ScheduleForm, BrandForm
 from django.shortcuts import get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
+from django.utils.cache import patch_vary_headers
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from collections import Counter
 import json
+import re
 from decimal import Decimal
 from .forms import ScheduleForm
+from .instrumentation import JsonResponse, render_metrics
+from .utilisation import attach_brand_utilisation, brand_utilisation_report, month_bounds
+from .ledger import invoice_filters, invoice_page, persons_with_invoice_totals
+from .serializers import (
+    calendar_schedule, calendar_values, compact_timeline, employee_schedule, employee_values, format_date,
+    wants_compact_timeline,
+)
+from .sync import make_cursor, parse_cursor, schedule_changes
+from .timeline_cache import arange_schedules, cache_stats, day_schedules, range_scopes, reset_cache_stats
+from .conflicts import check_schedules, checks_enabled, conflicts_in_range, describe_conflict, person_names
+from .versioning import date_scope, person_scope, schedule_condition
+
+
+def async_csrf_exempt(view_func):
+    """Django 4.2 的 csrf_exempt 會把 async view 包成 sync 函式，async view 改為直接標記"""
+    view_func.csrf_exempt = True
+    return view_func
+
+
+_ROOM_NUMBER_RE = re.compile(r'\d+')
 
 
 def person_list(request):
-    # Efficient scheduling stats: fetch schedules once and group in Python
+    # Scheduling stats come from the per-person daily rollup (PersonDayStats), one grouped query per window
     import datetime
+    from django.db.models import Sum
     today = timezone.localdate()
-    current_year, current_month = today.year, today.month
+    month_start, month_end = month_bounds(today)
     window_start = today - datetime.timedelta(days=29)
-    # one query for persons
-    persons = list(Person.objects.all().order_by('name'))
-    # fetch relevant schedules in bulk
-    month_scheds = list(Schedule.objects.filter(date__year=current_year, date__month=current_month))
-    window_scheds = list(Schedule.objects.filter(date__range=(window_start, today)))
-    from collections import defaultdict
-    month_map = defaultdict(list)
-    window_map = defaultdict(list)
-    for s in month_scheds:
-        month_map[s.person_id].append(s)
-    for s in window_scheds:
-        window_map[s.person_id].append(s)
-    # compute stats per person
+    # one query for persons, with invoice count / total annotated per person
+    persons = list(persons_with_invoice_totals())
+    month_stats = {
+        row['person_id']: row
+        for row in PersonDayStats.objects.filter(
+            date__range=(month_start, month_end)
+        ).values('person_id').annotate(
+            minutes=Sum('scheduled_minutes'), late_hours=Sum('late_hours')
+        ).order_by()
+    }
+    window_stats = {
+        row['person_id']: row
+        for row in PersonDayStats.objects.filter(
+            date__range=(window_start, today)
+        ).values('person_id').annotate(
+            total=Sum('shift_count'), cancelled=Sum('cancellations')
+        ).order_by()
+    }
+    # attach stats per person
     for p in persons:
-        mlist = month_map.get(p.id, [])
-        p.total_hours = round(sum(s.duration for s in mlist), 2)
-        p.monthly_late_hours = round(sum(s.late_hours for s in mlist), 2)
-        wlist = window_map.get(p.id, [])
-        total_window = len(wlist)
-        cancelled = sum(1 for s in wlist if s.is_late_cancellation)
+        mstats = month_stats.get(p.id)
+        p.total_hours = round(mstats['minutes'] / 60, 2) if mstats else 0
+        p.monthly_late_hours = round(mstats['late_hours'] or 0, 2) if mstats else 0
+        wstats = window_stats.get(p.id)
+        total_window = wstats['total'] if wstats else 0
+        cancelled = wstats['cancelled'] if wstats else 0
         p.attendance_rate = round((total_window - cancelled) / total_window * 100, 2) if total_window > 0 else None
-    invoices = Invoice.objects.all()
-    return render(request, 'liveapp/person_list.html', {'persons': persons, 'invoices': invoices})
+    # invoice ledger: filtered, keyset-paginated, person joined in the same query
+    invoice_filter = invoice_filters(request.GET)
+    invoices, next_cursor = invoice_page(invoice_filter, request.GET.get('after'))
+    next_page_query = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['after'] = next_cursor
+        next_page_query = query.urlencode()
+    first_page_query = None
+    if request.GET.get('after'):
+        query = request.GET.copy()
+        del query['after']
+        first_page_query = query.urlencode()
+    return render(request, 'liveapp/person_list.html', {
+        'persons': persons,
+        'invoices': invoices,
+        'invoice_filter': invoice_filter,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query,
+    })
 
 
 def person_create(request):
@@ -138,6 +190,68 @@ def invoice_create(request):
     })
 
 
+def export_schedules(request):
+    """薪資用排班匯出：?start=&end=&person=&format=csv|xlsx，預設為本月 CSV"""
+    from django.http import FileResponse
+    from .exports import iter_csv, schedule_export_rows, xlsx_available, xlsx_tempfile
+    from .streaming import streaming_response
+    try:
+        start_date = parse_date(request.GET.get('start', ''))
+        end_date = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        return HttpResponse('無效的 start / end 日期', status=400, content_type='text/plain; charset=utf-8')
+    if not start_date and not end_date:
+        start_date, end_date = month_bounds(timezone.localdate())
+    person_ids = request.GET.getlist('person')
+    if not all(person_id.isdigit() for person_id in person_ids):
+        return HttpResponse('無效的員工 ID', status=400, content_type='text/plain; charset=utf-8')
+
+    rows = schedule_export_rows(start_date, end_date, [int(person_id) for person_id in person_ids])
+    name = f"schedules-{start_date or 'start'}-{end_date or 'end'}"
+    if request.GET.get('format') == 'xlsx':
+        if not xlsx_available():
+            return HttpResponse('伺服器未安裝 openpyxl，無法匯出 XLSX', status=503, content_type='text/plain; charset=utf-8')
+        return FileResponse(xlsx_tempfile(rows), as_attachment=True, filename=f'{name}.xlsx')
+    # ASGI（daphne）下以 async iterator 逐段送出，不會先把整個 CSV 讀進記憶體
+    response = streaming_response(request, iter_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+    return response
+
+
+def invoice_pdf(request, pk):
+    """發票 PDF（內容未變時直接回傳磁碟快取）；?download=1 以附件下載"""
+    from django.http import FileResponse
+    from .invoice_pdf import get_invoice_pdf, pdf_available
+    if not pdf_available():
+        return HttpResponse('伺服器未安裝 reportlab，無法產生 PDF', status=503, content_type='text/plain; charset=utf-8')
+    invoice = get_object_or_404(
+        Invoice.objects.select_related('person').prefetch_related('items'), pk=pk)
+    path, filename = get_invoice_pdf(invoice)
+    return FileResponse(
+        open(path, 'rb'), content_type='application/pdf',
+        as_attachment=bool(request.GET.get('download')), filename=filename)
+
+
+def invoice_pdf_zip(request):
+    """?month=YYYY-MM：該月所有發票的 PDF，以 ZIP 串流下載"""
+    from .invoice_pdf import pdf_available, stream_invoice_zip
+    from .streaming import streaming_response
+    if not pdf_available():
+        return HttpResponse('伺服器未安裝 reportlab，無法產生 PDF', status=503, content_type='text/plain; charset=utf-8')
+    try:
+        month = parse_date(f"{request.GET.get('month', '')}-01")
+    except ValueError:
+        month = None
+    if month is None:
+        return HttpResponse('month 參數格式應為 YYYY-MM', status=400, content_type='text/plain; charset=utf-8')
+    invoices = Invoice.objects.filter(
+        date__range=month_bounds(month)
+    ).select_related('person').prefetch_related('items').order_by('date', 'id')
+    response = streaming_response(request, stream_invoice_zip(invoices), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="invoices-{month:%Y-%m}.zip"'
+    return response
+
+
 def calendar(request):
     persons = Person.objects.all().order_by('name')
     
@@ -155,32 +269,12 @@ def calendar(request):
     if selected_date:
         try:
             selected_date = parse_date(selected_date)
-            schedules = Schedule.objects.filter(date=selected_date)
+            schedules = Schedule.objects.filter(date=selected_date).select_related('person', 'brand')
         except ValueError:
             schedules = Schedule.objects.none()
     else:
         schedules = Schedule.objects.none()
 
-    # Build mapping of all schedules by date for calendar display
-    from collections import defaultdict
-    all_schedules = Schedule.objects.all()
-    schedules_by_date = defaultdict(list)
-    for s in all_schedules:
-        key = s.date.strftime('%Y-%m-%d')
-        schedules_by_date[key].append({
-            'id': s.id,
-            'person_name': s.person.name,
-            'brand_name': s.brand.name if s.brand else '',
-            'brand_color': s.brand.color if s.brand and hasattr(s.brand, 'color') else '',
-            'role': s.role,
-            # include time, duration and room for displays
-            'start_time': s.start_time.strftime('%H:%M'),
-            'end_time': s.end_time.strftime('%H:%M'),
-            'duration': s.duration,
-            'room': s.room,
-            'is_late_cancellation': s.is_late_cancellation,
-        })
-
     # 處理 POST 上傳排班
     if request.method == 'POST':
         form = ScheduleForm(request.POST)
@@ -206,27 +300,11 @@ def calendar(request):
 
     # 傳遞品牌列表以供表單選擇
     brands = list(Brand.objects.all())
-    # 計算每個品牌在本月份的總時數
-    from django.utils import timezone
+    # 計算每個品牌在本月份的總時數與合作期間使用率（單一彙總查詢）
     today = timezone.localdate()
-    current_year = today.year
     current_month = today.month
-    monthly_hours_by_brand = {}
-    for brand in brands:
-        bs = Schedule.objects.filter(
-            brand=brand, date__year=current_year, date__month=current_month)
-        total = sum(s.duration for s in bs)
-        monthly_hours_by_brand[brand.id] = round(total, 2)
-    # Attach month_hours and progress percentage attributes for template convenience
-    for brand in brands:
-        hours = monthly_hours_by_brand.get(brand.id, 0.00)
-        setattr(brand, 'month_hours', hours)
-        # calculate current cooperation progress as percentage of total coop_hours
-        total_coop = float(
-            brand.coop_hours) if brand.coop_hours is not None else 0.0
-        progress = round((hours / total_coop * 100),
-                         2) if total_coop > 0 else 0.0
-        setattr(brand, 'progress', progress)
+    attach_brand_utilisation(brands, *month_bounds(today))
+    monthly_hours_by_brand = {brand.id: brand.month_hours for brand in brands}
     
     # 獲取修改記錄（遲到和取消的記錄）
     modification_records = Schedule.objects.filter(
@@ -238,7 +316,6 @@ def calendar(request):
         'persons': persons,
         'persons_by_letter': persons_by_letter,
         'schedules': schedules,
-        'schedules_by_date': dict(schedules_by_date),
         'brands': brands,
         'monthly_hours_by_brand': monthly_hours_by_brand,
         'current_month': current_month,
@@ -248,6 +325,162 @@ def calendar(request):
     })
 
 
+def import_roster_view(request):
+    """上傳排班表 CSV（欄位 file，dry_run=1 時只驗證）；任何錯誤都不會寫入"""
+    from .roster_import import import_roster
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': '僅支援 POST 請求'}, status=405)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': '請選擇 CSV 檔案'}, status=400)
+    try:
+        result = import_roster(upload, dry_run=bool(request.POST.get('dry_run')))
+    except UnicodeDecodeError:
+        return JsonResponse({'success': False, 'error': 'CSV 需為 UTF-8 編碼'}, status=400)
+    if not result['success']:
+        result['error'] = f"{len(result['errors'])} 列資料有誤，未匯入任何排班"
+        return JsonResponse(result, status=400)
+    return JsonResponse(result)
+
+
+def brand_utilisation_api(request):
+    """品牌使用率報表：?start=&end= 區間時數（預設本月）及合作期間使用率"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
+
+    default_start, default_end = month_bounds(timezone.localdate())
+    try:
+        start_date = parse_date(request.GET.get('start', '')) or default_start
+        end_date = parse_date(request.GET.get('end', '')) or default_end
+    except ValueError:
+        return JsonResponse({'success': False, 'error': '無效的日期格式'}, status=400)
+    if end_date < start_date:
+        return JsonResponse({'success': False, 'error': 'end 不可早於 start'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'start': start_date.strftime('%Y-%m-%d'),
+            'end': end_date.strftime('%Y-%m-%d'),
+            'brands': brand_utilisation_report(start_date, end_date),
+        }
+    })
+
+
+def schedule_conflicts_api(request):
+    """排班衝突報表：?start=&end=（最多 CALENDAR_MAX_RANGE_DAYS 天，預設本月）"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
+    if 'start' in request.GET or 'end' in request.GET:
+        date_range = _request_date_range(request, CALENDAR_MAX_RANGE_DAYS)
+        if date_range is None:
+            return _date_range_error(CALENDAR_MAX_RANGE_DAYS)
+        start_date, end_date = date_range
+    else:
+        start_date, end_date = month_bounds(timezone.localdate())
+
+    conflicts = conflicts_in_range(start_date, end_date)
+    names = person_names(conflicts)
+    for conflict in conflicts:
+        conflict['message'] = describe_conflict(conflict, names)
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'start': start_date.strftime('%Y-%m-%d'),
+            'end': end_date.strftime('%Y-%m-%d'),
+            'count': len(conflicts),
+            'conflicts': conflicts,
+        }
+    })
+
+
+# 日曆資料一次最多回傳的天數（前端以月份為單位載入，最多同時補齊三個月）
+CALENDAR_MAX_RANGE_DAYS = 93
+
+
+def _request_date_range(request, max_days):
+    """讀取 ?start=&end=，無效或超過 max_days 天時回傳 None"""
+    try:
+        start_date = parse_date(request.GET.get('start', ''))
+        end_date = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        return None
+    if not start_date or not end_date or end_date < start_date:
+        return None
+    if (end_date - start_date).days >= max_days:
+        return None
+    return start_date, end_date
+
+
+def _date_range_error(max_days):
+    return JsonResponse({'success': False, 'error': f'start / end 無效或超過 {max_days} 天'}, status=400)
+
+
+def _dates_between(start_date, end_date):
+    from datetime import timedelta
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def _calendar_version_scopes(request):
+    date_range = _request_date_range(request, CALENDAR_MAX_RANGE_DAYS) if request.method == 'GET' else None
+    if date_range is None:
+        return None
+    return [date_scope(day) for day in _dates_between(*date_range)], 'calendar'
+
+
+@schedule_condition(_calendar_version_scopes)
+def calendar_schedules_api(request):
+    """日曆排班資料：依 start/end 日期區間回傳，供日曆頁面按月份延遲載入"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
+
+    date_range = _request_date_range(request, CALENDAR_MAX_RANGE_DAYS)
+    if date_range is None:
+        return _date_range_error(CALENDAR_MAX_RANGE_DAYS)
+    start_date, end_date = date_range
+
+    # 只取 date_form.js 會用到的欄位，person / brand 以 JOIN 一次取得
+    rows = calendar_values(date__range=(start_date, end_date)).order_by('date', 'id')
+
+    schedules_by_date = {}
+    for row in rows:
+        schedules_by_date.setdefault(format_date(row['date']), []).append(calendar_schedule(row))
+
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'start': start_date.strftime('%Y-%m-%d'),
+            'end': end_date.strftime('%Y-%m-%d'),
+            'schedules_by_date': schedules_by_date,
+        }
+    })
+
+
+def schedule_sync_api(request):
+    """排班 delta sync：?start=&end=&since=<cursor>
+
+    沒有 since（或 cursor 過舊）時回傳區間內全部排班並標記 reset；
+    否則只回傳 cursor 之後新增 / 修改的排班與刪除的排班 id。
+    """
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
+    date_range = _request_date_range(request, CALENDAR_MAX_RANGE_DAYS)
+    if date_range is None:
+        return _date_range_error(CALENDAR_MAX_RANGE_DAYS)
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_cursor(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'success': False, 'error': '無效的 cursor'}, status=400)
+
+    start_date, end_date = date_range
+    data = schedule_changes(start_date, end_date, since)
+    data['start'] = start_date.strftime('%Y-%m-%d')
+    data['end'] = end_date.strftime('%Y-%m-%d')
+    return JsonResponse({'success': True, 'data': data})
+
+
 def schedule_delete(request, pk):
     """刪除指定排班並重定向到相同日期的排班頁面。"""
     sched = get_object_or_404(Schedule, pk=pk)
@@ -309,90 +542,141 @@ def schedule_edit(request, pk):
     return render(request, 'liveapp/schedule_form.html', {'form': form})
 
 
-@csrf_exempt
-def cancel_schedule(request):
+def _role_selected(role, selected_roles):
+    """判斷排班角色是否在選中的角色列表中；未選擇角色時影響所有人（向後兼容）"""
+    if not selected_roles:
+        return True
+    role = role.lower()
+    if role in ['主播', 'streamer', 'anchor']:
+        return 'streamer' in selected_roles
+    if role in ['運營', 'operator']:
+        return 'operator' in selected_roles
+    return False
+
+
+def _increment_person_counters(field, counts):
+    """以 F() 表達式累加 Person 計數欄位，相同增量的人員合併為一個 UPDATE"""
+    by_increment = {}
+    for person_id, increment in counts.items():
+        by_increment.setdefault(increment, []).append(person_id)
+    for increment, person_ids in by_increment.items():
+        Person.objects.filter(id__in=person_ids).update(**{field: F(field) + increment})
+
+
+def _apply_schedule_status(targets, reason, late_hours, selected_roles, data):
+    """在 transaction 內鎖定並更新 targets（(date, room) 集合）的排班
+
+    回傳 (排班列表, 有排班的 targets, 影響人數)；找不到任何排班時排班列表為空。
+    """
+    target_filter = Q()
+    for target_date, room in targets:
+        target_filter |= Q(date=target_date, room=room)
+
+    now = timezone.now()
+    with transaction.atomic():
+        schedules = list(
+            Schedule.objects.select_for_update().filter(target_filter).order_by('id'))
+        if not schedules:
+            return [], set(), 0
+
+        # 每個 (date, room) 以第一筆排班的開始時間判斷是否為延遲取消
+        first_by_target = {}
+        for schedule in schedules:
+            first_by_target.setdefault((schedule.date, schedule.room), schedule)
+        late_targets = {
+            key for key, first in first_by_target.items()
+            if now > timezone.make_aware(
+                timezone.datetime.combine(first.date, first.start_time))
+        }
+
+        late_counts = Counter()
+        cancel_counts = Counter()
+        affected_count = 0
+        for schedule in schedules:
+            # 記錄修改狀態和時間
+            schedule.modified_at = now
+            should_affect = _role_selected(schedule.role, selected_roles)
+
+            if reason == 'late':
+                if should_affect:
+                    late_counts[schedule.person_id] += 1
+                    # record late hours on schedule only for selected roles
+                    schedule.late_hours = late_hours
+                    affected_count += 1
+                schedule.modification_status = 'late'
+                schedule.modification_reason = data.get('modification_reason', '遲到')
+
+            elif reason == 'cancel':
+                if should_affect:
+                    cancel_counts[schedule.person_id] += 1
+                    affected_count += 1
+                schedule.modification_status = 'cancelled'
+                schedule.modification_reason = data.get('modification_reason', '取消直播')
+
+            # mark late cancellation flag for all schedules in the room
+            if (schedule.date, schedule.room) in late_targets:
+                schedule.is_late_cancellation = True
+
+        Schedule.objects.bulk_update(schedules, [
+            'modified_at', 'modification_status', 'modification_reason',
+            'late_hours', 'is_late_cancellation',
+        ])
+        _increment_person_counters('late_count', late_counts)
+        _increment_person_counters('cancel_count', cancel_counts)
+    return schedules, set(first_by_target), affected_count
+
+
+@async_csrf_exempt
+async def cancel_schedule(request):
+    """取消或標記遲到：單一 (date, room)，或以 items 一次處理多個 (date, room)
+
+    async view；需要 select_for_update 的 transaction 以 sync_to_async 在 thread 中執行。
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            date_str = data.get('date')
-            room = data.get('room')
             # parse late hours from request, default to 0
-            late_hours = data.get('late_hours', 0)
+            try:
+                late_hours = Decimal(str(data.get('late_hours', 0)))
+            except Exception:
+                late_hours = Decimal('0')
             reason = data.get('reason')
-            # 新增：獲取選中的角色列表
-            selected_roles = data.get('selected_roles', [])  # ['streamer', 'operator']
-
-            if not date_str or not room:
-                return JsonResponse({'success': False, 'error': '缺少日期或房間資訊'}, status=400)
+            # 選中的角色列表 ['streamer', 'operator']
+            selected_roles = data.get('selected_roles', [])
+            # items: [{'date': 'YYYY-MM-DD', 'room': 1}, ...]；未提供時使用單一 date / room
+            items = data.get('items')
+            if items is None:
+                items = [{'date': data.get('date'), 'room': data.get('room')}]
 
-            target_date = parse_date(date_str)
-            schedules_to_cancel = Schedule.objects.filter(
-                date=target_date, room=room)
+            targets = set()
+            for item in items:
+                date_str = item.get('date')
+                room = item.get('room')
+                if not date_str or not room:
+                    return JsonResponse({'success': False, 'error': '缺少日期或房間資訊'}, status=400)
+                try:
+                    target_date = parse_date(date_str)
+                    room = int(room)
+                except (ValueError, TypeError):
+                    target_date = None
+                if not target_date:
+                    return JsonResponse({'success': False, 'error': '無效的日期或房間資訊'}, status=400)
+                targets.add((target_date, room))
 
-            if not schedules_to_cancel.exists():
+            schedules, found, affected_count = await sync_to_async(_apply_schedule_status)(
+                targets, reason, late_hours, selected_roles, data)
+            if not schedules:
                 return JsonResponse({'success': False, 'error': '找不到對應的排班'}, status=404)
 
-            # 檢查是否為延遲取消
-            first_schedule = schedules_to_cancel.first()
-            schedule_start_datetime = timezone.make_aware(
-                timezone.datetime.combine(
-                    first_schedule.date, first_schedule.start_time)
-            )
-            is_late = timezone.now() > schedule_start_datetime
-
-            affected_count = 0
-            for schedule in schedules_to_cancel:
-                person = schedule.person
-                
-                # 記錄修改狀態和時間
-                schedule.modified_at = timezone.now()
-                
-                # 檢查當前排班的角色是否在選中列表中
-                schedule_role = schedule.role.lower()
-                is_streamer = schedule_role in ['主播', 'streamer', 'anchor']
-                is_operator = schedule_role in ['運營', 'operator']
-                
-                # 判斷是否應該影響這個人
-                should_affect = False
-                if is_streamer and 'streamer' in selected_roles:
-                    should_affect = True
-                elif is_operator and 'operator' in selected_roles:
-                    should_affect = True
-                elif not selected_roles:  # 如果沒有選擇角色，默認影響所有人（向後兼容）
-                    should_affect = True
-                
-                if reason == 'late':
-                    if should_affect:
-                        person.late_count += 1
-                        # record late hours on schedule only for selected roles
-                        try:
-                            schedule.late_hours = Decimal(str(late_hours))
-                        except Exception:
-                            schedule.late_hours = Decimal('0')
-                        affected_count += 1
-                    
-                    schedule.modification_status = 'late'
-                    schedule.modification_reason = data.get('modification_reason', '遲到')
-                    
-                elif reason == 'cancel':
-                    if should_affect:
-                        person.cancel_count += 1
-                        affected_count += 1
-                    
-                    schedule.modification_status = 'cancelled'
-                    schedule.modification_reason = data.get('modification_reason', '取消直播')
-                
-                if should_affect:
-                    person.save()
-
-                # mark late cancellation flag for all schedules in the room
-                if is_late:
-                    schedule.is_late_cancellation = True
-                # save schedule changes
-                schedule.save()
-
+            missing = sorted(targets - found)
             message = f'操作成功，影響了 {affected_count} 個人員'
-            return JsonResponse({'success': True, 'message': message, 'affected_count': affected_count})
+            return JsonResponse({
+                'success': True,
+                'message': message,
+                'affected_count': affected_count,
+                'updated_count': len(schedules),
+                'missing': [{'date': d.strftime('%Y-%m-%d'), 'room': r} for d, r in missing],
+            })
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'error': '無效的請求格式'}, status=400)
         except Exception as e:
@@ -401,9 +685,18 @@ def cancel_schedule(request):
     return JsonResponse({'success': False, 'error': '僅支援 POST 請求'}, status=405)
 
 
-@csrf_exempt
-def get_employee_schedule(request):
-    """獲取指定員工的班表信息"""
+def _employee_version_scopes(request):
+    employee_id = request.GET.get('employee_id', '')
+    if request.method != 'GET' or not employee_id.isdigit():
+        return None
+    # 回應含 is_today / is_past 與前後 30 天的區間，日期改變時 ETag 也要改變
+    return [person_scope(employee_id)], f'employee|{timezone.localdate()}'
+
+
+@async_csrf_exempt
+@schedule_condition(_employee_version_scopes)
+async def get_employee_schedule(request):
+    """獲取指定員工的班表信息（async view，使用 async ORM）"""
     if request.method == 'GET':
         employee_id = request.GET.get('employee_id')
         if not employee_id:
@@ -422,7 +715,7 @@ def get_employee_schedule(request):
             })
         
         try:
-            person = Person.objects.get(id=employee_id)
+            person = await Person.objects.aget(id=employee_id)
             
             # 獲取近30天的班表
             from datetime import timedelta
@@ -430,54 +723,24 @@ def get_employee_schedule(request):
             start_date = today - timedelta(days=30)
             end_date = today + timedelta(days=30)
             
-            schedules = Schedule.objects.filter(
+            schedules = employee_values(
                 person=person,
                 date__range=(start_date, end_date)
-            ).select_related('brand').order_by('-date', 'start_time')
+            ).order_by('-date', 'start_time')
             
-            # 計算統計信息
-            current_month_schedules = Schedule.objects.filter(
-                person=person,
-                date__year=today.year,
-                date__month=today.month
-            )
-            
-            total_hours = sum(s.duration for s in current_month_schedules)
-            cancelled_count = sum(1 for s in current_month_schedules if s.is_late_cancellation)
-            total_count = current_month_schedules.count()
-            attendance_rate = round((total_count - cancelled_count) / total_count * 100, 1) if total_count > 0 else 100
+            # 本月時數、班次數與取消數讀取每日彙總表（與批次 API 相同的計算）
+            from .rollup import employee_stats, month_stats_values
+            month_stats = [row async for row in month_stats_values([person.pk], today)]
+            stats = employee_stats(month_stats[0] if month_stats else None)
             
             # 構建班表數據
-            schedule_data = []
-            for schedule in schedules:
-                schedule_data.append({
-                    'id': schedule.id,
-                    'date': schedule.date.strftime('%Y-%m-%d'),
-                    'date_display': schedule.date.strftime('%m/%d'),
-                    'start_time': schedule.start_time.strftime('%H:%M'),
-                    'end_time': schedule.end_time.strftime('%H:%M'),
-                    'duration': float(schedule.duration),
-                    'role': schedule.role,
-                    'brand_name': schedule.brand.name if schedule.brand else '無品牌',
-                    'brand_color': schedule.brand.color if schedule.brand and hasattr(schedule.brand, 'color') else '#6c757d',
-                    'room': schedule.room,
-                    'is_cancelled': schedule.is_late_cancellation,
-                    'modification_status': schedule.modification_status,
-                    'is_past': schedule.date < today,
-                    'is_today': schedule.date == today,
-                    'is_future': schedule.date > today,
-                })
+            schedule_data = [employee_schedule(row, today) async for row in schedules.aiterator()]
             
             return JsonResponse({
                 'success': True,
                 'data': {
                     'employee_name': person.name,
-                    'stats': {
-                        'total_hours': round(total_hours, 1),
-                        'attendance_rate': attendance_rate,
-                        'total_schedules': total_count,
-                        'cancelled_schedules': cancelled_count,
-                    },
+                    'stats': stats,
                     'schedules': schedule_data
                 }
             })
@@ -490,15 +753,170 @@ def get_employee_schedule(request):
     return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
 
 
-def timeline_view(request):
+# 批次員工班表一次最多查詢的人數
+EMPLOYEE_BATCH_MAX = 100
+
+
+def _employee_batch_ids(request):
+    """?ids=1,2,3 或重複的 employee_id 參數；含非數字時回傳 None"""
+    raw = request.GET.getlist('employee_id')
+    for value in request.GET.getlist('ids'):
+        raw.extend(value.split(','))
+    raw = [value.strip() for value in raw if value.strip()]
+    if not all(value.isdigit() for value in raw):
+        return None
+    return sorted({int(value) for value in raw})
+
+
+def _employee_batch_version_scopes(request):
+    ids = _employee_batch_ids(request) if request.method == 'GET' else None
+    if not ids or len(ids) > EMPLOYEE_BATCH_MAX:
+        return None
+    return [person_scope(person_id) for person_id in ids], f'employees|{timezone.localdate()}'
+
+
+@schedule_condition(_employee_batch_version_scopes)
+def get_employee_schedules_batch(request):
+    """批次員工班表：一次查詢多位員工前後 30 天的排班，本月統計與單一員工 API 相同讀取每日彙總表"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET 請求'}, status=405)
+
+    ids = _employee_batch_ids(request)
+    if ids is None:
+        return JsonResponse({'success': False, 'error': '無效的員工 ID'}, status=400)
+    if not ids:
+        return JsonResponse({'success': False, 'error': '缺少員工 ID'}, status=400)
+    if len(ids) > EMPLOYEE_BATCH_MAX:
+        return JsonResponse({
+            'success': False,
+            'error': f'一次最多查詢 {EMPLOYEE_BATCH_MAX} 位員工'
+        }, status=400)
+
+    from datetime import timedelta
+    from .rollup import employee_stats, month_stats_values
+    today = timezone.localdate()
+    start_date = today - timedelta(days=30)
+    end_date = today + timedelta(days=30)
+
+    names = dict(Person.objects.filter(id__in=ids).values_list('id', 'name'))
+    # 本月統計讀取每日彙總表，與單一員工 API 使用相同的計算
+    stats_by_person = {row['person_id']: row for row in month_stats_values(list(names), today)}
+    schedules_by_person = {person_id: [] for person_id in names}
+    rows = employee_values(
+        person_id__in=list(names), date__range=(start_date, end_date)
+    ).order_by('person_id', '-date', 'start_time')
+    for row in rows:
+        schedules_by_person[row['person_id']].append(employee_schedule(row, today))
+
+    data = {
+        str(person_id): {
+            'employee_name': name,
+            'stats': employee_stats(stats_by_person.get(person_id)),
+            'schedules': schedules_by_person[person_id],
+        }
+        for person_id, name in names.items()
+    }
+
+    return JsonResponse({
+        'success': True,
+        'data': {
+            'employees': data,
+            'missing': [person_id for person_id in ids if person_id not in names],
+        }
+    })
+
+
+# 時間軸範圍請求一次最多回傳的天數
+TIMELINE_MAX_RANGE_DAYS = 31
+
+
+def _timeline_json(data, compact):
+    # 精簡格式不加空白，中文直接以 UTF-8 輸出（不轉成 \uXXXX）
+    params = {'ensure_ascii': False, 'separators': (',', ':')} if compact else None
+    return JsonResponse(data, json_dumps_params=params)
+
+
+async def _timeline_range_response(request):
+    """AJAX 範圍請求：?start=&end= 一次查詢回傳多天排班，依日期分組"""
+    try:
+        start_date = parse_date(request.GET.get('start', ''))
+        end_date = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        start_date = end_date = None
+    if not start_date or not end_date or end_date < start_date:
+        return JsonResponse({'success': False, 'error': '無效的 start / end 日期'}, status=400)
+    if (end_date - start_date).days >= TIMELINE_MAX_RANGE_DAYS:
+        return JsonResponse({
+            'success': False,
+            'error': f'日期區間不可超過 {TIMELINE_MAX_RANGE_DAYS} 天'
+        }, status=400)
+
+    # 區間內每一天都回傳（沒有排班的日期為空列表），讓前端知道這些日期已載入
+    schedules_by_date = await arange_schedules(
+        start_date, end_date, getattr(request, 'schedule_versions', None))
+    count = sum(len(day_list) for day_list in schedules_by_date.values())
+
+    compact = wants_compact_timeline(request)
+    data = compact_timeline(schedules_by_date) if compact else {'schedules_by_date': schedules_by_date}
+    data.update({
+        'start': start_date.strftime('%Y-%m-%d'),
+        'end': end_date.strftime('%Y-%m-%d'),
+        'count': count,
+        # 之後可用 /api/schedule-sync/?since= 只取得這次之後的變更
+        'cursor': make_cursor(),
+    })
+    return _timeline_json(data, compact)
+
+
+def _timeline_version_scopes(request):
+    """只有 AJAX 的 JSON 回應做條件式 GET，整頁 HTML 照常輸出"""
+    if request.method != 'GET' or request.headers.get('X-Requested-With') != 'XMLHttpRequest':
+        return None
+    # 精簡格式與一般格式的 ETag 不同
+    compact = '|compact' if wants_compact_timeline(request) else ''
+    if 'start' in request.GET:
+        date_range = _request_date_range(request, TIMELINE_MAX_RANGE_DAYS)
+        if date_range is None:
+            return None
+        # 以整週為單位，讀到的版本號可直接交給週快取比對
+        return range_scopes(*date_range), 'timeline-range' + compact
+    if 'date' in request.GET:
+        try:
+            selected_date = parse_date(request.GET['date'])
+        except ValueError:
+            selected_date = None
+    else:
+        from datetime import date
+        selected_date = date.today()  # 與 timeline_view 的預設日期一致
+    if selected_date is None:
+        return None
+    return [date_scope(selected_date)], 'timeline-day' + compact
+
+
+@schedule_condition(_timeline_version_scopes)
+async def timeline_view(request):
     """時間軸視圖：顯示品牌分類的每日排班時間軸，支持lazy loading無限滾動"""
-    from datetime import date, timedelta
-    
+    # AJAX 範圍請求（無限滾動預取前後一週）走 async 路徑
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        if 'start' in request.GET:
+            response = await _timeline_range_response(request)
+        else:
+            response = await sync_to_async(_timeline_page)(request)
+        # 依 Accept 選擇精簡格式
+        patch_vary_headers(response, ('Accept',))
+        return response
+    # 單日請求與頁面 render（模板會延遲讀取 queryset）只能在 sync context 執行
+    return await sync_to_async(_timeline_page)(request)
+
+
+def _timeline_page(request):
+    from datetime import date
+
     # 獲取選定的日期，默認為今天
     selected_date_str = request.GET.get('date', '')
     if selected_date_str:
         try:
-            selected_date = parse_date(selected_date_str)
+            selected_date = parse_date(selected_date_str) or date.today()
         except:
             selected_date = date.today()
     else:
@@ -513,70 +931,22 @@ def timeline_view(request):
     
     # 如果是AJAX請求，只返回指定日期的數據
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        schedules = Schedule.objects.filter(
-            date=selected_date
-        ).select_related('person', 'brand').order_by('start_time')
-        
-        schedule_list = []
-        for schedule in schedules:
-            schedule_list.append({
-                'id': schedule.id,
-                'person_name': schedule.person.name,
-                'person_nick_name': schedule.person.nick_name or '',
-                'role': schedule.role,
-                'start_time': schedule.start_time.strftime('%H:%M'),
-                'end_time': schedule.end_time.strftime('%H:%M'),
-                'duration': float(schedule.duration),
-                'brand_id': schedule.brand.id if schedule.brand else None,
-                'brand_name': schedule.brand.name if schedule.brand else '',
-                'brand_color': schedule.brand.color if schedule.brand else '#6c757d',
-                'brand_responsible': schedule.brand.responsible.name if schedule.brand and schedule.brand.responsible else '',
-                'room': schedule.room,
-                'modification_status': schedule.modification_status,
-                'modification_reason': schedule.modification_reason or '',
-                'is_late_cancellation': schedule.is_late_cancellation,
-                'late_hours': float(schedule.late_hours),
-                'modified_at': schedule.modified_at.strftime('%Y-%m-%d %H:%M') if schedule.modified_at else '',
-            })
+        schedule_list = day_schedules(selected_date, getattr(request, 'schedule_versions', None))
         
-        return JsonResponse({
-            'schedules': schedule_list,
+        compact = wants_compact_timeline(request)
+        # 精簡格式一律以 schedules_by_date 回傳
+        data = compact_timeline({selected_date_str: schedule_list}) if compact else {'schedules': schedule_list}
+        data.update({
             'date': selected_date_str,
             'count': len(schedule_list)
         })
+        return _timeline_json(data, compact)
     
     # 首次加載：只獲取當前日期的數據以提升性能
-    schedules = Schedule.objects.filter(
-        date=selected_date
-    ).select_related('person', 'brand').order_by('start_time')
-    
     # 只為當前日期組織數據
-    schedules_by_date = {}
-    schedule_list = []
-    
-    for schedule in schedules:
-        schedule_data = {
-            'id': schedule.id,
-            'person_name': schedule.person.name,
-            'person_nick_name': schedule.person.nick_name or '',
-            'role': schedule.role,
-            'start_time': schedule.start_time.strftime('%H:%M'),
-            'end_time': schedule.end_time.strftime('%H:%M'),
-            'duration': float(schedule.duration),
-            'brand_id': schedule.brand.id if schedule.brand else None,
-            'brand_name': schedule.brand.name if schedule.brand else '',
-            'brand_color': schedule.brand.color if schedule.brand else '#6c757d',
-            'brand_responsible': schedule.brand.responsible.name if schedule.brand and schedule.brand.responsible else '',
-            'room': schedule.room,
-            'modification_status': schedule.modification_status,
-            'modification_reason': schedule.modification_reason or '',
-            'is_late_cancellation': schedule.is_late_cancellation,
-            'late_hours': float(schedule.late_hours),
-            'modified_at': schedule.modified_at.strftime('%Y-%m-%d %H:%M') if schedule.modified_at else '',
-        }
-        schedule_list.append(schedule_data)
-    
-    schedules_by_date[selected_date_str] = schedule_list
+    schedules_by_date = {
+        selected_date_str: day_schedules(selected_date)
+    }
     
     context = {
         'selected_date': selected_date_str,
@@ -589,9 +959,132 @@ def timeline_view(request):
     return render(request, 'liveapp/timeline_view.html', context)
 
 
-@csrf_exempt
-def update_schedule_api(request):
-    """API端點：更新排班資料（用於拖拽功能）"""
+def timeline_cache_stats_api(request):
+    """時間軸快取命中 / 未命中統計（處理此請求的 process；各 worker 的加總見 /metrics）；
+    staff 以 POST（需 CSRF token）重設計數"""
+    if request.method == 'POST':
+        if not request.user.is_staff:
+            return JsonResponse({'success': False, 'error': '只有管理員可以重設統計'}, status=403)
+        reset_cache_stats()
+    elif request.method != 'GET':
+        return JsonResponse({'success': False, 'error': '僅支援 GET / POST 請求'}, status=405)
+    return JsonResponse({'success': True, 'data': cache_stats()})
+
+
+def metrics(request):
+    """Prometheus 格式的效能指標（liveapp.instrumentation）；設定 METRICS_TOKEN 時需帶 Bearer token"""
+    from django.conf import settings
+    from django.utils.crypto import constant_time_compare
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain; charset=utf-8')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile_list(request):
+    """已儲存的請求 profile；同一 view 可與前一筆比較"""
+    from .profiling import list_profiles
+    profiles = list_profiles()
+    previous_by_view = {}
+    for profile in reversed(profiles):
+        profile['previous_id'] = previous_by_view.get(profile['view'])
+        previous_by_view[profile['view']] = profile['id']
+    return render(request, 'liveapp/profile_list.html', {'profiles': profiles})
+
+
+@staff_member_required
+def profile_detail(request, profile_id):
+    from django.http import Http404
+    from .profiling import load_profile, profile_report, repeated_sql
+    sort_options = ['cumulative', 'tottime', 'calls']
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in sort_options:
+        sort = 'cumulative'
+    try:
+        meta = load_profile(profile_id)
+        report = profile_report(profile_id, sort=sort)
+    except (OSError, ValueError):
+        raise Http404('找不到 profile')
+    return render(request, 'liveapp/profile_detail.html', {
+        'profile': meta,
+        'sort': sort,
+        'sort_options': sort_options,
+        'report': report,
+        'repeated_sql': repeated_sql(meta),
+    })
+
+
+@staff_member_required
+def profile_download(request, profile_id):
+    """下載 pstats 檔（python -m pstats 或 snakeviz 開啟）"""
+    from django.http import FileResponse, Http404
+    from .profiling import profile_file
+    try:
+        path = profile_file(profile_id)
+    except OSError:
+        raise Http404('找不到 profile')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof',
+                        content_type='application/octet-stream')
+
+
+@staff_member_required
+def profile_diff(request):
+    """?base=&other=：比較同一 view 的兩個 profile"""
+    from django.http import Http404
+    from .profiling import diff_profiles, load_profile
+    try:
+        base = load_profile(request.GET.get('base', ''))
+        other = load_profile(request.GET.get('other', ''))
+        if base['view'] != other['view']:
+            return HttpResponse('只能比較同一個 view 的 profile', status=400, content_type='text/plain; charset=utf-8')
+        rows = diff_profiles(base['id'], other['id'])
+    except (OSError, ValueError):
+        raise Http404('找不到 profile')
+    return render(request, 'liveapp/profile_diff.html', {'base': base, 'other': other, 'rows': rows})
+
+
+def _parse_room(room):
+    """將前端傳來的房間值（數字、"Room 3"、"未分配房間"）轉為房間號碼"""
+    try:
+        if isinstance(room, str):
+            if room == '未分配房間':
+                return 0
+            # 嘗試從字符串中提取數字
+            numbers = _ROOM_NUMBER_RE.findall(room)
+            return int(numbers[0]) if numbers else 0
+        return int(room)
+    except (ValueError, TypeError):
+        return 0
+
+
+def _resolve_brands(names):
+    """一次查詢解析品牌名稱；同名品牌取 id 最小者，不存在的名稱不會出現在結果中"""
+    brands = {}
+    for brand in Brand.objects.filter(name__in=set(names)).order_by('-id'):
+        brands[brand.name] = brand
+    return brands
+
+
+def _conflict_response(conflicts):
+    """排班時段衝突時的 409 回應"""
+    names = person_names(conflicts)
+    for conflict in conflicts:
+        conflict['message'] = describe_conflict(conflict, names)
+    return JsonResponse({
+        'success': False,
+        'error': '；'.join(conflict['message'] for conflict in conflicts),
+        'conflicts': conflicts,
+    }, status=409)
+
+
+@async_csrf_exempt
+async def update_schedule_api(request):
+    """API端點：更新排班資料（用於拖拽功能）
+
+    async view：查詢使用 async ORM；衝突檢查、品牌解析與多筆儲存的 transaction
+    只能在 sync context 執行，以 sync_to_async 包裝。
+    """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
@@ -613,47 +1106,22 @@ def update_schedule_api(request):
         
         # 處理合併排班更新
         if is_merged_update and all_schedule_ids:
-            print(f"DEBUG: Processing merged schedule update with IDs: {all_schedule_ids}")
-            print(f"DEBUG: ID types: {[type(id) for id in all_schedule_ids]}")
-            schedules_to_update = Schedule.objects.filter(id__in=all_schedule_ids)
-            print(f"DEBUG: Found {schedules_to_update.count()} schedules to update")
-            if not schedules_to_update.exists():
-                # 嘗試查找所有可能的排班來調試
-                all_schedules = Schedule.objects.all().values_list('id', flat=True)
-                print(f"DEBUG: Available schedule IDs: {list(all_schedules)[:10]}...")  # 只顯示前10個
+            schedules_to_update = Schedule.objects.filter(id__in=all_schedule_ids).select_related('person')
+            if not await schedules_to_update.aexists():
                 return JsonResponse({'success': False, 'error': 'No schedules found for merged update'}, status=404)
             
+            # 房間與品牌只解析一次，套用到所有排班
+            new_room = _parse_room(room) if room is not None else None
+            new_brand = (await sync_to_async(_resolve_brands)([brand_name])).get(brand_name) if brand_name else None
+
             updated_schedules = []
-            for schedule in schedules_to_update:
+            async for schedule in schedules_to_update.aiterator():
                 # 更新每個排班
-                if room is not None:
-                    try:
-                        if isinstance(room, str):
-                            if room == '未分配房間':
-                                schedule.room = 0
-                            else:
-                                import re
-                                numbers = re.findall(r'\d+', str(room))
-                                if numbers:
-                                    schedule.room = int(numbers[0])
-                                else:
-                                    schedule.room = 0
-                        else:
-                            schedule.room = int(room)
-                    except (ValueError, TypeError):
-                        schedule.room = 0
+                if new_room is not None:
+                    schedule.room = new_room
                 
-                if brand_name:
-                    try:
-                        brand = Brand.objects.get(name=brand_name)
-                        schedule.brand = brand
-                    except Brand.DoesNotExist:
-                        pass
-                    except Brand.MultipleObjectsReturned:
-                        # 如果有多個同名品牌，取第一個
-                        brand = Brand.objects.filter(name=brand_name).first()
-                        if brand:
-                            schedule.brand = brand
+                if new_brand:
+                    schedule.brand = new_brand
                 
                 if start_time:
                     try:
@@ -669,8 +1137,13 @@ def update_schedule_api(request):
                 
                 schedule.modified_at = timezone.now()
                 schedule.modification_status = 'modified'
-                schedule.save()
                 updated_schedules.append(schedule)
+
+            # 全部修改後一起檢查時段衝突，有衝突時都不儲存
+            conflicts = await sync_to_async(check_schedules)(updated_schedules) if checks_enabled() else []
+            if conflicts:
+                return await sync_to_async(_conflict_response)(conflicts)
+            await sync_to_async(_save_schedules)(updated_schedules)
             
             # 返回合併更新結果
             return JsonResponse({
@@ -684,43 +1157,19 @@ def update_schedule_api(request):
         
         # 單一排班更新（原有邏輯）
         try:
-            schedule = Schedule.objects.get(id=schedule_id)
+            schedule = await Schedule.objects.select_related('person', 'brand').aget(id=schedule_id)
         except Schedule.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Schedule not found'}, status=404)
         
         # 更新房間
         if room is not None:
-            try:
-                # 嘗試轉換為整數，如果是文字則解析房間號碼
-                if isinstance(room, str):
-                    if room == '未分配房間':
-                        schedule.room = 0
-                    else:
-                        # 嘗試從字符串中提取數字
-                        import re
-                        numbers = re.findall(r'\d+', str(room))
-                        if numbers:
-                            schedule.room = int(numbers[0])
-                        else:
-                            schedule.room = 0
-                else:
-                    schedule.room = int(room)
-            except (ValueError, TypeError):
-                schedule.room = 0  # 默認值
+            schedule.room = _parse_room(room)
         
-        # 更新品牌
+        # 更新品牌（品牌不存在時忽略）
         if brand_name:
-            try:
-                brand = Brand.objects.get(name=brand_name)
+            brand = (await sync_to_async(_resolve_brands)([brand_name])).get(brand_name)
+            if brand:
                 schedule.brand = brand
-            except Brand.DoesNotExist:
-                # 如果品牌不存在，可以選擇創建或忽略
-                pass
-            except Brand.MultipleObjectsReturned:
-                # 如果有多個同名品牌，取第一個
-                brand = Brand.objects.filter(name=brand_name).first()
-                if brand:
-                    schedule.brand = brand
         
         # 更新時間
         if start_time:
@@ -735,15 +1184,18 @@ def update_schedule_api(request):
             except ValueError:
                 return JsonResponse({'success': False, 'error': 'Invalid end time format'}, status=400)
         
-        # Duration會自動從start_time和end_time計算，不需要手動設置
-        # 因為duration是@property，會自動計算，無需賦值
+        # duration_minutes 由 Schedule.save() 依 start_time / end_time 重新計算
         
         # 更新修改時間和狀態
         schedule.modified_at = timezone.now()
         schedule.modification_status = 'modified'  # 標記為已修改
+
+        conflicts = await sync_to_async(check_schedules)([schedule]) if checks_enabled() else []
+        if conflicts:
+            return await sync_to_async(_conflict_response)(conflicts)
         
         # 保存更改
-        schedule.save()
+        await schedule.asave()
         
         # 返回成功回應
         return JsonResponse({
@@ -756,12 +1208,147 @@ def update_schedule_api(request):
                 'brand_name': schedule.brand.name if schedule.brand else '',
                 'start_time': schedule.start_time.strftime('%H:%M'),
                 'end_time': schedule.end_time.strftime('%H:%M'),
-                'duration': float(schedule.duration),  # 使用@property計算的值
+                'duration': float(schedule.duration),  # 由儲存的 duration_minutes 換算
                 'modified_at': schedule.modified_at.strftime('%Y-%m-%d %H:%M:%S')
             }
         })
         
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+    except IntegrityError:
+        # 資料庫 exclusion constraint（PostgreSQL）擋下的重疊
+        return JsonResponse({'success': False, 'error': 'Schedule conflicts with an existing schedule'}, status=409)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def _save_schedules(schedules):
+    with transaction.atomic():
+        for schedule in schedules:
+            schedule.save()
+
+
+# 單一批次最多處理的排班數
+BATCH_UPDATE_MAX_SCHEDULES = 500
+
+
+@csrf_exempt
+def batch_update_schedules_api(request):
+    """API端點：批次套用拖拽的移動/調整操作
+
+    請求格式：{"operations": [{"id": 1 或 "ids": [1, 2], "room", "brand_name", "start_time", "end_time"}, ...]}
+    所有操作先驗證，全部有效才在同一個交易中以 bulk_update 寫入；同一排班的多個操作依序套用，
+    因此前端可將連續的拖拽合併為一次請求。時段衝突時整批不寫入，回傳 409，每個衝突的
+    ``operations`` 為牽涉的操作索引。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'success': False, 'error': 'operations must be a non-empty list'}, status=400)
+
+    # 驗證所有操作，收集全部錯誤
+    errors = []
+    parsed = []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict):
+            errors.append({'index': index, 'error': 'Operation must be an object'})
+            continue
+        ids = op.get('ids') or ([op['id']] if op.get('id') else [])
+        try:
+            ids = [int(schedule_id) for schedule_id in ids]
+        except (ValueError, TypeError):
+            ids = []
+        if not ids:
+            errors.append({'index': index, 'error': 'Schedule ID or IDs are required'})
+            continue
+        changes = {}
+        if op.get('room') is not None:
+            changes['room'] = _parse_room(op['room'])
+        for field in ('start_time', 'end_time'):
+            if op.get(field):
+                try:
+                    value = parse_time(op[field])
+                except ValueError:
+                    value = None
+                if value is None:
+                    errors.append({'index': index, 'error': f'Invalid {field} format'})
+                    break
+                changes[field] = value
+        else:
+            parsed.append((ids, op.get('brand_name'), changes))
+
+    all_ids = {schedule_id for ids, _, _ in parsed for schedule_id in ids}
+    if len(all_ids) > BATCH_UPDATE_MAX_SCHEDULES:
+        errors.append({'error': f'At most {BATCH_UPDATE_MAX_SCHEDULES} schedules per batch'})
+    if errors:
+        return JsonResponse({'success': False, 'error': 'Invalid operations', 'errors': errors}, status=400)
+
+    # 品牌一次解析
+    brands = _resolve_brands(name for _, name, _ in parsed if name)
+
+    try:
+        with transaction.atomic():
+            schedules = {
+                s.id: s for s in Schedule.objects.select_for_update().filter(id__in=all_ids)
+            }
+            missing = sorted(all_ids - set(schedules))
+            if missing:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Schedules not found',
+                    'missing_ids': missing,
+                }, status=404)
+
+            now = timezone.now()
+            for ids, brand_name, changes in parsed:
+                brand = brands.get(brand_name) if brand_name else None
+                for schedule_id in ids:
+                    schedule = schedules[schedule_id]
+                    for field, value in changes.items():
+                        setattr(schedule, field, value)
+                    if brand:
+                        schedule.brand = brand
+                    schedule.modified_at = now
+                    schedule.modification_status = 'modified'
+
+            # 以最終結果檢查時段衝突，有衝突時整批不寫入；operations 標出造成衝突的操作索引，
+            # 前端只退回這些操作，其餘重新送出
+            conflicts = check_schedules(schedules.values()) if checks_enabled() else []
+            if conflicts:
+                for conflict in conflicts:
+                    involved = set(conflict['ids'])
+                    conflict['operations'] = [
+                        index for index, (ids, _, _) in enumerate(parsed) if involved.intersection(ids)]
+                return _conflict_response(conflicts)
+
+            # bulk_update 會一併重新計算 duration_minutes
+            Schedule.objects.bulk_update(schedules.values(), [
+                'room', 'brand', 'start_time', 'end_time', 'modified_at', 'modification_status',
+            ])
+    except IntegrityError:
+        return JsonResponse({'success': False, 'error': 'Schedule conflicts with an existing schedule'}, status=409)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'updated_count': len(schedules),
+        'results': {
+            schedule.id: {
+                'room': schedule.room,
+                'brand_id': schedule.brand_id,
+                'start_time': schedule.start_time.strftime('%H:%M'),
+                'end_time': schedule.end_time.strftime('%H:%M'),
+                'duration': schedule.duration,
+            }
+            for schedule in schedules.values()
+        },
+        'modified_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+    })
@@ -38,6 +38,8 @@ CSRF_TRUSTED_ORIGINS = ['https://*.up.railway.app']
 # Application definition
 
 INSTALLED_APPS = [
+    # daphne 必須在 staticfiles 之前，讓 runserver 以 ASGI（含 WebSocket）啟動
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -52,19 +54,26 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     # Serve static files efficiently
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # JSON 回應以 brotli（有安裝時）或 gzip 壓縮
+    'liveapp.middleware.JsonCompressionMiddleware',
+    # 每個請求的 SQL / 模板 / JSON 時間：Server-Timing header 與 /metrics
+    'liveapp.middleware.PerformanceMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # staff 的 X-Profile: 1 / ?_profile=1 或 PROFILE_SAMPLE_RATE 抽樣，以 cProfile 記錄請求
+    'liveapp.middleware.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'selleryltd.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates 加上 render 時間記錄（liveapp.instrumentation）
+        'BACKEND': 'liveapp.instrumentation.TimedDjangoTemplates',
         # Add project-level templates directory
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
@@ -115,6 +124,74 @@ else:
     }
 
 
+# Cache: 設定 REDIS_URL 時使用 Redis（需安裝 redis 套件），設定 CACHE_DIR 時使用檔案快取，
+# 否則使用本機記憶體快取（每個 worker 各自一份）
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'selleryltd',
+        }
+    }
+
+# Channels：排班即時更新（WebSocket）。設定 REDIS_URL 時多個 worker 透過 Redis 共用
+# channel layer（需安裝 channels-redis），否則使用 in-memory（僅限單一 process）
+ASGI_APPLICATION = 'selleryltd.asgi.application'
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
+# 排班 delta sync：刪除紀錄（tombstone）保留天數，較舊的 cursor 會要求前端重新載入
+SCHEDULE_TOMBSTONE_DAYS = int(os.environ.get('SCHEDULE_TOMBSTONE_DAYS', 30))
+# 超過此時數的 cursor 直接回傳完整資料（限制查詢移出區間排班時掃描的修改紀錄）
+SCHEDULE_SYNC_MAX_AGE_HOURS = int(os.environ.get('SCHEDULE_SYNC_MAX_AGE_HOURS', 24))
+
+# 效能量測（Server-Timing header 與 /metrics）。METRICS_TOKEN 設定時 /metrics 需帶
+# Authorization: Bearer <token>
+PERFORMANCE_METRICS = os.environ.get('PERFORMANCE_METRICS', '1') != '0'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# JSON 回應壓縮（JsonCompressionMiddleware）；由前端 proxy 壓縮時可設 JSON_COMPRESSION=0 停用
+JSON_COMPRESSION = os.environ.get('JSON_COMPRESSION', '1') != '0'
+
+# 請求 profiler：抽樣比例（0–1）、存放目錄與保留筆數，staff 可在 /profiles/ 查看
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'cache', 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+
+# 發票 PDF 的磁碟快取目錄與批次匯出共用 process pool 的 worker 數（預設為 CPU 數，最多 4）
+INVOICE_PDF_CACHE_DIR = os.environ.get('INVOICE_PDF_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'invoice_pdfs'))
+INVOICE_PDF_WORKERS = int(os.environ.get('INVOICE_PDF_WORKERS', 0)) or None
+
+# 時間軸每日 / 每週排班資料的快取秒數（排班變更時會主動失效）
+TIMELINE_CACHE_TIMEOUT = int(os.environ.get('TIMELINE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 